@@ -0,0 +1,238 @@
+# app/agents/planner/local.py
+
+"""
+Offline triage classifier: hashed n-gram features + linear softmax heads.
+
+CPU-only and dependency-light (numpy), so a plan costs microseconds instead
+of an LLM round trip. Trained from past agent runs with
+scripts/train_triage_model.py; see planner.plan_checkin() for confidence routing.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Head predicted per check-in. There is no priority head: LLM plans carry
+# no priority (Plan has no such field), so there is nothing to learn it from.
+INTENT = "intent"
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def featurize(
+    complaint: str | None, source: str | None, bits: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Signed feature hashing of word uni/bigrams and character 3-5 grams
+    (robust to misspellings and mixed-language complaints) plus the source.
+
+    Returns (bucket indices, values), deduplicated and L2-normalized.
+    crc32 rather than hash(): Python's str hash is salted per process.
+    """
+    words = _WORD.findall((complaint or "").lower())
+    tokens = ["bias", f"s:{(source or '').lower()}"]
+    tokens += [f"w:{w}" for w in words]
+    tokens += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f" {w} "
+        for n in (3, 4, 5):
+            tokens += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+
+    mask = (1 << bits) - 1
+    acc: dict[int, float] = {}
+    for token in tokens:
+        h = zlib.crc32(token.encode("utf-8"))
+        idx = h & mask
+        acc[idx] = acc.get(idx, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+
+    idx = np.fromiter(acc.keys(), dtype=np.int64, count=len(acc))
+    val = np.fromiter(acc.values(), dtype=np.float32, count=len(acc))
+    norm = float(np.linalg.norm(val))
+    if norm > 0:
+        val /= norm
+    return idx, val
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    e = np.exp(logits - logits.max())
+    return e / e.sum()
+
+
+@dataclass
+class LinearHead:
+    """
+    Multinomial logistic regression over hashed features.
+    """
+
+    labels: list[str]
+    weights: np.ndarray  # (2**bits, len(labels)) float32
+
+    def predict_proba(self, idx: np.ndarray, val: np.ndarray) -> np.ndarray:
+        return _softmax(val @ self.weights[idx])
+
+
+@dataclass(frozen=True)
+class Prediction:
+    label: str
+    confidence: float
+
+
+class TriageModel:
+    def __init__(self, heads: dict[str, LinearHead], bits: int, meta: dict | None = None) -> None:
+        self.heads = heads
+        self.bits = bits
+        self.meta = meta or {}
+
+    def predict(self, complaint: str | None, source: str | None) -> dict[str, Prediction]:
+        idx, val = featurize(complaint, source, self.bits)
+        out: dict[str, Prediction] = {}
+        for name, head in self.heads.items():
+            proba = head.predict_proba(idx, val)
+            best = int(proba.argmax())
+            out[name] = Prediction(head.labels[best], float(proba[best]))
+        return out
+
+    # --- persistence (one compressed .npz) ---
+    def save(self, path: str) -> None:
+        arrays = {f"{name}__weights": head.weights for name, head in self.heads.items()}
+        header = {
+            "bits": self.bits,
+            "labels": {name: head.labels for name, head in self.heads.items()},
+            "meta": self.meta,
+        }
+        arrays["header"] = np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        # Atomic swap: a serving process never sees a half-written model
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TriageModel":
+        with np.load(path) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            heads = {
+                name: LinearHead(labels, data[f"{name}__weights"].astype(np.float32))
+                for name, labels in header["labels"].items()
+            }
+        return cls(heads, header["bits"], header.get("meta"))
+
+
+def train(
+    examples: Sequence[tuple[str | None, str | None, dict[str, str]]],
+    bits: int = 18,
+    epochs: int = 5,
+    learning_rate: float = 0.5,
+    l2: float = 1e-6,
+    seed: int = 0,
+) -> TriageModel:
+    """
+    Fit one softmax head per label key by SGD.
+
+    examples: (complaint, source, {head: label}) — every example carries
+    every head's label.
+    """
+    if not examples:
+        raise ValueError("No training examples")
+    head_names = sorted(examples[0][2])
+    labels = {
+        name: sorted({y[name] for _, _, y in examples}) for name in head_names
+    }
+    weights = {
+        name: np.zeros((1 << bits, len(labels[name])), dtype=np.float32)
+        for name in head_names
+    }
+    targets = {
+        name: np.array(
+            [labels[name].index(y[name]) for _, _, y in examples], dtype=np.int64
+        )
+        for name in head_names
+    }
+    features = [featurize(text, source, bits) for text, source, _ in examples]
+
+    rng = np.random.default_rng(seed)
+    step = 0
+    for _ in range(epochs):
+        for i in rng.permutation(len(examples)):
+            idx, val = features[i]
+            lr = learning_rate / (1.0 + 1e-4 * step)
+            step += 1
+            for name in head_names:
+                w = weights[name]
+                rows = w[idx]
+                grad = _softmax(val @ rows)
+                grad[targets[name][i]] -= 1.0
+                w[idx] = rows - lr * (np.outer(val, grad) + l2 * rows)
+
+    heads = {name: LinearHead(labels[name], weights[name]) for name in head_names}
+    return TriageModel(heads, bits, {"examples": len(examples), "epochs": epochs})
+
+
+def evaluate(
+    model: TriageModel,
+    examples: Iterable[tuple[str | None, str | None, dict[str, str]]],
+    thresholds: Sequence[float] = (0.5, 0.7, 0.8, 0.9, 0.95),
+) -> dict[str, dict]:
+    """
+    Per head: overall accuracy, and coverage / accuracy of the predictions
+    at or above each confidence threshold (what routing would keep local).
+    """
+    hits: dict[str, list[tuple[float, bool]]] = {name: [] for name in model.heads}
+    for text, source, y in examples:
+        for name, p in model.predict(text, source).items():
+            hits[name].append((p.confidence, p.label == y[name]))
+
+    report: dict[str, dict] = {}
+    for name, rows in hits.items():
+        n = len(rows) or 1
+        by_threshold = {}
+        for t in thresholds:
+            kept = [ok for c, ok in rows if c >= t]
+            by_threshold[t] = {
+                "coverage": len(kept) / n,
+                "accuracy": sum(kept) / len(kept) if kept else None,
+            }
+        report[name] = {
+            "accuracy": sum(ok for _, ok in rows) / n,
+            "by_threshold": by_threshold,
+        }
+    return report
+
+
+# --- serving: process-wide model, reloaded when the file changes ---
+_lock = threading.Lock()
+_loaded: tuple[str, float, TriageModel | None] | None = None
+
+
+def get_model(path: str) -> TriageModel | None:
+    """
+    The model at path (None if there isn't one). Retraining replaces the
+    file; the next call picks the new one up without a restart.
+    """
+    global _loaded
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if _loaded is not None and _loaded[0] == path and _loaded[1] == mtime:
+        return _loaded[2]
+    with _lock:
+        if _loaded is None or _loaded[0] != path or _loaded[1] != mtime:
+            try:
+                model = TriageModel.load(path)
+            except Exception:
+                logger.exception("Loading triage model %s failed", path)
+                model = None
+            _loaded = (path, mtime, model)
+        return _loaded[2]
@@ -1,31 +1,96 @@
 # app/agent/planner/planner.py
 
-#
 import os
-from dotenv import load_dotenv
-
-#  Load .env into os.environ so we can access GOOGLE_API_KEY via os.getenv("GOOGLE_API_KEY")
-load_dotenv()  # <-- THIS is what you were missing
-
-
+import threading
+import time
 from typing import cast
-from langchain_google_genai import ChatGoogleGenerativeAI
 from app.agents.planner.schemas import Plan
-from app.agents.prompts import get_planner_prompt
 from app.agents.policies import validate_plan  # <-- import policies
+from app.agents.planner.local import INTENT, get_model
+from app.core.config import settings
+from app.core.telemetry import LLM_ERRORS, LLM_LATENCY, LOCAL_PLANNER_LATENCY, PLANS
+
+MODEL = "gemini-2.5-flash"
+
+_planner_chain = None
+_planner_chain_lock = threading.Lock()
+
 
-# LLM Initialization
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    max_retries=2,
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
+def get_planner_chain():
+    """
+    Prompt | Gemini structured-output chain, built on first use.
+
+    Importing langchain / google-genai costs about half a second, so it
+    happens here rather than at import: workers that never call the LLM
+    (CRUD only, or every plan served locally) never pay for it.
+    """
+    global _planner_chain
+    if _planner_chain is None:
+        with _planner_chain_lock:
+            if _planner_chain is None:
+                from dotenv import load_dotenv
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                from app.agents.prompts import get_planner_prompt
 
-structured_planner = llm.with_structured_output(Plan)
-planner_chain = get_planner_prompt() | structured_planner
+                #  Load .env into os.environ so we can access GOOGLE_API_KEY via os.getenv("GOOGLE_API_KEY")
+                load_dotenv()
+
+                llm = ChatGoogleGenerativeAI(
+                    model=MODEL,
+                    temperature=0,
+                    max_retries=2,
+                    api_key=os.getenv("GOOGLE_API_KEY")
+                )
+                _planner_chain = get_planner_prompt() | llm.with_structured_output(Plan)
+    return _planner_chain
 
 def plan_checkin(checkin: dict, patient: dict) -> dict:
+    """
+    Plan with the configured backend (PLANNER_BACKEND):
+    - llm: always the remote LLM
+    - local: always the offline classifier (system fallback without a model)
+    - auto: the classifier when its confidence reaches
+      PLANNER_LOCAL_MIN_CONFIDENCE, the LLM for everything else
+
+    The result carries "planner" (llm | local | fallback) for the audit log.
+    """
+    backend = settings.PLANNER_BACKEND
+    if backend != "llm":
+        local = local_plan(checkin)
+        if local is not None:
+            plan, confidence = local
+            if backend == "local" or confidence >= settings.PLANNER_LOCAL_MIN_CONFIDENCE:
+                PLANS.inc(planner="local")
+                return {**validate_plan(plan), "planner": "local"}
+        elif backend == "local":
+            PLANS.inc(planner="fallback")
+            return _fallback_plan("No local triage model")
+    return llm_plan(checkin, patient)
+
+
+def local_plan(checkin: dict) -> tuple[dict, float] | None:
+    """
+    Offline classifier plan and its intent confidence; None when no model
+    is installed. Like LLM plans, it carries no priority or tools.
+    """
+    model = get_model(settings.PLANNER_MODEL_PATH)
+    if model is None:
+        return None
+
+    started = time.perf_counter()
+    predictions = model.predict(checkin.get("initial_complaint"), checkin.get("source"))
+    LOCAL_PLANNER_LATENCY.observe(time.perf_counter() - started)
+
+    intent = predictions[INTENT]
+    plan = Plan(
+        intent=intent.label,
+        reason=f"Local triage model (confidence {intent.confidence:.2f})",
+        requires_human=intent.label == "ESCALATE",
+    ).model_dump()
+    return plan, intent.confidence
+
+
+def llm_plan(checkin: dict, patient: dict) -> dict:
     """
     Full planning cycle:
     1. Planner generates proposed plan
@@ -36,29 +101,44 @@ def plan_checkin(checkin: dict, patient: dict) -> dict:
     checkin_str = f"Source: {checkin.get('source')}, Complaint: {checkin.get('initial_complaint')}"
 
     try:
+        # First call builds the client (kept out of the latency histogram)
+        chain = get_planner_chain()
+
         # 1. Planner proposes plan
-        response = planner_chain.invoke({
-            "patient_context": patient_str,
-            "checkin_context": checkin_str
-        })
+        started = time.perf_counter()
+        try:
+            response = chain.invoke({
+                "patient_context": patient_str,
+                "checkin_context": checkin_str
+            })
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, model=MODEL)
         plan_result = cast(Plan, response).model_dump()
 
         # 2. Policies validate the plan
         policy_result = validate_plan(plan_result)
 
         # 3. Return final plan
-        return policy_result
+        PLANS.inc(planner="llm")
+        return {**policy_result, "planner": "llm"}
 
     except Exception as e:
+        LLM_ERRORS.inc(model=MODEL)
         print(f"Planner LLM Error: {e}")
-        return {
-            "approved": False,
-            "reason": f"Planner failed: {str(e)}",
-            "modified_plan": {
-                "intent": "ESCALATE",
-                "reason": "System fallback",
-                "priority": "high",
-                "requires_human": True,
-                "tools": []
-            }
-        }
\ No newline at end of file
+        PLANS.inc(planner="fallback")
+        return _fallback_plan(f"Planner failed: {str(e)}")
+
+
+def _fallback_plan(reason: str) -> dict:
+    return {
+        "approved": False,
+        "reason": reason,
+        "planner": "fallback",
+        "modified_plan": {
+            "intent": "ESCALATE",
+            "reason": "System fallback",
+            "priority": "high",
+            "requires_human": True,
+            "tools": []
+        }
+    }
@@ -1,5 +1,26 @@
 # backend/app/agents/tools.py
 
+from app.services.referrals import current_referral_index
+
+
+def referral_target(patient: dict, level: str) -> tuple[dict, float] | None:
+    """
+    Nearest facility of level to the patient (her village, else her
+    facility) as (facility dict, distance_km); None without coordinates.
+    """
+    index = current_referral_index()
+    if index is None:
+        return None
+    origin = index.locate(patient.get("village"), patient.get("parish"), patient.get("facility_id"))
+    if origin is None:
+        return None
+    nearest = index.nearest(origin[0], origin[1], k=1, level=level)
+    if not nearest:
+        return None
+    facility, distance = nearest[0]
+    return {"id": facility.id, "name": facility.name, "level": facility.level}, distance
+
+
 def execute_tool(tool_name: str, patient: dict, checkin: dict):
     """
     Execute a tool. For demo, we just print actions.
@@ -9,9 +30,22 @@ def execute_tool(tool_name: str, patient: dict, checkin: dict):
     elif tool_name == "schedule_followup_sms":
         print(f"Scheduling follow-up SMS for {patient['name']}")
     elif tool_name == "escalate_hc2":
-        print(f"Escalating to HC2 for {patient['name']}")
+        target = referral_target(patient, "HC2")
+        if target is None:
+            print(f"Escalating to HC2 for {patient['name']}")
+        else:
+            facility, distance = target
+            print(f"Escalating to {facility['name']} ({distance:.1f} km) for {patient['name']}")
     elif tool_name == "send_advice_sms":
-        print(f"Sending advice SMS to {patient['name']}")
+        # Pre-rendered by the scheduler for its whole batch (see sms_templates)
+        message = checkin.get("message")
+        if message is None:
+            print(f"Sending advice SMS to {patient['name']}")
+        else:
+            print(
+                f"Sending advice SMS to {patient['name']}"
+                f" ({message['language']}, {message['segments']} segment(s)): {message['text']}"
+            )
     elif tool_name == "trigger_triage_review":
         print(f"Triggering human triage review for {patient['name']}")
     else:
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.api.helpers.helpers_patient_routes import decode_observations
+from app.core.models import CheckIn
+
+# API field -> ORM column where the names differ
+CHECKIN_FIELD_COLUMNS = {"observations": "observations_json"}
+
+
+def parse_fields(raw: str | None, allowed: Iterable[str]) -> list[str] | None:
+    """
+    Parse ?fields=a,b,c against an allow-list.
+
+    Returns None when no selection was requested (full response). "id" is
+    always included so clients can key sparse records.
+    """
+    if raw is None or not raw.strip():
+        return None
+    allowed = set(allowed)
+    requested = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = sorted(set(requested) - allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+
+def parse_include(raw: str | None, allowed: Iterable[str]) -> set[str] | None:
+    """
+    Parse ?include=rel1,rel2 against an allow-list (None = not specified).
+    """
+    if raw is None:
+        return None
+    allowed = set(allowed)
+    requested = {r.strip() for r in raw.split(",") if r.strip()}
+    unknown = sorted(requested - allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {unknown}")
+    return requested
+
+
+def columns_for(
+    model: Any, fields: Iterable[str], renames: dict[str, str] | None = None
+) -> list[InstrumentedAttribute]:
+    """
+    ORM columns for a field selection, for select(*columns) projections.
+    """
+    renames = renames or {}
+    return [getattr(model, renames.get(f, f)) for f in fields]
+
+
+def checkin_columns(fields: Iterable[str]) -> list[InstrumentedAttribute]:
+    return columns_for(CheckIn, fields, CHECKIN_FIELD_COLUMNS)
+
+
+def checkin_row_to_dict(row: Any) -> dict[str, Any]:
+    """
+    Projected check-in row (or a dict of its columns) -> dict, decoding
+    observations if selected.
+    """
+    data = dict(row) if isinstance(row, dict) else dict(row._mapping)
+    if "observations_json" in data:
+        data["observations"] = decode_observations(data.pop("observations_json"))
+    return data
+
+
+def sparse_response(content: Any, response: Response | None = None) -> JSONResponse:
+    """
+    Serialize a sparse payload directly (it doesn't satisfy the full
+    response_model), keeping headers already set on the route's response.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return JSONResponse(jsonable_encoder(content), headers=headers)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app.services.idempotency import MAX_KEY_LENGTH, get_stored
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def validate_key(key: str | None) -> str | None:
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters",
+        )
+    return key
+
+
+def replay_stored(
+    db: Session, scope: str, key: str, request_hash: str
+) -> JSONResponse | None:
+    """
+    The stored response for a retried request, or None on first use.
+
+    Reusing a key with a different request body is a client bug (422).
+    """
+    stored = get_stored(db, scope, key)
+    if stored is None:
+        return None
+    if stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    return JSONResponse(
+        content=json.loads(stored.response_json),
+        status_code=stored.status_code,
+        headers={REPLAY_HEADER: "true"},
+    )
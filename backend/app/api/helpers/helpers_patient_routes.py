@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import json
+from datetime import datetime
 from typing import Any, Sequence
 
 from fastapi import HTTPException
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from app.core.models import Patient, Facility, VHT, CheckIn
@@ -29,6 +31,25 @@ def decode_observations(observations_json: str | None) -> dict[str, Any] | None:
         return {"_corrupt_observations": True, "raw": observations_json}
 
 
+def checkin_to_dict(c: CheckIn) -> dict[str, Any]:
+    """
+    Convert ORM CheckIn -> CheckInOut-shaped dict (observations decoded).
+    """
+    return {
+        "id": c.id,
+        "patient_id": c.patient_id,
+        "facility_id": c.facility_id,
+        "source": c.source,
+        "status": c.status,
+        "initial_complaint": c.initial_complaint,
+        "observations": decode_observations(getattr(c, "observations_json", None)),
+        "recorded_by": getattr(c, "recorded_by", None),
+        "notes": getattr(c, "notes", None),
+        "created_at": c.created_at,
+        "closed_at": c.closed_at,
+    }
+
+
 def patient_to_detail_out(patient: Patient, recent_checkins: Sequence[CheckIn]) -> PatientDetailOut:
     """
     Convert ORM Patient + recent checkins -> PatientDetailOut (agent-ready).
@@ -59,22 +80,7 @@ def patient_to_detail_out(patient: Patient, recent_checkins: Sequence[CheckIn])
         # These are ORM objects; nested schemas should have from_attributes=True
         "facility": patient.facility,
         "vht": patient.vht,
-        "recent_checkins": [
-            {
-                "id": c.id,
-                "patient_id": c.patient_id,
-                "facility_id": c.facility_id,
-                "source": c.source,
-                "status": c.status,
-                "initial_complaint": c.initial_complaint,
-                "observations": decode_observations(getattr(c, "observations_json", None)),
-                "recorded_by": getattr(c, "recorded_by", None),
-                "notes": getattr(c, "notes", None),
-                "created_at": c.created_at,
-                "closed_at": c.closed_at,
-            }
-            for c in recent_checkins
-        ],
+        "recent_checkins": [checkin_to_dict(c) for c in recent_checkins],
     }
 
     return PatientDetailOut.model_validate(payload)
@@ -100,3 +106,42 @@ def validate_vht(db: Session, vht_id: int, facility_id: int) -> VHT:
     if vht.facility_id != facility_id:
         raise HTTPException(status_code=400, detail="vht_id does not belong to facility_id")
     return vht
+
+
+def patient_version(db: Session, patient_id: int) -> tuple[tuple[Any, ...], datetime] | None:
+    """
+    Cheap cache validators for a patient (no hydration).
+
+    Returns (etag_parts, last_modified), or None if the patient doesn't exist.
+    Uses the patient PK and the checkins.patient_id index only. The check-in
+    count is part of the ETag because created_at can be backdated (SMS
+    check-ins keep the gateway's received_at), so a late message may not
+    move max(created_at).
+    """
+    checkin_count = (
+        select(func.count())
+        .select_from(CheckIn)
+        .where(CheckIn.patient_id == patient_id)
+        .scalar_subquery()
+    )
+    latest_created = (
+        select(func.max(CheckIn.created_at))
+        .where(CheckIn.patient_id == patient_id)
+        .scalar_subquery()
+    )
+    latest_closed = (
+        select(func.max(CheckIn.closed_at))
+        .where(CheckIn.patient_id == patient_id)
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(Patient.updated_at, checkin_count, latest_created, latest_closed).where(
+            Patient.id == patient_id
+        )
+    ).first()
+    if row is None:
+        return None
+
+    updated_at, count, latest_checkin, latest_close = row
+    last_modified = max(t for t in (updated_at, latest_checkin, latest_close) if t)
+    return (patient_id, updated_at, count, latest_checkin, latest_close), last_modified
@@ -1,13 +1,169 @@
-from fastapi import APIRouter, HTTPException
-from app.services.agent_service import run_agent
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.core.db import get_db
+from app.core.models import utcnow
+from app.core.profiling import ProfiledRoute
+from app.core.shards import merge_newest, shards
+from app.core.schemas import AgentRunPage, AgentRunSummaryOut
+from app.core.write_lane import run_write
+from app.api.helpers.helpers_idempotency import replay_stored, validate_key
+from app.services.agent_runs import (
+    BUCKETS,
+    EQUALITY_FILTERS,
+    encode_cursor,
+    list_runs,
+    merge_summaries,
+    summarize_runs,
+)
+from app.services.archive import archived_agent_runs
+from app.services.agent_service import run_agent_once
+from app.services.idempotency import AGENT_RUN, request_fingerprint, store_response
 import uuid
 
-router = APIRouter(prefix="/agent", tags=["agent"])
+router = APIRouter(prefix="/agent", tags=["agent"], route_class=ProfiledRoute)
+
+
+def _utc_naive(value: datetime | None) -> datetime | None:
+    # Stored timestamps are naive UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 @router.post("/run")
-def run_agent_endpoint(checkin_id: str):
+def run_agent_endpoint(
+    checkin_id: str,
+    idempotency_key: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """
+    Plan and act on a check-in.
+
+    Concurrent runs for the same check-in are coalesced into one execution;
+    with an Idempotency-Key, retries replay the stored result.
+    """
+    idempotency_key = validate_key(idempotency_key)
+    request_hash = request_fingerprint({"checkin_id": checkin_id})
+    if idempotency_key:
+        replay = replay_stored(db, AGENT_RUN, idempotency_key, request_hash)
+        if replay is not None:
+            return replay
+
     try:
-        return run_agent(checkin_id=checkin_id)
+        result = jsonable_encoder(run_agent_once(checkin_id))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+    if idempotency_key:
+        run_write(
+            db,
+            lambda wdb: store_response(
+                wdb, AGENT_RUN, idempotency_key, request_hash, 200, result
+            ),
+        )
+    return result
+
+
+@router.get("/runs", response_model=AgentRunPage)
+def list_agent_runs(
+    patient_id: int | None = Query(default=None),
+    checkin_id: str | None = Query(default=None),
+    facility_id: int | None = Query(default=None),
+    status: str | None = Query(default=None, description="e.g. COMPLETED_NOOP"),
+    intent: str | None = Query(default=None, description="e.g. ESCALATE"),
+    since: datetime | None = Query(default=None, description="created_at >= since (UTC)"),
+    until: datetime | None = Query(default=None, description="created_at < until (UTC)"),
+    cursor: str | None = Query(default=None, description="next_cursor from the previous page"),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    """
+    Agent run audit log, newest first, with keyset pagination.
+
+    Runs live in their patient's district shard; without a check-in,
+    patient or facility filter every shard is read and the pages merged.
+    """
+    filters = {
+        "patient_id": patient_id,
+        "checkin_id": checkin_id,
+        "facility_id": facility_id,
+        "status": status,
+        "intent": intent,
+        "since": _utc_naive(since),
+        "until": _utc_naive(until),
+    }
+
+    def run(db: Session) -> tuple[list, str | None]:
+        runs, next_cursor = list_runs(db, filters, cursor, limit)
+        if not runs and checkin_id is not None and cursor is None:
+            # The check-in (and its runs) may have been archived
+            runs = [
+                run
+                for run in archived_agent_runs(db, checkin_id)
+                if all(filters[k] is None or run.get(k) == filters[k] for k in EQUALITY_FILTERS)
+            ][:limit]
+        return runs, next_cursor
+
+    if checkin_id is not None:
+        shard = shards.for_checkin(checkin_id)
+    elif patient_id is not None:
+        shard = shards.for_patient(patient_id)
+    elif facility_id is not None:
+        shard = shards.for_facility(facility_id)
+    else:
+        shard = None
+
+    try:
+        if shard is not None:
+            runs, next_cursor = shard.run(run)
+        else:
+            pages = shards.scatter(run)
+            runs = merge_newest(
+                [runs for runs, _ in pages], key=lambda r: (r.created_at, r.id), limit=limit
+            )
+            more = any(c for _, c in pages) or sum(len(r) for r, _ in pages) > limit
+            next_cursor = encode_cursor(runs[-1].created_at, runs[-1].id) if more else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AgentRunPage(items=runs, next_cursor=next_cursor)
+
+
+@router.get("/runs/summary", response_model=AgentRunSummaryOut)
+def summarize_agent_runs(
+    bucket: str = Query(default="day", description="hour | day | week"),
+    facility_id: int | None = Query(default=None),
+    status: str | None = Query(default=None),
+    intent: str | None = Query(default=None),
+    since: datetime | None = Query(default=None, description="Default: 30 days before until"),
+    until: datetime | None = Query(default=None, description="Default: now (UTC)"),
+):
+    """
+    Time-bucketed run counts (totals, per intent / status, not approved),
+    e.g. escalations per day at a facility or the planner fallback rate.
+    """
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {sorted(BUCKETS)}")
+    until = _utc_naive(until) or utcnow()
+    since = _utc_naive(since) or until - timedelta(days=30)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    filters = {
+        "facility_id": facility_id,
+        "status": status,
+        "intent": intent,
+        "since": since,
+        "until": until,
+    }
+
+    def run(db: Session) -> list[dict]:
+        return summarize_runs(db, filters, bucket)
+
+    if facility_id is not None:
+        buckets = shards.for_facility(facility_id).run(run)
+    else:
+        buckets = merge_summaries(shards.scatter(run))
+    return AgentRunSummaryOut(bucket=bucket, since=since, until=until, buckets=buckets)
@@ -1,18 +1,65 @@
+import json
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Iterator
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.core.db import get_db
+from app.core.events import CHECKIN_CREATED, publish
 from app.core.models import CheckIn
 from app.core.models import Patient
 from app.core.models import Facility
-from app.core.schemas import CheckInCreate, CheckInResponse
+from app.core.schemas import CheckInCreate, CheckInOut, CheckInResponse
+from app.core.profiling import ProfiledRoute
+from app.core.shards import merge_newest, shard_session, shards
+from app.core.write_lane import run_write
+from app.api.helpers.helpers_fieldsets import (
+    checkin_columns,
+    checkin_row_to_dict,
+    parse_fields,
+    sparse_response,
+)
+from app.api.helpers.helpers_idempotency import replay_stored, validate_key
+from app.api.helpers.helpers_patient_routes import checkin_to_dict
+from app.services.change_log import record_checkins
+from app.services.dashboard_stats import record_checkin_opened
+from app.services.idempotency import (
+    CHECKIN_CREATE,
+    get_stored,
+    request_fingerprint,
+    store_response,
+)
+from app.services.observation_index import filter_checkins, index_observations
+from app.services.risk_engine import refresh_patient_risk
+
+router = APIRouter(prefix="/checkins", tags=["checkins"], route_class=ProfiledRoute)
+
 
-router = APIRouter(prefix="/checkins", tags=["checkins"])
+def get_checkin_db(payload: CheckInCreate) -> Iterator[Session]:
+    # Check-ins live with their patient
+    yield from shard_session(shards.for_patient(payload.patient_id))
 
 
 @router.post("", response_model=CheckInResponse, status_code=status.HTTP_201_CREATED)
-def create_checkin(payload: CheckInCreate, db: Session = Depends(get_db)):
+def create_checkin(
+    payload: CheckInCreate,
+    idempotency_key: str | None = Header(default=None),
+    db: Session = Depends(get_checkin_db),
+):
+    """
+    Open a check-in.
+
+    With an Idempotency-Key header, a retry (same key + same body) returns
+    the original response instead of creating a second check-in.
+    """
+    idempotency_key = validate_key(idempotency_key)
+    request_hash = request_fingerprint(payload.model_dump(mode="json"))
+    if idempotency_key:
+        replay = replay_stored(db, CHECKIN_CREATE, idempotency_key, request_hash)
+        if replay is not None:
+            return replay
+
     # validate patient
     patient = db.get(Patient, payload.patient_id)
     if not patient:
@@ -26,16 +73,140 @@ def create_checkin(payload: CheckInCreate, db: Session = Depends(get_db)):
     if payload.source not in {"vht", "patient", "HC2", "sms", "ussd", "web"}:
         raise HTTPException(status_code=400, detail="Invalid source")
 
-    checkin = CheckIn(
-        id=str(uuid.uuid4()),   # ✅ REQUIRED
-        patient_id=payload.patient_id,
-        facility_id=payload.facility_id,
-        source=payload.source,
-        initial_complaint=payload.initial_complaint,
-    )
+    vht_id = patient.vht_id
+
+    def write(wdb: Session) -> str | None:
+        # A concurrent duplicate may have committed since the check above
+        if idempotency_key and get_stored(wdb, CHECKIN_CREATE, idempotency_key):
+            return None
+
+        checkin = CheckIn(
+            id=str(uuid.uuid4()),   # ✅ REQUIRED
+            patient_id=payload.patient_id,
+            facility_id=payload.facility_id,
+            source=payload.source,
+            initial_complaint=payload.initial_complaint,
+            observations_json=(
+                json.dumps(payload.observations) if payload.observations is not None else None
+            ),
+            recorded_by=payload.recorded_by,
+            notes=payload.notes,
+        )
+
+        wdb.add(checkin)
+        # Queryable projection is written in the same transaction as the check-in
+        if payload.observations is not None:
+            index_observations(wdb, checkin.id, payload.observations)
+        refresh_patient_risk(wdb, [checkin.patient_id])
+        record_checkin_opened(wdb, checkin.facility_id, vht_id)
+        record_checkins(wdb, [(checkin.id, checkin.facility_id, vht_id)])
+
+        if idempotency_key:
+            wdb.flush()
+            stored = store_response(
+                wdb,
+                CHECKIN_CREATE,
+                idempotency_key,
+                request_hash,
+                status.HTTP_201_CREATED,
+                CheckInResponse.model_validate(checkin).model_dump(mode="json"),
+            )
+            if not stored:
+                # Rolls this check-in back
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is already in progress",
+                )
+        return checkin.id
 
-    db.add(checkin)
-    db.commit()
-    db.refresh(checkin)
+    checkin_id = run_write(db, write)
+    if checkin_id is None:
+        return replay_stored(db, CHECKIN_CREATE, idempotency_key, request_hash)
 
+    checkin = db.get(CheckIn, checkin_id)
+    publish(
+        checkin.facility_id,
+        CHECKIN_CREATED,
+        {
+            **CheckInResponse.model_validate(checkin).model_dump(mode="json"),
+            "vht_id": vht_id,
+            "initial_complaint": checkin.initial_complaint,
+        },
+    )
     return checkin
+
+
+@router.get("/search", response_model=list[CheckInOut])
+def search_checkins(
+    facility_id: int | None = Query(default=None),
+    patient_id: int | None = Query(default=None),
+    status: str | None = Query(default=None, description="open | closed"),
+    fever: bool | None = Query(default=None),
+    temp_min: float | None = Query(default=None),
+    temp_max: float | None = Query(default=None),
+    danger_sign: list[str] = Query(default=[], description="Repeatable; all must match"),
+    symptom: list[str] = Query(default=[], description="Repeatable; all must match"),
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    fields: str | None = Query(default=None, description="Comma-separated fields"),
+):
+    """
+    Search check-ins by observation fields.
+
+    All filters run in SQL against the indexed observation projection;
+    observations_json is only decoded for the returned page.
+    ?fields= narrows the SELECT to the requested columns.
+    Without facility_id or patient_id every district shard is searched.
+    """
+    selected = parse_fields(fields, CheckInOut.model_fields)
+    if selected:
+        # created_at is always read: the cross-shard merge orders on it
+        columns = selected if "created_at" in selected else selected + ["created_at"]
+        stmt = select(*checkin_columns(columns))
+    else:
+        stmt = select(CheckIn)
+
+    if facility_id is not None:
+        stmt = stmt.where(CheckIn.facility_id == facility_id)
+    if patient_id is not None:
+        stmt = stmt.where(CheckIn.patient_id == patient_id)
+    if status is not None:
+        stmt = stmt.where(CheckIn.status == status)
+
+    stmt = filter_checkins(
+        stmt,
+        fever=fever,
+        temp_min=temp_min,
+        temp_max=temp_max,
+        danger_signs=danger_sign,
+        symptoms=symptom,
+    )
+    stmt = stmt.order_by(CheckIn.created_at.desc())
+
+    def run(db: Session, rows: int, skip: int) -> list:
+        page = stmt.limit(rows).offset(skip)
+        if selected:
+            return [checkin_row_to_dict(r) for r in db.execute(page).all()]
+        return [
+            CheckInOut.model_validate(checkin_to_dict(c)) for c in db.execute(page).scalars()
+        ]
+
+    if facility_id is not None:
+        checkins = shards.for_facility(facility_id).run(lambda db: run(db, limit, offset))
+    elif patient_id is not None:
+        checkins = shards.for_patient(patient_id).run(lambda db: run(db, limit, offset))
+    else:
+        # Each shard returns its first offset + limit rows; the page is cut after merging
+        per_shard = shards.scatter(lambda db: run(db, offset + limit, 0))
+        if selected:
+            checkins = merge_newest(per_shard, key=lambda c: c["created_at"], limit=offset + limit)
+        else:
+            checkins = merge_newest(per_shard, key=lambda c: c.created_at, limit=offset + limit)
+        checkins = checkins[offset:]
+
+    if not selected:
+        return checkins
+    if "created_at" not in selected:
+        for checkin in checkins:
+            del checkin["created_at"]
+    return sparse_response(checkins)
@@ -0,0 +1,121 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.models import Escalation, Facility
+from app.core.schemas import EscalationClaim, EscalationComplete, EscalationOut
+from app.core.profiling import ProfiledRoute
+from app.core.shards import get_facility_db
+from app.services.escalations import escalation_queue
+
+router = APIRouter(
+    prefix="/facilities/{facility_id}/escalations",
+    tags=["escalations"],
+    route_class=ProfiledRoute,
+)
+
+
+def _lease_seconds(requested: int | None) -> int:
+    seconds = requested or settings.ESCALATION_LEASE_SECONDS
+    return min(seconds, settings.ESCALATION_MAX_LEASE_SECONDS)
+
+
+def _get_escalation(db: Session, facility_id: int, escalation_id: int) -> Escalation:
+    escalation = db.get(Escalation, escalation_id)
+    if escalation is None or escalation.facility_id != facility_id:
+        raise HTTPException(status_code=404, detail="Escalation not found")
+    return escalation
+
+
+@router.get("", response_model=list[EscalationOut])
+def list_escalations(
+    facility_id: int,
+    limit: int = Query(default=20, ge=1, le=200),
+    db: Session = Depends(get_facility_db),
+):
+    """
+    Cases waiting for a clinician, in the order claim hands them out
+    (plan priority, then risk, then longest wait).
+    """
+    if not db.get(Facility, facility_id):
+        raise HTTPException(status_code=404, detail="Facility not found")
+
+    ids = escalation_queue(db).peek(db, facility_id, limit)
+    if not ids:
+        return []
+    rows = {
+        e.id: e
+        for e in db.execute(select(Escalation).where(Escalation.id.in_(ids))).scalars()
+    }
+    return [rows[i] for i in ids if i in rows]
+
+
+@router.post(
+    "/claim",
+    response_model=EscalationOut,
+    responses={204: {"description": "Queue is empty"}},
+)
+def claim_escalation(
+    facility_id: int,
+    payload: EscalationClaim,
+    db: Session = Depends(get_facility_db),
+):
+    """
+    Lease the most urgent case to a clinician. Unless completed, released
+    or renewed before the lease ends, the case goes back into the queue.
+    """
+    if not db.get(Facility, facility_id):
+        raise HTTPException(status_code=404, detail="Facility not found")
+
+    escalation_id = escalation_queue(db).claim(
+        db, facility_id, payload.clinician, _lease_seconds(payload.lease_seconds)
+    )
+    if escalation_id is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return db.get(Escalation, escalation_id)
+
+
+@router.post("/{escalation_id}/renew", response_model=EscalationOut)
+def renew_escalation(
+    facility_id: int,
+    escalation_id: int,
+    payload: EscalationClaim,
+    db: Session = Depends(get_facility_db),
+):
+    escalation = _get_escalation(db, facility_id, escalation_id)
+    renewed = escalation_queue(db).renew(
+        db, escalation, payload.clinician, _lease_seconds(payload.lease_seconds)
+    )
+    if not renewed:
+        raise HTTPException(status_code=409, detail="Escalation is not leased to this clinician")
+    return db.get(Escalation, escalation_id)
+
+
+@router.post("/{escalation_id}/release", response_model=EscalationOut)
+def release_escalation(
+    facility_id: int,
+    escalation_id: int,
+    payload: EscalationComplete,
+    db: Session = Depends(get_facility_db),
+):
+    escalation = _get_escalation(db, facility_id, escalation_id)
+    if not escalation_queue(db).release(db, escalation, payload.clinician):
+        raise HTTPException(status_code=409, detail="Escalation is not leased to this clinician")
+    return db.get(Escalation, escalation_id)
+
+
+@router.post("/{escalation_id}/complete", response_model=EscalationOut)
+def complete_escalation(
+    facility_id: int,
+    escalation_id: int,
+    payload: EscalationComplete,
+    db: Session = Depends(get_facility_db),
+):
+    _get_escalation(db, facility_id, escalation_id)
+    completed = escalation_queue(db).complete(
+        db, escalation_id, payload.clinician, payload.outcome
+    )
+    if not completed:
+        raise HTTPException(status_code=409, detail="Escalation is not leased to this clinician")
+    return db.get(Escalation, escalation_id)
@@ -1,19 +1,47 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from app.core.db import get_db
-from app.core.models import Facility, VHT
-from app.core.schemas import FacilityOut, VHTOut
+from app.api.helpers.helpers_http_cache import conditional_response, make_etag
+from app.core.config import settings
+from app.core.db import SessionLocal, get_db
+from app.core.events import DROPPED, RESYNC, bus, format_sse
+from app.core.models import Facility, Patient, VHT, utcnow
+from app.core.schemas import (
+    FacilityOut,
+    FacilityStatsOut,
+    NationalStatsOut,
+    PatientRiskOut,
+    ReferralFacilityOut,
+    ReferralOut,
+    VHTOut,
+)
+from app.core.profiling import ProfiledRoute
+from app.core.shards import get_facility_db, shards
+from app.services.dashboard_stats import counters_by_facility, facility_stats, national_stats
+from app.services.data_versions import REFERENCE, get_version
+from app.services.referrals import get_referral_index
+from app.services.risk_engine import top_at_risk
 
-router = APIRouter(prefix="/facilities", tags=["facilities"])
+router = APIRouter(prefix="/facilities", tags=["facilities"], route_class=ProfiledRoute)
 
 
 @router.get("", response_model=list[FacilityOut])
 def list_facilities(
+    request: Request,
+    response: Response,
     level: str | None = Query(default=None, description="Filter by level: HC2 or HC3"),
     db: Session = Depends(get_db),
 ):
+    reference_version, changed_at = get_version(db, REFERENCE)
+    etag = make_etag("facilities", reference_version, level)
+    not_modified = conditional_response(request, response, etag, changed_at)
+    if not_modified is not None:
+        return not_modified
+
     stmt = select(Facility)
     if level:
         stmt = stmt.where(Facility.level == level)
@@ -21,6 +49,84 @@ def list_facilities(
     return facilities
 
 
+@router.get("/stats/national", response_model=NationalStatsOut)
+def get_national_stats():
+    """
+    Country-wide dashboard counts with a per-district breakdown, gathered
+    from every district shard in parallel (summary tables only).
+    """
+    day = utcnow().date()
+    per_shard = shards.scatter(lambda db: counters_by_facility(db, day))
+    with shards.default.session() as db:
+        district_of = dict(db.execute(select(Facility.id, Facility.district)).all())
+    return national_stats(per_shard, district_of, day)
+
+
+@router.get("/referrals", response_model=ReferralOut)
+def find_referral_facilities(
+    latitude: float | None = Query(default=None, ge=-90, le=90),
+    longitude: float | None = Query(default=None, ge=-180, le=180),
+    patient_id: int | None = Query(default=None, description="From the patient's village"),
+    facility_id: int | None = Query(default=None, description="From this facility (excluded)"),
+    level: Literal["HC2", "HC3"] | None = Query(default=None),
+    k: int = Query(default=3, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    """
+    Nearest facilities (optionally of one level) to a point, a patient
+    or a facility, closest first, from the in-memory referral index.
+
+    A patient is placed at her village when it has coordinates, else at
+    her registered facility; a facility origin is itself excluded (referral
+    onwards). Facilities without coordinates are never returned.
+    """
+    if sum(x is not None for x in (latitude, patient_id, facility_id)) != 1 or (
+        (latitude is None) != (longitude is None)
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="Give exactly one of latitude+longitude, patient_id or facility_id",
+        )
+    index = get_referral_index(db)
+
+    exclude = None
+    if latitude is not None:
+        origin = (latitude, longitude, "query")
+    elif patient_id is not None:
+        with shards.for_patient(patient_id).session() as pdb:
+            patient = pdb.get(Patient, patient_id)
+            if not patient:
+                raise HTTPException(status_code=404, detail="Patient not found")
+            origin = index.locate(patient.village, patient.parish, patient.facility_id)
+    else:
+        if db.get(Facility, facility_id) is None:
+            raise HTTPException(status_code=404, detail="Facility not found")
+        origin = index.locate(facility_id=facility_id)
+        exclude = facility_id
+    if origin is None:
+        raise HTTPException(status_code=422, detail="No coordinates for this origin")
+
+    lat, lon, source = origin
+    nearest = index.nearest(lat, lon, k=k, level=level, exclude=exclude)
+    return ReferralOut(
+        origin=source,
+        latitude=lat,
+        longitude=lon,
+        facilities=[
+            ReferralFacilityOut(
+                id=f.id,
+                name=f.name,
+                level=f.level,
+                district=f.district,
+                latitude=f.latitude,
+                longitude=f.longitude,
+                distance_km=round(distance, 3),
+            )
+            for f, distance in nearest
+        ],
+    )
+
+
 @router.get("/{facility_id}", response_model=FacilityOut)
 def get_facility(facility_id: int, db: Session = Depends(get_db)):
     facility = db.get(Facility, facility_id)
@@ -31,12 +137,123 @@ def get_facility(facility_id: int, db: Session = Depends(get_db)):
 
 # 🔽 NEW: list VHTs for a given facility
 @router.get("/{facility_id}/vhts", response_model=list[VHTOut])
-def list_facility_vhts(facility_id: int, db: Session = Depends(get_db)):
+def list_facility_vhts(
+    facility_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
     # Optional safety check: ensure facility exists
     facility = db.get(Facility, facility_id)
     if not facility:
         raise HTTPException(status_code=404, detail="Facility not found")
 
+    reference_version, changed_at = get_version(db, REFERENCE)
+    etag = make_etag("facility-vhts", facility_id, reference_version)
+    not_modified = conditional_response(request, response, etag, changed_at)
+    if not_modified is not None:
+        return not_modified
+
     stmt = select(VHT).where(VHT.facility_id == facility_id)
     vhts = db.execute(stmt).scalars().all()
     return vhts
+
+
+@router.get("/{facility_id}/at-risk", response_model=list[PatientRiskOut])
+def list_facility_at_risk(
+    facility_id: int,
+    top: int = Query(default=20, ge=1, le=500),
+    db: Session = Depends(get_facility_db),
+):
+    """
+    Ranked highest-risk active patients for a facility.
+
+    Served from the materialized patient_risk table (facility_id, score index).
+    """
+    facility = db.get(Facility, facility_id)
+    if not facility:
+        raise HTTPException(status_code=404, detail="Facility not found")
+
+    return [
+        PatientRiskOut(
+            patient_id=patient.id,
+            name=patient.name,
+            village=patient.village,
+            vht_id=patient.vht_id,
+            score=risk.score,
+            tier=risk.tier,
+            danger_sign_count=risk.danger_sign_count,
+            gestational_age_weeks=patient.gestational_age_weeks,
+            missed_anc_count=patient.missed_anc_count,
+            computed_at=risk.computed_at,
+        )
+        for risk, patient in top_at_risk(db, facility_id, top)
+    ]
+
+
+@router.get("/{facility_id}/stats", response_model=FacilityStatsOut)
+def get_facility_stats(facility_id: int, db: Session = Depends(get_facility_db)):
+    """
+    Supervisor dashboard counts (facility totals + per-VHT breakdown).
+
+    Read from incrementally maintained summary tables, not from patients.
+    """
+    facility = db.get(Facility, facility_id)
+    if not facility:
+        raise HTTPException(status_code=404, detail="Facility not found")
+
+    return facility_stats(db, facility_id)
+
+
+@router.get("/{facility_id}/events", response_class=StreamingResponse)
+def stream_facility_events(
+    facility_id: int,
+    last_event_id: str | None = Header(default=None),
+    last_id: str | None = Query(
+        default=None, description="Resume point for clients that can't set Last-Event-ID"
+    ),
+):
+    """
+    Server-sent events for a facility dashboard: new check-ins
+    (checkin.created) and agent outcomes (agent_run.completed) as they
+    are committed.
+
+    EventSource reconnects with Last-Event-ID and missed events are
+    replayed. A "resync" event means they can't be (restart, or the gap
+    is too old): refetch the lists, then keep listening. "dropped" means
+    this client fell behind and should reconnect.
+    """
+    # No Depends(get_db): the stream must not hold a pooled connection
+    with SessionLocal() as db:
+        if db.get(Facility, facility_id) is None:
+            raise HTTPException(status_code=404, detail="Facility not found")
+
+    resume_from = last_event_id or last_id
+
+    async def stream():
+        sub, missed = bus.subscribe(facility_id, resume_from)
+        try:
+            yield "retry: 3000\n\n"
+            if missed is None:
+                yield format_sse(RESYNC, {"facility_id": facility_id})
+            else:
+                for event in missed:
+                    yield format_sse(event.type, event.data, event.id)
+
+            while True:
+                events = await sub.next_events(settings.EVENTS_KEEPALIVE_SECONDS)
+                if not events and not sub.dropped:
+                    yield ": keepalive\n\n"
+                for event in events:
+                    yield format_sse(event.type, event.data, event.id)
+                if sub.dropped:
+                    yield format_sse(DROPPED, {"facility_id": facility_id})
+                    return
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
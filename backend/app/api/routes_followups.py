@@ -0,0 +1,102 @@
+from datetime import timedelta
+from typing import Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.agents.policies import ALLOWED_TOOLS
+from app.core.models import CheckIn, Patient, ScheduledTask, utcnow
+from app.core.schemas import FollowUpCreate, ScheduledTaskOut
+from app.core.profiling import ProfiledRoute
+from app.core.shards import shard_session, shards
+from app.core.write_lane import run_write
+from app.services.scheduler import cancel_task, notify_scheduled, schedule_task
+
+router = APIRouter(prefix="/followups", tags=["followups"], route_class=ProfiledRoute)
+
+
+def get_followup_db(payload: FollowUpCreate) -> Iterator[Session]:
+    # Tasks live with their patient (the shard's scheduler fires them)
+    yield from shard_session(shards.for_patient(payload.patient_id))
+
+
+@router.post("", response_model=ScheduledTaskOut, status_code=status.HTTP_201_CREATED)
+def create_followup(payload: FollowUpCreate, db: Session = Depends(get_followup_db)):
+    """
+    Schedule a timed tool action (follow-up SMS, re-check) for a patient.
+    """
+    if payload.tool_name not in ALLOWED_TOOLS:
+        raise HTTPException(status_code=400, detail="Invalid tool_name")
+
+    if not db.get(Patient, payload.patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    if payload.checkin_id is not None and not db.get(CheckIn, payload.checkin_id):
+        raise HTTPException(status_code=404, detail="Check-in not found")
+
+    if payload.due_at is not None:
+        due_at = payload.due_at.replace(tzinfo=None)
+    elif payload.delay_minutes is not None:
+        due_at = utcnow() + timedelta(minutes=payload.delay_minutes)
+    else:
+        raise HTTPException(status_code=400, detail="Provide due_at or delay_minutes")
+
+    def write(wdb: Session) -> int:
+        return schedule_task(
+            wdb,
+            tool_name=payload.tool_name,
+            patient_id=payload.patient_id,
+            due_at=due_at,
+            checkin_id=payload.checkin_id,
+            payload=payload.payload,
+        )
+
+    task_id = run_write(db, write)
+    notify_scheduled(db, task_id, due_at)
+
+    return db.get(ScheduledTask, task_id)
+
+
+@router.get("", response_model=list[ScheduledTaskOut])
+def list_followups(
+    patient_id: int | None = Query(default=None),
+    status: str | None = Query(default=None, description="pending | done | failed | ..."),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    stmt = select(ScheduledTask)
+    if patient_id is not None:
+        stmt = stmt.where(ScheduledTask.patient_id == patient_id)
+    if status is not None:
+        stmt = stmt.where(ScheduledTask.status == status)
+    stmt = stmt.order_by(ScheduledTask.due_at).limit(limit)
+
+    def run(db: Session) -> list[ScheduledTask]:
+        return list(db.execute(stmt).scalars())
+
+    if patient_id is not None:
+        return shards.for_patient(patient_id).run(run)
+    tasks = [task for result in shards.scatter(run) for task in result]
+    return sorted(tasks, key=lambda t: t.due_at)[:limit]
+
+
+def get_task_db(
+    patient_id: int | None = Query(
+        default=None, description="Task's patient (required with district shards)"
+    ),
+) -> Iterator[Session]:
+    # Task ids are only unique within a shard
+    if patient_id is None and shards.enabled:
+        raise HTTPException(status_code=400, detail="patient_id is required")
+    shard = shards.for_patient(patient_id) if patient_id is not None else shards.default
+    yield from shard_session(shard)
+
+
+@router.delete("/{task_id}", response_model=ScheduledTaskOut)
+def cancel_followup(task_id: int, db: Session = Depends(get_task_db)):
+    task = db.get(ScheduledTask, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Follow-up not found")
+    if not run_write(db, lambda wdb: cancel_task(wdb, task_id)):
+        raise HTTPException(status_code=409, detail=f"Follow-up already {task.status}")
+    db.refresh(task)
+    return task
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.db import engine
+from app.core.profiling import ProfiledRoute
+from app.core.telemetry import render_metrics
+
+router = APIRouter(tags=["metrics"], route_class=ProfiledRoute)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint (per-process; scrape each worker).
+    """
+    return PlainTextResponse(
+        render_metrics(engine), media_type="text/plain; version=0.0.4"
+    )
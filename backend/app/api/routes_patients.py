@@ -1,75 +1,155 @@
 from __future__ import annotations
 
 
-from typing import Sequence
+from typing import Iterator, Sequence
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
 
-from app.core.db import get_db
-from app.core.models import Patient, CheckIn
+from app.core.models import Facility, Patient, CheckIn, VHT
+from app.core.profiling import ProfiledRoute
+from app.core.shards import get_patient_db, merge_newest, shard_session, shards
 from app.core.schemas import (
+    CheckInOut,
+    DuplicateCandidateOut,
+    FacilityOut,
     PatientCreate,
+    PatientCreatedOut,
     PatientUpdate,
     PatientListOut,
     PatientDetailOut,
+    PatientSearchHit,
+    TimelineOut,
+    VHTOut,
 )
+from app.core.write_lane import run_write
+from app.api.helpers.helpers_fieldsets import (
+    checkin_columns,
+    checkin_row_to_dict,
+    columns_for,
+    parse_fields,
+    parse_include,
+    sparse_response,
+)
+from app.api.helpers.helpers_http_cache import conditional_response, make_etag
 from app.api.helpers.helpers_patient_routes import (
     patient_to_detail_out,
+    patient_version,
     validate_facility,
     validate_vht,
 )
+from app.services.dashboard_stats import (
+    apply_patient_change,
+    move_open_checkins,
+    patient_key,
+)
+from app.services.archive import recent_checkins_with_archive
+from app.services.change_log import record_patient_change
+from app.services.data_versions import REFERENCE, get_version
+from app.services.duplicates import MIN_SCORE, find_duplicates, sync_block_keys
+from app.services.patient_search import (
+    find_by_phone,
+    search_by_name,
+    sync_patient_search,
+)
+from app.services.risk_engine import refresh_patient_risk
+from app.services.timeline import EVENT_TYPES, patient_timeline, record_status_change
+
+router = APIRouter(prefix="/patients", tags=["patients"], route_class=ProfiledRoute)
+
+# Sparse fieldsets (?fields= / ?include=)
+PATIENT_RELATIONS = {"facility", "vht", "recent_checkins"}
+PATIENT_DETAIL_FIELDS = [
+    f for f in PatientDetailOut.model_fields if f not in PATIENT_RELATIONS
+]
 
-router = APIRouter(prefix="/patients", tags=["patients"])
 
+def get_new_patient_db(payload: PatientCreate) -> Iterator[Session]:
+    yield from shard_session(shards.for_facility(payload.facility_id))
 
-@router.post("", response_model=PatientDetailOut)
+
+@router.post("", response_model=PatientCreatedOut)
 def create_patient(
-    payload: PatientCreate, db: Session = Depends(get_db)
-) -> PatientDetailOut:
+    payload: PatientCreate, db: Session = Depends(get_new_patient_db)
+) -> PatientCreatedOut:
     """
     Create an onboarded patient profile (MD-aligned baseline).
 
     Returns deep, agent-ready profile:
     - nested facility + vht
     - empty recent_checkins (new patient)
+    - possible_duplicates: existing registrations in the district that are
+      likely the same mother, for the VHT to review
+
+    The patient is stored in the shard of its facility's district.
     """
     validate_facility(db, payload.facility_id)
 
     if payload.vht_id is not None:
         validate_vht(db, payload.vht_id, payload.facility_id)
 
-    patient = Patient(
-        name=payload.name,
-        phone=payload.phone,
-        backup_phone=payload.backup_phone,
-        village=payload.village,
-        parish=payload.parish,
-        facility_id=payload.facility_id,
-        vht_id=payload.vht_id,
-        gestational_age_weeks=payload.gestational_age_weeks,
-        missed_anc_count=payload.missed_anc_count,
-        prior_malaria=payload.prior_malaria,
-        high_burden_zone=payload.high_burden_zone,
-        consent_sms=payload.consent_sms,
-        preferred_language=payload.preferred_language,
-        status=payload.status,
-        status_reason=payload.status_reason,
+    # Checked before the write, off the writer thread (bounded blocking-key lookups)
+    duplicates = find_duplicates(
+        db,
+        payload.name,
+        payload.village,
+        payload.parish,
+        phones=(payload.phone, payload.backup_phone),
     )
 
-    db.add(patient)
-    db.commit()
-    db.refresh(patient)
+    # Globally unique across shards (None when unsharded)
+    new_id = shards.allocate_patient_id(shards.for_facility(payload.facility_id))
+
+    def write(wdb: Session) -> int:
+        patient = Patient(
+            id=new_id,
+            name=payload.name,
+            phone=payload.phone,
+            backup_phone=payload.backup_phone,
+            village=payload.village,
+            parish=payload.parish,
+            facility_id=payload.facility_id,
+            vht_id=payload.vht_id,
+            gestational_age_weeks=payload.gestational_age_weeks,
+            missed_anc_count=payload.missed_anc_count,
+            prior_malaria=payload.prior_malaria,
+            high_burden_zone=payload.high_burden_zone,
+            consent_sms=payload.consent_sms,
+            preferred_language=payload.preferred_language,
+            status=payload.status,
+            status_reason=payload.status_reason,
+        )
+        wdb.add(patient)
+        wdb.flush()
+        refresh_patient_risk(wdb, [patient.id])
+        apply_patient_change(wdb, None, patient_key(patient))
+        sync_patient_search(wdb, patient)
+        sync_block_keys(wdb, patient)
+        record_patient_change(wdb, patient.id, None, (patient.facility_id, patient.vht_id))
+        record_status_change(wdb, patient.id, None, patient.status, patient.status_reason)
+        return patient.id
+
+    patient_id = run_write(db, write)
 
     # Reload with nested facility/vht for consistent response
     patient = db.execute(
         select(Patient)
         .options(joinedload(Patient.facility), joinedload(Patient.vht))
-        .where(Patient.id == patient.id)
+        .where(Patient.id == patient_id)
     ).scalar_one()
 
-    return patient_to_detail_out(patient, recent_checkins=[])
+    detail = patient_to_detail_out(patient, recent_checkins=[])
+    return PatientCreatedOut(
+        **detail.model_dump(),
+        possible_duplicates=[_duplicate_out(*match) for match in duplicates],
+    )
+
+
+def _duplicate_out(patient: Patient, score: float, matched: list[str]) -> DuplicateCandidateOut:
+    return DuplicateCandidateOut(
+        patient=PatientListOut.model_validate(patient), score=score, matched_on=matched
+    )
 
 
 @router.get("", response_model=list[PatientListOut])
@@ -79,14 +159,22 @@ def list_patients(
     status: str | None = Query(default=None, description="active | paused | closed"),
     missed_anc_min: int | None = Query(default=None, ge=0),
     gest_age_min: int | None = Query(default=None, ge=1, le=45),
-    db: Session = Depends(get_db),
-) -> list[PatientListOut]:
+    fields: str | None = Query(default=None, description="Comma-separated fields"),
+):
     """
     List patients (lightweight).
 
     Designed for dashboards & operational filtering.
+    ?fields= narrows the SELECT to the requested columns.
+    Without a facility or VHT filter every district shard is queried.
     """
-    stmt = select(Patient)
+    selected = parse_fields(fields, PatientListOut.model_fields)
+    if selected:
+        # updated_at is always read: the cross-shard merge orders on it
+        columns = selected if "updated_at" in selected else selected + ["updated_at"]
+        stmt = select(*columns_for(Patient, columns))
+    else:
+        stmt = select(Patient)
 
     if facility_id is not None:
         stmt = stmt.where(Patient.facility_id == facility_id)
@@ -101,20 +189,160 @@ def list_patients(
 
     stmt = stmt.order_by(Patient.updated_at.desc())
 
-    # SQLAlchemy stubs type this as Sequence[Patient]; FastAPI accepts it
-    patients = db.execute(stmt).scalars().all()
-    return [PatientListOut.model_validate(p) for p in patients]
+    def run(db: Session) -> list:
+        if selected:
+            return [dict(r._mapping) for r in db.execute(stmt).all()]
+        return [PatientListOut.model_validate(p) for p in db.execute(stmt).scalars()]
+
+    if facility_id is not None:
+        patients = shards.for_facility(facility_id).run(run)
+    elif vht_id is not None:
+        patients = shards.for_vht(vht_id).run(run)
+    elif selected:
+        patients = merge_newest(shards.scatter(run), key=lambda p: p["updated_at"])
+    else:
+        patients = merge_newest(shards.scatter(run), key=lambda p: p.updated_at)
+
+    if not selected:
+        return patients
+    if "updated_at" not in selected:
+        for patient in patients:
+            del patient["updated_at"]
+    return sparse_response(patients)
+
+
+@router.get("/search", response_model=list[PatientSearchHit])
+def search_patients(
+    phone: str | None = Query(default=None, description="Any format; normalized to E.164"),
+    q: str | None = Query(default=None, min_length=2, description="Name (fuzzy)"),
+    village: str | None = Query(default=None),
+    facility_id: int | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+) -> list[PatientSearchHit]:
+    """
+    Identify a mother by phone (exact, indexed) and/or fuzzy name + village.
+
+    Phone hits come first with score 1.0; name hits are ranked by
+    similarity over an FTS5 trigram candidate set. Without facility_id
+    every district shard is searched and the hits are merged by rank.
+    """
+    if phone is None and q is None:
+        raise HTTPException(status_code=400, detail="Provide phone and/or q")
+
+    def run(db: Session) -> list[PatientSearchHit]:
+        return _search(db, phone, q, village, facility_id, limit)
+
+    if facility_id is not None:
+        return shards.for_facility(facility_id).run(run)
+    hits = [hit for result in shards.scatter(run) for hit in result]
+    hits.sort(key=lambda h: (h.matched_on != "phone", -h.score))
+    return hits[:limit]
+
+
+def _search(
+    db: Session,
+    phone: str | None,
+    q: str | None,
+    village: str | None,
+    facility_id: int | None,
+    limit: int,
+) -> list[PatientSearchHit]:
+    hits: list[PatientSearchHit] = []
+    seen: set[int] = set()
+
+    if phone is not None:
+        ids = find_by_phone(db, phone)
+        if ids:
+            stmt = select(Patient).where(Patient.id.in_(ids))
+            if facility_id is not None:
+                stmt = stmt.where(Patient.facility_id == facility_id)
+            for p in db.execute(stmt).scalars():
+                seen.add(p.id)
+                hits.append(
+                    PatientSearchHit(
+                        patient=PatientListOut.model_validate(p),
+                        score=1.0,
+                        matched_on="phone",
+                    )
+                )
+
+    if q is not None:
+        for p, score in search_by_name(db, q, village, facility_id, limit):
+            if p.id in seen:
+                continue
+            hits.append(
+                PatientSearchHit(
+                    patient=PatientListOut.model_validate(p),
+                    score=score,
+                    matched_on="name",
+                )
+            )
+
+    return hits[:limit]
 
 
 @router.get("/{patient_id}", response_model=PatientDetailOut)
 def get_patient(
     patient_id: int,
+    request: Request,
+    response: Response,
     recent_checkins_limit: int = Query(default=5, ge=0, le=50),
-    db: Session = Depends(get_db),
-) -> PatientDetailOut:
+    fields: str | None = Query(default=None, description="Comma-separated patient fields"),
+    include: str | None = Query(
+        default=None, description="Comma-separated: facility, vht, recent_checkins"
+    ),
+    checkin_fields: str | None = Query(
+        default=None, description="Comma-separated fields for recent_checkins"
+    ),
+    db: Session = Depends(get_patient_db),
+):
     """
     Get deep, agent-ready patient profile including recent checkins.
+
+    Supports conditional GET (ETag / If-None-Match): validators come from
+    updated_at, the latest check-in and the reference-data version, so a
+    304 is answered before any hydration.
+
+    Sparse fieldsets: with ?fields= and/or ?include= only the selected
+    columns are queried and unrequested relations are never loaded.
+    ?fields= alone returns no relations; no parameters = full profile.
     """
+    selected = parse_fields(fields, PATIENT_DETAIL_FIELDS)
+    relations = parse_include(include, PATIENT_RELATIONS)
+    selected_checkin = parse_fields(checkin_fields, CheckInOut.model_fields)
+
+    version = patient_version(db, patient_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    parts, last_modified = version
+    reference_version, _ = get_version(db, REFERENCE)
+
+    etag = make_etag(
+        "patient",
+        *parts,
+        reference_version,
+        recent_checkins_limit,
+        selected,
+        sorted(relations) if relations is not None else None,
+        selected_checkin,
+    )
+    not_modified = conditional_response(request, response, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if selected is not None or relations is not None:
+        return sparse_response(
+            _load_sparse_patient(
+                db,
+                patient_id,
+                selected or PATIENT_DETAIL_FIELDS,
+                relations or set(),
+                selected_checkin,
+                recent_checkins_limit,
+            ),
+            response,
+        )
+
     patient = db.execute(
         select(Patient)
         .options(joinedload(Patient.facility), joinedload(Patient.vht))
@@ -136,15 +364,143 @@ def get_patient(
             .scalars()
             .all()
         )
+        # Older history may have been moved to the archive
+        recent_checkins = recent_checkins_with_archive(
+            db, patient_id, list(recent_checkins), recent_checkins_limit
+        )
 
     return patient_to_detail_out(patient, recent_checkins=recent_checkins)
 
 
+def _merge_archived_rows(
+    db: Session, patient_id: int, rows: list, columns: list, limit: int
+) -> list[dict]:
+    """
+    Projected hot rows + archived check-ins, newest first (sparse path).
+    """
+    keys = [c.key for c in columns]
+    merged = [dict(r._mapping) for r in rows] + [
+        {k: getattr(c, k) for k in keys}
+        for c in recent_checkins_with_archive(db, patient_id, [], limit)
+    ]
+    if "created_at" in keys:
+        merged.sort(key=lambda r: r["created_at"], reverse=True)
+    return merged[:limit]
+
+
+def _load_sparse_patient(
+    db: Session,
+    patient_id: int,
+    fields: list[str],
+    relations: set[str],
+    checkin_fields: list[str] | None,
+    recent_checkins_limit: int,
+) -> dict:
+    """
+    Column-projected patient read: one narrow SELECT plus one per
+    requested relation.
+    """
+    # FK columns are needed to follow relations even if not requested
+    extra = [f for f in ("facility_id", "vht_id") if f not in fields]
+    row = db.execute(
+        select(*columns_for(Patient, fields + extra)).where(Patient.id == patient_id)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    data = dict(row._mapping)
+    facility_id, vht_id = data["facility_id"], data["vht_id"]
+    for f in extra:
+        data.pop(f)
+
+    if "facility" in relations:
+        facility = db.get(Facility, facility_id)
+        data["facility"] = FacilityOut.model_validate(facility) if facility else None
+    if "vht" in relations:
+        vht = db.get(VHT, vht_id) if vht_id is not None else None
+        data["vht"] = VHTOut.model_validate(vht) if vht else None
+    if "recent_checkins" in relations:
+        rows = []
+        if recent_checkins_limit > 0:
+            columns = checkin_columns(checkin_fields or CheckInOut.model_fields)
+            rows = db.execute(
+                select(*columns)
+                .where(CheckIn.patient_id == patient_id)
+                .order_by(CheckIn.created_at.desc())
+                .limit(recent_checkins_limit)
+            ).all()
+            if len(rows) < recent_checkins_limit:
+                rows = _merge_archived_rows(db, patient_id, rows, columns, recent_checkins_limit)
+        data["recent_checkins"] = [checkin_row_to_dict(r) for r in rows]
+
+    return data
+
+
+@router.get("/{patient_id}/duplicates", response_model=list[DuplicateCandidateOut])
+def list_patient_duplicates(
+    patient_id: int,
+    min_score: float = Query(default=MIN_SCORE, ge=0.0, le=1.0),
+    limit: int = Query(default=10, ge=1, le=50),
+    db: Session = Depends(get_patient_db),
+) -> list[DuplicateCandidateOut]:
+    """
+    Other registrations in the patient's district that are likely the same
+    mother (shared phone or blocking key, scored by name / place similarity).
+    """
+    patient = db.get(Patient, patient_id)
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    matches = find_duplicates(
+        db,
+        patient.name,
+        patient.village,
+        patient.parish,
+        phones=(patient.phone, patient.backup_phone),
+        exclude=patient.id,
+        min_score=min_score,
+        limit=limit,
+    )
+    return [_duplicate_out(*match) for match in matches]
+
+
+@router.get("/{patient_id}/timeline", response_model=TimelineOut)
+def get_patient_timeline(
+    patient_id: int,
+    cursor: str | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=50, ge=1, le=200),
+    types: str | None = Query(
+        default=None, description=f"Comma-separated subset of: {', '.join(EVENT_TYPES)}"
+    ),
+    db: Session = Depends(get_patient_db),
+):
+    """
+    A patient's check-ins, check-in closures, agent runs (with their plan)
+    and status changes in one newest-first feed, archived history included.
+
+    Keyset-paginated: every page costs the same however long the history.
+    """
+    wanted = None
+    if types:
+        wanted = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = sorted(wanted - set(EVENT_TYPES))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown event types: {unknown}")
+    if db.get(Patient, patient_id) is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    try:
+        events, next_cursor = patient_timeline(db, patient_id, cursor, limit, wanted)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return TimelineOut(patient_id=patient_id, events=events, next_cursor=next_cursor)
+
+
 @router.patch("/{patient_id}", response_model=PatientDetailOut)
 def update_patient(
     patient_id: int,
     payload: PatientUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_patient_db),
 ) -> PatientDetailOut:
     """
     Update patient profile safely (MD-aligned).
@@ -153,45 +509,72 @@ def update_patient(
     - facility_id must exist
     - vht_id must exist and match facility
     - gestational_age_weeks cannot go backwards
+    - facility_id must stay within the patient's district shard
     """
-    patient = db.execute(
-        select(Patient)
-        .options(joinedload(Patient.facility), joinedload(Patient.vht))
-        .where(Patient.id == patient_id)
-    ).scalar_one_or_none()
-
-    if patient is None:
-        raise HTTPException(status_code=404, detail="Patient not found")
-
-    data = payload.model_dump(exclude_unset=True)
+    if (
+        payload.facility_id is not None
+        and shards.for_facility(payload.facility_id) is not shards.for_patient(patient_id)
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="Moving a patient to a facility in another district is not supported",
+        )
 
-    # Facility change
-    if data.get("facility_id") is not None:
-        validate_facility(db, data["facility_id"])
-        patient.facility_id = data["facility_id"]
+    def write(wdb: Session) -> None:
+        patient = wdb.get(Patient, patient_id)
+        if patient is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
+
+        data = payload.model_dump(exclude_unset=True)
+        before = patient_key(patient)
+        status_before = patient.status
+        synced_to = (patient.facility_id, patient.vht_id)
+
+        # Facility change
+        if data.get("facility_id") is not None:
+            validate_facility(wdb, data["facility_id"])
+            patient.facility_id = data["facility_id"]
+
+        # VHT change (must match patient's facility — possibly updated above)
+        if data.get("vht_id") is not None:
+            validate_vht(wdb, data["vht_id"], patient.facility_id)
+            patient.vht_id = data["vht_id"]
+
+        # Gestational age should not regress
+        if data.get("gestational_age_weeks") is not None:
+            new_ga = data["gestational_age_weeks"]
+            if new_ga < patient.gestational_age_weeks:
+                raise HTTPException(
+                    status_code=400, detail="gestational_age_weeks cannot decrease"
+                )
+            patient.gestational_age_weeks = new_ga
+
+        # Apply remaining simple fields
+        skip_fields = {"facility_id", "vht_id", "gestational_age_weeks"}
+        for field, value in data.items():
+            if field in skip_fields:
+                continue
+            setattr(patient, field, value)
+
+        refresh_patient_risk(wdb, [patient_id])
+        record_status_change(
+            wdb, patient_id, status_before, patient.status, patient.status_reason
+        )
 
-    # VHT change (must match patient's facility — possibly updated above)
-    if data.get("vht_id") is not None:
-        validate_vht(db, data["vht_id"], patient.facility_id)
-        patient.vht_id = data["vht_id"]
+        # Keep dashboard counters in the same transaction
+        after = patient_key(patient)
+        apply_patient_change(wdb, before, after)
+        move_open_checkins(wdb, patient_id, before.vht_id, after.vht_id)
 
-    # Gestational age should not regress
-    if data.get("gestational_age_weeks") is not None:
-        new_ga = data["gestational_age_weeks"]
-        if new_ga < patient.gestational_age_weeks:
-            raise HTTPException(
-                status_code=400, detail="gestational_age_weeks cannot decrease"
-            )
-        patient.gestational_age_weeks = new_ga
+        if {"name", "village", "parish", "phone", "backup_phone"} & data.keys():
+            sync_patient_search(wdb, patient)
+            sync_block_keys(wdb, patient)
 
-    # Apply remaining simple fields
-    skip_fields = {"facility_id", "vht_id", "gestational_age_weeks"}
-    for field, value in data.items():
-        if field in skip_fields:
-            continue
-        setattr(patient, field, value)
+        # Offline devices pick the new version up on their next sync
+        record_patient_change(wdb, patient_id, synced_to, (patient.facility_id, patient.vht_id))
 
-    db.commit()
+    # Read-modify-write runs on the writer so concurrent PATCHes serialize
+    run_write(db, write)
 
     # Refresh / hydrate nested again
     patient = db.execute(
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api.helpers.helpers_patient_routes import checkin_to_dict
+from app.core.models import CheckIn, Facility, Patient, VHT
+from app.core.profiling import ProfiledRoute
+from app.core.shards import get_scope_db
+from app.core.schemas import (
+    CheckInOut,
+    FacilityOut,
+    PatientListOut,
+    SyncChangeOut,
+    SyncChangesOut,
+    VHTOut,
+)
+from app.services.change_log import (
+    CHECKIN,
+    FACILITY,
+    PATIENT,
+    REMOVE,
+    VHT as VHT_ENTITY,
+    changes_since,
+    facility_scope,
+    vht_scope,
+)
+
+router = APIRouter(prefix="/sync", tags=["sync"], route_class=ProfiledRoute)
+
+
+def _load_entities(db: Session, entity: str, ids: list[str]) -> dict[str, dict[str, Any]]:
+    """
+    Current rows for one entity type, keyed by string id (one query per type).
+    """
+    if entity == CHECKIN:
+        rows = db.execute(select(CheckIn).where(CheckIn.id.in_(ids))).scalars()
+        return {
+            c.id: CheckInOut.model_validate(checkin_to_dict(c)).model_dump(mode="json")
+            for c in rows
+        }
+
+    model, schema = {
+        PATIENT: (Patient, PatientListOut),
+        VHT_ENTITY: (VHT, VHTOut),
+        FACILITY: (Facility, FacilityOut),
+    }[entity]
+    rows = db.execute(select(model).where(model.id.in_([int(i) for i in ids]))).scalars()
+    return {str(r.id): schema.model_validate(r).model_dump(mode="json") for r in rows}
+
+
+@router.get("/changes", response_model=SyncChangesOut)
+def get_changes(
+    since: int = Query(default=0, ge=0, description="next_cursor from the previous call"),
+    facility_id: int | None = Query(default=None),
+    vht_id: int | None = Query(default=None),
+    limit: int = Query(default=500, ge=1, le=2000),
+    db: Session = Depends(get_scope_db),
+) -> SyncChangesOut:
+    """
+    Changes since a cursor for one facility or VHT device.
+
+    Compacted: each entity appears once, at its latest change, so a device
+    that was offline for days downloads O(changed entities). Start with
+    since=0 for a full download and keep paging while has_more is true.
+    """
+    if (facility_id is None) == (vht_id is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of facility_id or vht_id")
+    scope = facility_scope(facility_id) if facility_id is not None else vht_scope(vht_id)
+
+    page = changes_since(db, scope, since, limit + 1)
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    ids_by_entity: dict[str, list[str]] = {}
+    for change in page:
+        if change.op != REMOVE:
+            ids_by_entity.setdefault(change.entity, []).append(change.entity_id)
+    current = {
+        entity: _load_entities(db, entity, ids) for entity, ids in ids_by_entity.items()
+    }
+
+    changes = []
+    for change in page:
+        data = current.get(change.entity, {}).get(change.entity_id)
+        changes.append(
+            SyncChangeOut(
+                seq=change.seq,
+                entity=change.entity,
+                id=change.entity_id,
+                # Row gone since it was logged: tell the device to drop it
+                op=change.op if data is not None else REMOVE,
+                data=data,
+            )
+        )
+
+    return SyncChangesOut(
+        changes=changes,
+        next_cursor=page[-1].seq if page else since,
+        has_more=has_more,
+    )
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Header, HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.schemas import InboundBatchIn, InboundBatchOut
+from app.core.profiling import ProfiledRoute
+from app.services.agent_queue import enqueue_agent_runs
+from app.services.sms_ingest import ingest_batch, split_by_shard
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"], route_class=ProfiledRoute)
+
+
+@router.post("/inbound", response_model=InboundBatchOut)
+def receive_inbound_messages(
+    payload: InboundBatchIn,
+    x_gateway_token: str | None = Header(default=None),
+):
+    """
+    Batch ingestion for SMS/USSD gateways.
+
+    - dedupes retransmits by gateway_message_id
+    - resolves senders via the normalized phone index
+    - bulk-creates check-ins in one transaction
+    - hands created check-ins to the agent asynchronously
+
+    With district shards, each sender's messages are stored in its
+    patient's shard (one transaction per shard).
+    """
+    if settings.SMS_GATEWAY_TOKEN and x_gateway_token != settings.SMS_GATEWAY_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid gateway token")
+
+    if len(payload.messages) > settings.WEBHOOK_MAX_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {settings.WEBHOOK_MAX_BATCH} messages)",
+        )
+
+    summary = {"received": len(payload.messages), "created": 0, "duplicates": 0, "unmatched": 0}
+    results: list[dict] = [{}] * len(payload.messages)
+    checkin_ids: list[str] = []
+    for shard, positions in split_by_shard(payload.messages):
+        messages = [payload.messages[i] for i in positions]
+        with shard.session() as db:
+            try:
+                part, created = ingest_batch(db, messages)
+            except IntegrityError:
+                # A concurrent delivery of the same message ids won the insert;
+                # re-run so those are reported as duplicates.
+                db.rollback()
+                part, created = ingest_batch(db, messages)
+        for key in ("created", "duplicates", "unmatched"):
+            summary[key] += part[key]
+        for i, result in zip(positions, part["results"]):
+            results[i] = result
+        checkin_ids.extend(created)
+
+    if settings.WEBHOOK_AUTO_PLAN and checkin_ids:
+        enqueue_agent_runs(checkin_ids)
+
+    return {**summary, "results": results}
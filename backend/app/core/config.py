@@ -9,6 +9,95 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: str = "sqlite:///./data/app.db"
+    # District -> database URL (JSON). Facilities in a listed district keep
+    # their patients, check-ins and agent runs there; everything else stays
+    # in DATABASE_URL, which also holds the patient id directory.
+    SHARD_DATABASE_URLS: dict[str, str] = {}
+
+    # SQLite connection settings (WAL is always on)
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # NORMAL is durable across app crashes in WAL
+
+    # Single-writer lane: API writes are group-committed by one thread per process
+    WRITE_LANE_ENABLED: bool = True
+    WRITE_LANE_MAX_QUEUE: int = 1000  # pending writes before callers get 503
+    WRITE_LANE_MAX_BATCH: int = 64  # writes per group commit
+    WRITE_LANE_SUBMIT_TIMEOUT: float = 2.0  # seconds to wait for queue space
+
+    # Responses smaller than this (bytes) are sent uncompressed
+    COMPRESSION_MIN_SIZE: int = 500
+
+    # Requests running more SQL statements than this are logged (likely N+1)
+    QUERY_BUDGET: int = 30
+
+    # Per-request profiling (empty token disables on-demand profiling)
+    PROFILING_TOKEN: str = ""
+    PROFILE_DIR: str = "./data/profiles"
+    PROFILE_INTERVAL_MS: float = 1.0  # on-demand sampler interval
+    # Always-on sampled profiling: fraction of requests, concurrency cap, interval
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_MAX_CONCURRENT: int = 1
+    PROFILE_SAMPLED_INTERVAL_MS: float = 10.0
+
+    # Inbound SMS/USSD gateway (empty token = no auth, local dev only)
+    SMS_GATEWAY_TOKEN: str = ""
+    WEBHOOK_MAX_BATCH: int = 1000
+    # Hand webhook check-ins to the agent automatically
+    WEBHOOK_AUTO_PLAN: bool = True
+    # Background agent planning threads
+    AGENT_WORKERS: int = 2
+    # Runs held in memory for those threads; beyond this they are persisted
+    # as scheduler tasks and planned by the follow-up scheduler
+    AGENT_QUEUE_MAX_PENDING: int = 200
+
+    # Planner backend: llm | local (offline classifier only) | auto (local
+    # when confident, otherwise the LLM). Without a model file auto = llm.
+    PLANNER_BACKEND: str = "auto"
+    PLANNER_MODEL_PATH: str = "./data/triage_model.npz"
+    PLANNER_LOCAL_MIN_CONFIDENCE: float = 0.9
+    # Build the agent graph / LLM client on a background thread at startup
+    # (otherwise on the first agent run)
+    AGENT_WARMUP: bool = False
+
+    # Follow-up scheduler
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_HORIZON_SECONDS: int = 300  # how far ahead tasks are loaded into memory
+    SCHEDULER_REFRESH_SECONDS: int = 30  # re-scan for tasks added by other workers
+    SCHEDULER_LEASE_SECONDS: int = 120
+    SCHEDULER_BATCH_SIZE: int = 200
+    SCHEDULER_MAX_ATTEMPTS: int = 3
+    FOLLOWUP_DEFAULT_HOURS: int = 48
+
+    # Outbound SMS templates (one JSON file per language, re-read when edited)
+    SMS_TEMPLATE_DIR: str = "./app/sms_templates"
+    SMS_TEMPLATE_CHECK_SECONDS: float = 5.0
+    SMS_DEFAULT_LANGUAGE: str = "en"
+    SMS_MAX_SEGMENTS: int = 2
+
+    # Live facility event streams (SSE)
+    EVENTS_SUBSCRIBER_BUFFER: int = 256  # undelivered events before a client is dropped
+    EVENTS_REPLAY_BUFFER: int = 500  # recent events per facility kept for resume
+    EVENTS_KEEPALIVE_SECONDS: float = 15.0
+
+    # Move check-ins closed this long ago (and their agent runs) to archive tables
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_AFTER_DAYS: int = 180
+    ARCHIVE_BATCH_SIZE: int = 500  # check-ins per write transaction
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+
+    # Referral lookups: in-memory facility grid (cell size) and how often
+    # workers check for facility / village edits
+    REFERRAL_GRID_KM: float = 10.0
+    REFERRAL_REFRESH_SECONDS: int = 30
+
+    # Clinician escalation queues: default / max claim lease, and how often a
+    # worker re-reads a facility's queue for cases enqueued by other workers
+    ESCALATION_LEASE_SECONDS: int = 900
+    ESCALATION_MAX_LEASE_SECONDS: int = 4 * 3600
+    ESCALATION_REFRESH_SECONDS: int = 30
+
+    # How long Idempotency-Key responses are kept for replay
+    IDEMPOTENCY_TTL_HOURS: int = 24
     # GOOGLE_API_KEY: str = Field(..., description="Google Gemini API key")
 
 
@@ -1,4 +1,8 @@
-from sqlalchemy import create_engine
+import zlib
+from datetime import datetime
+
+from sqlalchemy import DateTime, bindparam, create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
@@ -16,6 +20,25 @@ if settings.DATABASE_URL.startswith("sqlite"):
 
 engine = create_engine(settings.DATABASE_URL, connect_args=connect_args, future=True)
 
+
+def apply_sqlite_pragmas(target: Engine) -> None:
+    """
+    WAL (readers never wait for the writer) + busy_timeout, so a writer in
+    another process waits for the lock instead of failing "database is locked".
+    """
+
+    @event.listens_for(target, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.close()
+
+
+if settings.DATABASE_URL.startswith("sqlite"):
+    apply_sqlite_pragmas(engine)
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 
@@ -25,3 +48,125 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def engine_key(bind: Engine) -> str:
+    """
+    Identity of the database behind an engine, so per-database workers
+    (write lane, scheduler) are found from any engine or session bound to it.
+    """
+    return bind.url.render_as_string(hide_password=False)
+
+
+def create_schema(bind: Engine = engine) -> None:
+    """
+    Create missing tables and indexes.
+
+    create_all() only emits CREATE INDEX for tables it creates, so indexes
+    added to existing tables are created explicitly (checkfirst=True).
+    """
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+# data_versions key holding the fingerprint of the schema a database was last prepared for
+SCHEMA_VERSION_KEY = "schema"
+
+
+def schema_fingerprint() -> int:
+    """
+    crc32 over every table, column and index the models define.
+
+    Any model change (new table, column, index) changes it, so startup
+    can tell whether create_schema() and the first-start backfills have
+    anything to do.
+    """
+    parts = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"T {table.name}")
+        for column in table.columns:
+            default = column.server_default.arg if column.server_default is not None else None
+            parts.append(f"C {column.name} {column.type} {column.nullable} {default}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            columns = ",".join(str(c) for c in index.expressions)
+            parts.append(f"I {index.name} {columns} {index.unique}")
+    return zlib.crc32("\n".join(parts).encode("utf-8"))
+
+
+def schema_is_current(bind: Engine = engine) -> bool:
+    """
+    True when the database was last prepared for the current models.
+    """
+    if "data_versions" not in inspect(bind).get_table_names():
+        return False
+    with bind.connect() as conn:
+        stored = conn.execute(
+            text("SELECT version FROM data_versions WHERE key = :key"),
+            {"key": SCHEMA_VERSION_KEY},
+        ).scalar()
+    return stored == schema_fingerprint()
+
+
+def mark_schema_current(bind: Engine = engine) -> None:
+    """
+    Record the current fingerprint (after startup preparation succeeded).
+    """
+    with bind.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO data_versions (key, version, updated_at) "
+                "VALUES (:key, :version, :now) "
+                "ON CONFLICT(key) DO UPDATE SET version = :version, updated_at = :now"
+            ).bindparams(bindparam("now", type_=DateTime)),
+            {
+                "key": SCHEMA_VERSION_KEY,
+                "version": schema_fingerprint(),
+                "now": datetime.utcnow(),
+            },
+        )
+
+
+def add_missing_columns(bind: Engine = engine) -> None:
+    """
+    Additive-only upgrade for existing databases (no Alembic here).
+
+    New columns on existing tables must be nullable or carry a
+    server_default; anything else needs a real migration.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} " + str(
+                    column.type.compile(dialect=bind.dialect)
+                )
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+
+
+def analyze_sqlite(bind: Engine = engine) -> None:
+    """
+    Make sure the SQLite query planner has statistics.
+
+    Without sqlite_stat1 SQLite guesses join order and can, for example,
+    drive the per-patient risk query from the whole danger-sign index.
+    analysis_limit samples each index so this stays fast on large files.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        has_stats = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).first()
+        conn.exec_driver_sql("PRAGMA optimize" if has_stats else "ANALYZE")
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import settings
+from app.core.telemetry import EVENT_SUBSCRIBERS_DROPPED, EVENTS_PUBLISHED
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_CREATED = "checkin.created"
+AGENT_RUN_COMPLETED = "agent_run.completed"
+# Control events (no id: they don't move the client's resume point)
+RESYNC = "resync"
+DROPPED = "dropped"
+
+
+@dataclass(frozen=True)
+class Event:
+    seq: int
+    facility_id: int
+    type: str
+    data: dict[str, Any]
+    epoch: str
+
+    @property
+    def id(self) -> str:
+        return f"{self.epoch}-{self.seq}"
+
+
+def format_sse(event_type: str, data: dict[str, Any], event_id: str | None = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscriber:
+    """
+    One live connection: a bounded buffer filled by publishers (any thread)
+    and drained by the connection's coroutine.
+
+    A subscriber whose buffer fills up is dropped rather than blocking
+    publishers or growing without bound; the client reconnects and
+    resumes from its last event id.
+    """
+
+    def __init__(self, facility_id: int, max_buffer: int) -> None:
+        self.facility_id = facility_id
+        self.max_buffer = max_buffer
+        self.dropped = False
+        self._buffer: deque[Event] = deque()
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+
+    def offer(self, event: Event) -> bool:
+        """
+        Buffer an event (called from publisher threads); False once dropped.
+        """
+        with self._lock:
+            if self.dropped:
+                return False
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped = True
+            else:
+                self._buffer.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            pass
+        return not self.dropped
+
+    async def next_events(self, timeout: float) -> list[Event]:
+        """
+        Wait up to timeout for events; [] on timeout (send a keepalive).
+        """
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._wake.clear()
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+        return events
+
+
+class EventBus:
+    """
+    In-process pub/sub fan-out of committed writes, keyed by facility.
+
+    Each facility keeps the last replay_buffer events so reconnecting
+    clients can resume from Last-Event-ID. Ids embed a per-process epoch:
+    after a restart (or with multiple workers) old ids can't be resumed and
+    the client is told to resync instead.
+    """
+
+    def __init__(self, subscriber_buffer: int = 256, replay_buffer: int = 500) -> None:
+        self.subscriber_buffer = subscriber_buffer
+        self.replay_buffer = replay_buffer
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscriber]] = {}
+        self._recent: dict[int, deque[Event]] = {}
+        # facility -> seq of the newest event evicted from its replay buffer
+        self._evicted: dict[int, int] = {}
+
+    def publish(self, facility_id: int, event_type: str, data: dict[str, Any]) -> Event:
+        """
+        Fan an event out to the facility's subscribers. Call only after the
+        write is committed.
+        """
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, facility_id, event_type, data, self.epoch)
+            recent = self._recent.setdefault(facility_id, deque())
+            if len(recent) >= self.replay_buffer:
+                self._evicted[facility_id] = recent.popleft().seq
+            recent.append(event)
+            subscribers = list(self._subscribers.get(facility_id, ()))
+
+        EVENTS_PUBLISHED.inc(type=event_type)
+        for sub in subscribers:
+            if not sub.offer(event):
+                EVENT_SUBSCRIBERS_DROPPED.inc()
+                self.unsubscribe(sub)
+        return event
+
+    def subscribe(
+        self, facility_id: int, last_event_id: str | None
+    ) -> tuple[Subscriber, list[Event] | None]:
+        """
+        Register a subscriber (from the event loop) and return it with the
+        events missed since last_event_id; None means they can't be replayed
+        and the client must resync.
+
+        Registration and the replay snapshot happen under one lock, so no
+        event is both replayed and delivered live, or lost in between.
+        """
+        sub = Subscriber(facility_id, self.subscriber_buffer)
+        with self._lock:
+            self._subscribers.setdefault(facility_id, set()).add(sub)
+            if not last_event_id:
+                return sub, []
+            epoch, _, seq = last_event_id.partition("-")
+            if epoch != self.epoch or not seq.isdigit():
+                return sub, None
+            last_seq = int(seq)
+            if last_seq < self._evicted.get(facility_id, 0):
+                return sub, None
+            recent = self._recent.get(facility_id, ())
+            return sub, [e for e in recent if e.seq > last_seq]
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.facility_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.facility_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+bus = EventBus(
+    subscriber_buffer=settings.EVENTS_SUBSCRIBER_BUFFER,
+    replay_buffer=settings.EVENTS_REPLAY_BUFFER,
+)
+
+
+def publish(facility_id: int, event_type: str, data: dict[str, Any]) -> None:
+    """
+    Publish to live dashboards; never fails the write that triggered it.
+    """
+    try:
+        bus.publish(facility_id, event_type, data)
+    except Exception:
+        logger.exception("Publishing %s for facility %s failed", event_type, facility_id)
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 
 from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    text,
+)
 
 from app.core.db import Base
 
@@ -20,6 +32,9 @@ class Facility(Base):
     name: Mapped[str] = mapped_column(String(200), nullable=False)
     level: Mapped[str] = mapped_column(String(10), nullable=False)  # "HC2" or "HC3"
     district: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    # WGS84 degrees (None until surveyed; such facilities are never referral targets)
+    latitude: Mapped[float | None] = mapped_column(Float, nullable=True)
+    longitude: Mapped[float | None] = mapped_column(Float, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=utcnow, nullable=False
@@ -53,6 +68,28 @@ class VHT(Base):
     patients: Mapped[list["Patient"]] = relationship("Patient", back_populates="vht")
 
 
+class Village(Base):
+    """
+    Village coordinates (reference data, like facilities). Patients and
+    VHTs name their village as free text; app.services.referrals matches
+    on the normalized (name, parish).
+    """
+
+    __tablename__ = "villages"
+    __table_args__ = (Index("ix_villages_name_parish", "name", "parish"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(120), nullable=False)
+    parish: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    district: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    latitude: Mapped[float] = mapped_column(Float, nullable=False)
+    longitude: Mapped[float] = mapped_column(Float, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+
+
 class Patient(Base):
     """
     Patient/Mother profile (Onboarding + monitoring baseline).
@@ -123,10 +160,26 @@ class Patient(Base):
 
 class CheckIn(Base):
     __tablename__ = "checkins"
+    __table_args__ = (
+        Index("ix_checkins_facility_status_created", "facility_id", "status", "created_at"),
+        # Archival candidates: closed long ago
+        Index("ix_checkins_status_closed", "status", "closed_at"),
+        # Patient timeline: ordered seeks per patient (created / closed events)
+        Index("ix_checkins_patient_created", "patient_id", "created_at", "id"),
+        Index(
+            "ix_checkins_patient_closed",
+            "patient_id",
+            "closed_at",
+            "id",
+            sqlite_where=text("closed_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[str] = mapped_column(String(50), primary_key=True)
 
-    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"), nullable=False)
+    patient_id: Mapped[int] = mapped_column(
+        ForeignKey("patients.id"), nullable=False, index=True
+    )
     facility_id: Mapped[int] = mapped_column(
         ForeignKey("facilities.id"), nullable=False
     )
@@ -160,22 +213,473 @@ class CheckIn(Base):
     agent_runs: Mapped[list["AgentRun"]] = relationship(
         "AgentRun", back_populates="checkin"
     )
+    observation: Mapped["CheckInObservation | None"] = relationship(
+        "CheckInObservation",
+        back_populates="checkin",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+    observation_tags: Mapped[list["CheckInObservationTag"]] = relationship(
+        "CheckInObservationTag",
+        back_populates="checkin",
+        cascade="all, delete-orphan",
+    )
+
+
+class CheckInObservation(Base):
+    """
+    Queryable projection of CheckIn.observations_json.
+
+    observations_json stays the audit source of truth; this side table
+    holds the scalar fields we filter on so searches run as indexed SQL
+    instead of decoding every row in Python.
+    """
+
+    __tablename__ = "checkin_observations"
+
+    checkin_id: Mapped[str] = mapped_column(
+        ForeignKey("checkins.id", ondelete="CASCADE"), primary_key=True
+    )
+    fever: Mapped[bool | None] = mapped_column(Boolean, nullable=True, index=True)
+    temp_c: Mapped[float | None] = mapped_column(Float, nullable=True, index=True)
+
+    checkin: Mapped["CheckIn"] = relationship("CheckIn", back_populates="observation")
+
+
+class CheckInObservationTag(Base):
+    """
+    One row per list entry in the observations JSON
+    (kind="danger_sign" or kind="symptom").
+    """
+
+    __tablename__ = "checkin_observation_tags"
+    __table_args__ = (
+        Index("ix_checkin_observation_tags_kind_value", "kind", "value", "checkin_id"),
+    )
+
+    checkin_id: Mapped[str] = mapped_column(
+        ForeignKey("checkins.id", ondelete="CASCADE"), primary_key=True
+    )
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    value: Mapped[str] = mapped_column(String(100), primary_key=True)
+
+    checkin: Mapped["CheckIn"] = relationship(
+        "CheckIn", back_populates="observation_tags"
+    )
 
 
 class AgentRun(Base):
-    """Audit log for each agent execution (inputs/outputs later, status now)."""
+    """
+    Audit log for each agent execution (inputs/outputs later, status now).
+
+    Indexes serve GET /agent/runs (newest first, keyset on created_at, id)
+    and /agent/runs/summary: the trailing status/intent/approved columns
+    let the summary count from the index alone.
+    """
 
     __tablename__ = "agent_runs"
+    __table_args__ = (
+        Index(
+            "ix_agent_runs_facility_created",
+            "facility_id", "created_at", "status", "intent", "approved",
+        ),
+        Index("ix_agent_runs_facility_intent_created", "facility_id", "intent", "created_at"),
+        Index("ix_agent_runs_created", "created_at", "status", "intent", "approved"),
+        Index("ix_agent_runs_intent_created", "intent", "created_at"),
+        Index("ix_agent_runs_status_created", "status", "created_at"),
+        Index("ix_agent_runs_patient_created", "patient_id", "created_at"),
+        Index("ix_agent_runs_checkin_created", "checkin_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
     patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"), nullable=False)
     checkin_id: Mapped[str] = mapped_column(ForeignKey("checkins.id"), nullable=False)
+    # Denormalized from the check-in (nullable: backfilled for older rows)
+    facility_id: Mapped[int | None] = mapped_column(
+        ForeignKey("facilities.id"), nullable=True
+    )
 
     status: Mapped[str] = mapped_column(String(50), nullable=False)
+
+    # validated plan summary (nullable: runs recorded before plans were stored)
+    intent: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    priority: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    # False when the policy gate rejected the plan or the planner fell back
+    approved: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
+    # Backend that produced the plan: llm | local | fallback (None: older runs, LLM)
+    planner: Mapped[str | None] = mapped_column(String(20), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=utcnow, nullable=False
     )
 
     patient: Mapped["Patient"] = relationship("Patient", back_populates="agent_runs")
     checkin: Mapped["CheckIn"] = relationship("CheckIn", back_populates="agent_runs")
+
+
+class PatientRisk(Base):
+    """
+    Materialized maternal risk score (one row per active patient).
+
+    Written by app.services.risk_engine; served ranked per facility via
+    the (facility_id, score) index instead of scanning patients.
+    """
+
+    __tablename__ = "patient_risk"
+    __table_args__ = (
+        Index("ix_patient_risk_facility_score", "facility_id", "score"),
+        Index("ix_patient_risk_valid_until", "valid_until"),
+    )
+
+    patient_id: Mapped[int] = mapped_column(
+        ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True
+    )
+    facility_id: Mapped[int] = mapped_column(
+        ForeignKey("facilities.id"), nullable=False
+    )
+
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+    tier: Mapped[str] = mapped_column(String(10), nullable=False)  # low | medium | high
+    danger_sign_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    computed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    # When the oldest counted danger sign leaves the window (None: none counted)
+    valid_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class FacilityVHTStats(Base):
+    """
+    Dashboard counters per (facility, VHT), maintained incrementally by
+    app.services.dashboard_stats. vht_id = 0 holds patients with no VHT.
+    """
+
+    __tablename__ = "facility_vht_stats"
+
+    facility_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    vht_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    active: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    paused: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    closed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    open_checkins: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # missed-ANC buckets over ACTIVE patients
+    missed_anc_0: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    missed_anc_1: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    missed_anc_2: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    missed_anc_3_plus: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class FacilityDailyStats(Base):
+    """Per-day agent activity counters per (facility, VHT)."""
+
+    __tablename__ = "facility_daily_stats"
+
+    facility_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    vht_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    agent_runs: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    escalations: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class DataVersion(Base):
+    """
+    Monotonic version counters for cacheable data sets
+    (e.g. "reference" = facilities + VHTs + villages). Bumped on every write
+    so ETags can be derived without reading the data itself.
+    """
+
+    __tablename__ = "data_versions"
+
+    key: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+
+
+class PatientPhone(Base):
+    """
+    Normalized E.164 phone keys for patients (primary + backup),
+    kept in sync by app.services.patient_search on create/update.
+    """
+
+    __tablename__ = "patient_phones"
+    __table_args__ = (Index("ix_patient_phones_phone", "phone_e164", "patient_id"),)
+
+    patient_id: Mapped[int] = mapped_column(
+        ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True
+    )
+    kind: Mapped[str] = mapped_column(String(10), primary_key=True)  # primary | backup
+    phone_e164: Mapped[str] = mapped_column(String(20), nullable=False)
+
+
+class PatientBlockKey(Base):
+    """
+    Duplicate-detection blocking keys (phonetic name part + village or
+    parish), kept in sync by app.services.duplicates alongside the search
+    keys. Only patients sharing a key (or a phone) are compared.
+    """
+
+    __tablename__ = "patient_block_keys"
+
+    key: Mapped[str] = mapped_column(String(150), primary_key=True)
+    patient_id: Mapped[int] = mapped_column(
+        ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+
+class PatientStatusChange(Base):
+    """
+    Program status history (active / paused / closed), one row per change,
+    written with the patient update. Read by the patient timeline.
+    """
+
+    __tablename__ = "patient_status_changes"
+    __table_args__ = (
+        Index("ix_patient_status_changes_patient_changed", "patient_id", "changed_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    patient_id: Mapped[int] = mapped_column(
+        ForeignKey("patients.id", ondelete="CASCADE"), nullable=False
+    )
+    from_status: Mapped[str | None] = mapped_column(String(20), nullable=True)  # None = registered
+    to_status: Mapped[str] = mapped_column(String(20), nullable=False)
+    reason: Mapped[str | None] = mapped_column(String(250), nullable=True)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+
+
+class InboundMessage(Base):
+    """
+    Raw inbound SMS/USSD message from the gateway webhook.
+
+    gateway_message_id is the primary key so retransmits are deduped.
+    """
+
+    __tablename__ = "inbound_messages"
+
+    gateway_message_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    channel: Mapped[str] = mapped_column(String(10), nullable=False)  # sms | ussd
+    sender: Mapped[str] = mapped_column(String(50), nullable=False)
+    sender_e164: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    text: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+
+    # checkin_created | unmatched
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    patient_id: Mapped[int | None] = mapped_column(
+        ForeignKey("patients.id"), nullable=True
+    )
+    checkin_id: Mapped[str | None] = mapped_column(
+        ForeignKey("checkins.id"), nullable=True
+    )
+
+    received_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+
+
+class ScheduledTask(Base):
+    """
+    Persisted timed action (follow-up SMS, re-check) fired by
+    app.services.scheduler through the tool executor.
+
+    Lease columns make firing crash-safe across workers: a task is only
+    executed by the worker holding an unexpired lease.
+    """
+
+    __tablename__ = "scheduled_tasks"
+    __table_args__ = (
+        Index("ix_scheduled_tasks_status_due", "status", "due_at"),
+        Index("ix_scheduled_tasks_status_lease", "status", "lease_expires_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    tool_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    patient_id: Mapped[int] = mapped_column(
+        ForeignKey("patients.id"), nullable=False, index=True
+    )
+    checkin_id: Mapped[str | None] = mapped_column(
+        ForeignKey("checkins.id"), nullable=True
+    )
+    payload_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    # pending | leased | done | failed | cancelled
+    status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False)
+    lease_owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(String(500), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    fired_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class Escalation(Base):
+    """
+    Escalated check-in awaiting a clinician at its facility (one per
+    check-in), served in priority order by app.services.escalations.
+
+    A clinician claims a case with a time-limited lease; an unexpired lease
+    is the only thing that keeps it out of the queue, so a case whose
+    clinician walks away goes back in by itself.
+    """
+
+    __tablename__ = "escalations"
+    __table_args__ = (
+        Index("ix_escalations_facility_status", "facility_id", "status"),
+        Index("ix_escalations_status_lease", "status", "lease_expires_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    checkin_id: Mapped[str] = mapped_column(
+        ForeignKey("checkins.id"), nullable=False, unique=True
+    )
+    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"), nullable=False)
+    facility_id: Mapped[int] = mapped_column(ForeignKey("facilities.id"), nullable=False)
+
+    # Plan priority (CRITICAL | HIGH) and the patient's risk score when escalated
+    priority: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    risk_score: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+
+    # queued | leased | done
+    status: Mapped[str] = mapped_column(String(20), default="queued", nullable=False)
+    lease_owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    claims: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    completed_by: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    outcome: Mapped[str | None] = mapped_column(String(500), nullable=True)
+
+
+class IdempotencyKey(Base):
+    """
+    Stored response for a client Idempotency-Key, so retried POSTs replay
+    the first result instead of executing again. Rows expire after
+    IDEMPOTENCY_TTL_HOURS (expires_at is indexed for purging).
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    scope: Mapped[str] = mapped_column(String(50), primary_key=True)  # "POST /checkins"
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)
+
+    # sha256 of the request: the same key with a different body is rejected
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    response_json: Mapped[str] = mapped_column(Text, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+class SyncChange(Base):
+    """
+    Compacted change log for offline device sync.
+
+    One row per (entity, entity_id, scope) holding only the latest change,
+    so a device catching up reads O(changed entities), not every write.
+    seq is allocated inside the write transaction (SQLite has one writer),
+    so seq order is commit order and "seq > cursor" never skips a row.
+    """
+
+    __tablename__ = "sync_changes"
+    __table_args__ = (Index("ix_sync_changes_scope_seq", "scope", "seq"),)
+
+    # patient | checkin | vht | facility
+    entity: Mapped[str] = mapped_column(String(20), primary_key=True)
+    entity_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    # Who syncs it: "facility:3" | "vht:12"
+    scope: Mapped[str] = mapped_column(String(30), primary_key=True)
+
+    # upsert | remove (deleted, or moved out of this scope)
+    op: Mapped[str] = mapped_column(String(10), nullable=False)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+
+
+class CheckInArchive(Base):
+    """
+    Cold storage for check-ins closed more than ARCHIVE_AFTER_DAYS ago
+    (moved by app.services.archive).
+
+    The full row is kept as zlib-compressed JSON; only the columns needed
+    to find it again are stored plainly. Keeping years of history out of
+    checkins keeps its B-trees and page-cache footprint to recent data.
+    """
+
+    __tablename__ = "checkins_archive"
+    __table_args__ = (
+        Index("ix_checkins_archive_patient_created", "patient_id", "created_at"),
+        Index("ix_checkins_archive_patient_closed", "patient_id", "closed_at", "id"),
+    )
+
+    id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    patient_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    facility_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    closed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class AgentRunArchive(Base):
+    """
+    Agent runs of archived check-ins (compressed like CheckInArchive).
+    """
+
+    __tablename__ = "agent_runs_archive"
+    __table_args__ = (
+        Index("ix_agent_runs_archive_patient_created", "patient_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    checkin_id: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
+    patient_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    facility_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, nullable=False
+    )
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class PatientShard(Base):
+    """
+    Patient id -> shard directory (app.core.shards), kept in the default
+    database when storage is sharded by district.
+
+    Its autoincrement id *is* the patient id, so ids stay unique across
+    shards and a patient's database is found without probing every shard.
+    """
+
+    __tablename__ = "patient_shards"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    shard: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.telemetry import current_request_stats
+
+PROFILE_HEADER = "x-profile"
+PROFILE_MODE_HEADER = "x-profile-mode"
+PROFILE_QUERY_PARAM = "__profile"
+
+
+class ProfileSession:
+    """
+    Profiling state for one request.
+
+    A sampler thread walks the stacks of the threads registered by
+    ProfiledRoute (the threadpool thread running the endpoint) and
+    aggregates them as collapsed stacks for flamegraph tools. With
+    mode="cprofile" the endpoint also runs under cProfile (higher overhead).
+    """
+
+    def __init__(self, interval: float, use_cprofile: bool, reason: str) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.interval = interval
+        self.use_cprofile = use_cprofile
+        self.reason = reason
+        self.thread_ids: set[int] = set()
+        self.stacks: Counter[str] = Counter()
+        self.cprofile_stats: list[cProfile.Profile] = []
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample, name=f"profiler-{self.id}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self.thread_ids:
+                continue
+            frames = sys._current_frames()
+            for ident in list(self.thread_ids):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(parts))] += 1
+                self.samples += 1
+
+
+_profile_session: contextvars.ContextVar[ProfileSession | None] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+# Bounds always-on sampling overhead
+_sampled_slots = threading.BoundedSemaphore(max(1, settings.PROFILE_MAX_CONCURRENT))
+
+
+def _profiled(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a route endpoint so the thread that actually runs it is profiled.
+    """
+
+    def _run(call: Callable[[], Any]) -> Any:
+        session = _profile_session.get()
+        if session is None:
+            return call()
+        ident = threading.get_ident()
+        session.thread_ids.add(ident)
+        try:
+            if session.use_cprofile:
+                profiler = cProfile.Profile()
+                session.cprofile_stats.append(profiler)
+                return profiler.runcall(call)
+            return call()
+        finally:
+            session.thread_ids.discard(ident)
+
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            session = _profile_session.get()
+            if session is None:
+                return await endpoint(*args, **kwargs)
+            ident = threading.get_ident()
+            session.thread_ids.add(ident)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                session.thread_ids.discard(ident)
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return _run(lambda: endpoint(*args, **kwargs))
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    APIRoute whose endpoint can be profiled per request
+    (use as APIRouter(route_class=ProfiledRoute)).
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+def _requested(scope: Scope) -> tuple[bool, bool]:
+    """
+    (on-demand profiling requested with a valid token, cProfile requested)
+    """
+    token = settings.PROFILING_TOKEN
+    if not token:
+        return False, False
+    headers = Headers(scope=scope)
+    supplied = headers.get(PROFILE_HEADER) or QueryParams(
+        scope.get("query_string", b"")
+    ).get(PROFILE_QUERY_PARAM)
+    if not supplied or not hmac.compare_digest(supplied, token):
+        return False, False
+    return True, headers.get(PROFILE_MODE_HEADER, "").lower() == "cprofile"
+
+
+def _write_report(
+    session: ProfileSession,
+    scope: Scope,
+    status_code: int,
+    elapsed: float,
+    statements: list[str],
+) -> Path:
+    out_dir = Path(settings.PROFILE_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    route = getattr(scope.get("route"), "path", None) or scope["path"]
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    stamp = f"{datetime.utcnow():%Y%m%dT%H%M%S}"
+    base = out_dir / f"{stamp}_{scope['method']}_{slug}_{session.id}"
+
+    # Collapsed stacks: flamegraph.pl / speedscope / inferno
+    folded = base.with_suffix(".folded")
+    folded.write_text(
+        "".join(f"{stack} {count}\n" for stack, count in session.stacks.most_common()),
+        encoding="utf-8",
+    )
+
+    summary = io.StringIO()
+    summary.write(f"{scope['method']} {scope['path']} -> {status_code}\n")
+    summary.write(f"route: {route}\nreason: {session.reason}\n")
+    summary.write(f"wall: {elapsed * 1000:.1f}ms  samples: {session.samples}\n")
+    summary.write(f"sql statements: {len(statements)}\n\n")
+    for stmt in statements:
+        summary.write(" ".join(stmt.split()) + "\n")
+
+    if session.cprofile_stats:
+        stats = pstats.Stats(session.cprofile_stats[0], stream=summary)
+        for extra in session.cprofile_stats[1:]:
+            stats.add(extra)
+        stats.dump_stats(str(base.with_suffix(".prof")))
+        summary.write("\n--- cProfile (top 30 by cumulative time) ---\n")
+        stats.sort_stats("cumulative").print_stats(30)
+
+    base.with_suffix(".txt").write_text(summary.getvalue(), encoding="utf-8")
+    return base
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiling.
+
+    - on demand: X-Profile: <PROFILING_TOKEN> header or ?__profile=<token>
+      (add X-Profile-Mode: cprofile for a .prof file as well)
+    - always-on: PROFILE_SAMPLE_RATE of requests, at most
+      PROFILE_MAX_CONCURRENT at a time, with a coarser sampling interval
+
+    Reports go to PROFILE_DIR; the response carries X-Profile-Id.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        on_demand, use_cprofile = _requested(scope)
+        sampled = (
+            not on_demand
+            and settings.PROFILE_SAMPLE_RATE > 0
+            and random.random() < settings.PROFILE_SAMPLE_RATE
+            and _sampled_slots.acquire(blocking=False)
+        )
+        if not on_demand and not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        interval_ms = (
+            settings.PROFILE_INTERVAL_MS if on_demand else settings.PROFILE_SAMPLED_INTERVAL_MS
+        )
+        session = ProfileSession(
+            interval=interval_ms / 1000,
+            use_cprofile=use_cprofile,
+            reason="on-demand" if on_demand else "sampled",
+        )
+        stats = current_request_stats()
+        if stats is not None:
+            stats.statements = []
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", session.id.encode())
+                ]
+            await send(message)
+
+        token = _profile_session.set(session)
+        session.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            session.stop()
+            _profile_session.reset(token)
+            if sampled:
+                _sampled_slots.release()
+            _write_report(
+                session,
+                scope,
+                status_code,
+                elapsed,
+                (stats.statements or []) if stats is not None else [],
+            )
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional, Literal
 
 from pydantic import BaseModel, Field
@@ -13,10 +13,24 @@ class FacilityOut(BaseModel):
     name: str
     level: Literal["HC2", "HC3"]
     district: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     model_config = {"from_attributes": True}
 
 
+class ReferralFacilityOut(FacilityOut):
+    distance_km: float
+
+
+class ReferralOut(BaseModel):
+    # Where distances are measured from: query | village | facility
+    origin: Literal["query", "village", "facility"]
+    latitude: float
+    longitude: float
+    facilities: List[ReferralFacilityOut]
+
+
 # ---------- VHT ----------
 class VHTOut(BaseModel):
     id: int
@@ -28,6 +42,64 @@ class VHTOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+# ---------- Dashboard stats ----------
+class DashboardCounts(BaseModel):
+    active: int = 0
+    paused: int = 0
+    closed: int = 0
+    open_checkins: int = 0
+
+    # missed-ANC buckets over active patients
+    missed_anc_0: int = 0
+    missed_anc_1: int = 0
+    missed_anc_2: int = 0
+    missed_anc_3_plus: int = 0
+
+    agent_runs_today: int = 0
+    escalations_today: int = 0
+
+
+class VHTStatsOut(DashboardCounts):
+    vht_id: Optional[int] = None  # None = patients without a VHT
+
+
+class FacilityStatsOut(BaseModel):
+    facility_id: int
+    day: date
+    totals: DashboardCounts
+    by_vht: List[VHTStatsOut] = Field(default_factory=list)
+
+
+class DistrictStatsOut(DashboardCounts):
+    district: Optional[str] = None
+
+
+class NationalStatsOut(BaseModel):
+    day: date
+    totals: DashboardCounts
+    by_district: List[DistrictStatsOut] = Field(default_factory=list)
+
+
+# ---------- Risk ----------
+RiskTier = Literal["low", "medium", "high"]
+
+
+class PatientRiskOut(BaseModel):
+    patient_id: int
+    name: str
+    village: str
+    vht_id: Optional[int] = None
+
+    score: float
+    tier: RiskTier
+    danger_sign_count: int
+
+    gestational_age_weeks: int
+    missed_anc_count: int
+
+    computed_at: datetime
+
+
 # ---------- CheckIns (lightweight for embedding in patient detail) ----------
 class CheckInOut(BaseModel):
     id: str
@@ -154,6 +226,14 @@ class PatientListOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class PatientSearchHit(BaseModel):
+    """Result row for GET /patients/search."""
+
+    patient: PatientListOut
+    score: float
+    matched_on: Literal["phone", "name"]
+
+
 class PatientDetailOut(BaseModel):
     """
     Deep profile for GET /patients/{id} (agent-ready).
@@ -198,6 +278,39 @@ class PatientDetailOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class DuplicateCandidateOut(BaseModel):
+    """Existing registration that is likely the same mother."""
+
+    patient: PatientListOut
+    score: float
+    matched_on: List[Literal["name", "phone", "village", "parish"]] = Field(default_factory=list)
+
+
+class PatientCreatedOut(PatientDetailOut):
+    """POST /patients response: the new profile plus likely duplicates to review."""
+
+    possible_duplicates: List[DuplicateCandidateOut] = Field(default_factory=list)
+
+
+# ---------- Patient timeline ----------
+class TimelineEventOut(BaseModel):
+    type: Literal["checkin", "checkin_closed", "agent_run", "status_change"]
+    at: datetime
+    id: str
+    checkin_id: Optional[str] = None
+    # checkin: source, status, initial_complaint, facility_id, archived
+    # agent_run: status, intent, priority, approved, planner, archived
+    # status_change: from_status, to_status, reason
+    data: Dict[str, Any] = Field(default_factory=dict)
+
+
+class TimelineOut(BaseModel):
+    patient_id: int
+    events: List[TimelineEventOut] = Field(default_factory=list)
+    # Pass back as ?cursor= for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+
 # ---------- CheckIn create/response (keep for your routes_checkin.py) ----------
 class CheckInCreate(BaseModel):
     patient_id: int
@@ -205,6 +318,11 @@ class CheckInCreate(BaseModel):
     source: str = Field(min_length=1, max_length=50)
     initial_complaint: Optional[str] = Field(default=None, max_length=500)
 
+    # e.g {"fever": true, "temp_c": 38.1, "danger_signs": ["fast_breathing"]}
+    observations: Optional[Dict[str, Any]] = None
+    recorded_by: Optional[str] = Field(default=None, max_length=50)
+    notes: Optional[str] = Field(default=None, max_length=800)
+
 
 class CheckInResponse(BaseModel):
     id: str
@@ -215,3 +333,148 @@ class CheckInResponse(BaseModel):
     created_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+# ---------- Inbound SMS / USSD webhook ----------
+class InboundMessageIn(BaseModel):
+    gateway_message_id: str = Field(min_length=1, max_length=100)
+    sender: str = Field(min_length=1, max_length=50)
+    text: Optional[str] = Field(default=None, max_length=1000)
+    channel: Literal["sms", "ussd"] = "sms"
+    received_at: Optional[datetime] = None
+
+
+class InboundBatchIn(BaseModel):
+    messages: List[InboundMessageIn]
+
+
+class InboundMessageResult(BaseModel):
+    gateway_message_id: str
+    status: Literal["checkin_created", "unmatched", "duplicate"]
+    patient_id: Optional[int] = None
+    checkin_id: Optional[str] = None
+
+
+class InboundBatchOut(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    unmatched: int
+    results: List[InboundMessageResult] = Field(default_factory=list)
+
+
+# ---------- Scheduled follow-ups ----------
+ScheduledTaskStatus = Literal["pending", "leased", "done", "failed", "cancelled"]
+
+
+class FollowUpCreate(BaseModel):
+    patient_id: int
+    tool_name: str = Field(default="send_advice_sms", max_length=50)
+    checkin_id: Optional[str] = None
+
+    # Either an absolute time (UTC) or a delay from now
+    due_at: Optional[datetime] = None
+    delay_minutes: Optional[int] = Field(default=None, ge=0, le=60 * 24 * 60)
+
+    payload: Optional[Dict[str, Any]] = None
+
+
+class ScheduledTaskOut(BaseModel):
+    id: int
+    tool_name: str
+    patient_id: int
+    checkin_id: Optional[str] = None
+    due_at: datetime
+    status: ScheduledTaskStatus
+    attempts: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    fired_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
+
+# ---------- Clinician escalation queue ----------
+class EscalationOut(BaseModel):
+    id: int
+    checkin_id: str
+    patient_id: int
+    facility_id: int
+    priority: Optional[str] = None
+    risk_score: float
+    status: Literal["queued", "leased", "done"]
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    claims: int
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    completed_by: Optional[str] = None
+    outcome: Optional[str] = None
+
+    model_config = {"from_attributes": True}
+
+
+class EscalationClaim(BaseModel):
+    clinician: str = Field(min_length=1, max_length=100)
+    # Defaults to ESCALATION_LEASE_SECONDS
+    lease_seconds: Optional[int] = Field(default=None, ge=30)
+
+
+class EscalationComplete(BaseModel):
+    clinician: str = Field(min_length=1, max_length=100)
+    outcome: Optional[str] = Field(default=None, max_length=500)
+
+
+# ---------- Offline device sync ----------
+class SyncChangeOut(BaseModel):
+    seq: int
+    entity: Literal["patient", "checkin", "vht", "facility"]
+    id: str
+    op: Literal["upsert", "remove"]
+    # Current row (PatientListOut / CheckInOut / VHTOut / FacilityOut shape); None on remove
+    data: Optional[Dict[str, Any]] = None
+
+
+class SyncChangesOut(BaseModel):
+    changes: List[SyncChangeOut] = Field(default_factory=list)
+    # Pass back as ?since= on the next call
+    next_cursor: int
+    has_more: bool
+
+
+# ---------- Agent run history ----------
+class AgentRunOut(BaseModel):
+    id: int
+    patient_id: int
+    checkin_id: str
+    facility_id: Optional[int] = None
+    status: str
+    intent: Optional[str] = None
+    priority: Optional[str] = None
+    approved: Optional[bool] = None
+    planner: Optional[str] = None
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class AgentRunPage(BaseModel):
+    items: List[AgentRunOut] = Field(default_factory=list)
+    # Pass back as ?cursor= for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class AgentRunBucket(BaseModel):
+    bucket_start: datetime
+    total: int
+    # Plans rejected by the policy gate or replaced by the planner fallback
+    not_approved: int
+    by_intent: Dict[str, int] = Field(default_factory=dict)
+    by_status: Dict[str, int] = Field(default_factory=dict)
+
+
+class AgentRunSummaryOut(BaseModel):
+    bucket: Literal["hour", "day", "week"]
+    since: datetime
+    until: datetime
+    buckets: List[AgentRunBucket] = Field(default_factory=list)
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, TypeVar
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.db import SessionLocal, apply_sqlite_pragmas, engine
+from app.core.models import CheckIn, CheckInArchive, Facility, Patient, PatientShard, VHT
+from app.core.write_lane import run_write
+
+T = TypeVar("T")
+
+DEFAULT_SHARD = "default"
+
+# Cached patient/check-in -> shard entries before the caches are reset
+_MAX_CACHED = 100_000
+
+
+@dataclass(frozen=True)
+class Shard:
+    name: str
+    engine: Engine
+    session_factory: sessionmaker
+
+    def session(self) -> Session:
+        return self.session_factory()
+
+    def run(self, fn: Callable[[Session], T]) -> T:
+        with self.session() as db:
+            return fn(db)
+
+
+def _shard_engine(url: str) -> Engine:
+    is_sqlite = url.startswith("sqlite")
+    shard_engine = create_engine(
+        url, connect_args={"check_same_thread": False} if is_sqlite else {}, future=True
+    )
+    if is_sqlite:
+        apply_sqlite_pragmas(shard_engine)
+    return shard_engine
+
+
+class ShardRouter:
+    """
+    Maps facilities (by district), patients and check-ins to the database
+    holding their rows.
+
+    Patient-owned data (patients, check-ins, agent runs, follow-ups and
+    their derived tables) lives in the shard of the patient's facility
+    district; reference data (facilities, VHTs) is replicated to every
+    shard. Districts without their own URL, and everything when
+    SHARD_DATABASE_URLS is empty, use the default database, so an
+    unsharded deployment routes every call to SessionLocal.
+    """
+
+    def __init__(self, urls: dict[str, str]) -> None:
+        self.default = Shard(DEFAULT_SHARD, engine, SessionLocal)
+        self._shards: dict[str, Shard] = {DEFAULT_SHARD: self.default}
+        for district, url in urls.items():
+            shard_engine = _shard_engine(url)
+            self._shards[district] = Shard(
+                district,
+                shard_engine,
+                sessionmaker(bind=shard_engine, autocommit=False, autoflush=False),
+            )
+        self._lock = threading.Lock()
+        self._facility_district: dict[int, str | None] = {}
+        self._patient_shard: dict[int, str] = {}
+        self._checkin_shard: dict[str, str] = {}
+        self._pool: ThreadPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return len(self._shards) > 1
+
+    def all(self) -> list[Shard]:
+        return list(self._shards.values())
+
+    def get(self, name: str) -> Shard:
+        return self._shards.get(name, self.default)
+
+    # --- routing ---
+    def for_district(self, district: str | None) -> Shard:
+        return self._shards.get(district or "", self.default)
+
+    def for_facility(self, facility_id: int) -> Shard:
+        if not self.enabled:
+            return self.default
+        if facility_id not in self._facility_district:
+            self._load_facilities()
+        return self.for_district(self._facility_district.get(facility_id))
+
+    def for_vht(self, vht_id: int) -> Shard:
+        if not self.enabled:
+            return self.default
+        with self.default.session() as db:
+            facility_id = db.execute(
+                select(VHT.facility_id).where(VHT.id == vht_id)
+            ).scalar()
+        return self.default if facility_id is None else self.for_facility(facility_id)
+
+    def for_patient(self, patient_id: int) -> Shard:
+        """
+        The patient's shard; unknown ids route to the default shard (which
+        then 404s as before).
+        """
+        if not self.enabled:
+            return self.default
+        name = self._patient_shard.get(patient_id)
+        if name is None:
+            with self.default.session() as db:
+                name = db.execute(
+                    select(PatientShard.shard).where(PatientShard.id == patient_id)
+                ).scalar()
+            if name is None:
+                return self.default
+            self.remember_patient(patient_id, name)
+        return self.get(name)
+
+    def for_checkin(self, checkin_id: str) -> Shard:
+        """
+        The check-in's shard. Check-in ids are UUIDs, so the first lookup
+        probes every shard (hot and archived rows) and the answer is cached.
+        """
+        if not self.enabled:
+            return self.default
+        name = self._checkin_shard.get(checkin_id)
+        if name is None:
+            found = self.scatter(lambda db: _has_checkin(db, checkin_id))
+            name = next(
+                (shard.name for shard, hit in zip(self.all(), found) if hit), None
+            )
+            if name is None:
+                return self.default
+            self.remember_checkin(checkin_id, name)
+        return self.get(name)
+
+    def remember_patient(self, patient_id: int, name: str) -> None:
+        with self._lock:
+            if len(self._patient_shard) >= _MAX_CACHED:
+                self._patient_shard.clear()
+            self._patient_shard[patient_id] = name
+
+    def remember_checkin(self, checkin_id: str, name: str) -> None:
+        with self._lock:
+            if len(self._checkin_shard) >= _MAX_CACHED:
+                self._checkin_shard.clear()
+            self._checkin_shard[checkin_id] = name
+
+    def _load_facilities(self) -> None:
+        with self.default.session() as db:
+            rows = db.execute(select(Facility.id, Facility.district)).all()
+        with self._lock:
+            self._facility_district = {fid: district for fid, district in rows}
+
+    # --- writes ---
+    def allocate_patient_id(self, shard: Shard) -> int | None:
+        """
+        Reserve a globally unique patient id in the default database's
+        directory. None when unsharded (the patients table assigns ids).
+        """
+        if not self.enabled:
+            return None
+        with self.default.session() as db:
+            patient_id = run_write(
+                db,
+                lambda wdb: wdb.execute(
+                    insert(PatientShard).values(shard=shard.name).returning(PatientShard.id)
+                ).scalar_one(),
+            )
+        self.remember_patient(patient_id, shard.name)
+        return patient_id
+
+    def sync_directory(self, batch_size: int = 5000) -> None:
+        """
+        Register patients that have no directory entry yet (rows written
+        before sharding was enabled, bulk loads). Safe to run every start.
+
+        Ids are allocated from the directory, so only patients above its
+        current maximum can be missing; a restart scans just those (one
+        index seek per shard when nothing changed).
+        """
+        if not self.enabled:
+            return
+        with self.default.session() as directory:
+            known = directory.execute(select(func.max(PatientShard.id))).scalar() or 0
+            for shard in self.all():
+                with shard.session() as db:
+                    last = known
+                    while True:
+                        ids = db.execute(
+                            select(Patient.id)
+                            .where(Patient.id > last)
+                            .order_by(Patient.id)
+                            .limit(batch_size)
+                        ).scalars().all()
+                        if not ids:
+                            break
+                        directory.execute(
+                            sqlite_insert(PatientShard).on_conflict_do_nothing(),
+                            [{"id": pid, "shard": shard.name} for pid in ids],
+                        )
+                        last = ids[-1]
+            directory.commit()
+
+    # --- cross-shard reads ---
+    def scatter(self, fn: Callable[[Session], T]) -> list[T]:
+        """
+        Run fn(session) on every shard in parallel; results in all() order.
+        """
+
+        if not self.enabled:
+            return [self.default.run(fn)]
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=len(self._shards), thread_name_prefix="shard-scatter"
+                    )
+        return list(self._pool.map(lambda shard: shard.run(fn), self.all()))
+
+
+def _has_checkin(db: Session, checkin_id: str) -> bool:
+    return (
+        db.get(CheckIn, checkin_id) is not None
+        or db.get(CheckInArchive, checkin_id) is not None
+    )
+
+
+def merge_newest(
+    results: list[list[T]], key: Callable[[T], Any], limit: int | None = None
+) -> list[T]:
+    """
+    Combine per-shard lists that are each sorted newest first by key
+    (k-way merge). Callers must select the key column even when the
+    client's sparse fields leave it out.
+    """
+    merged = list(heapq.merge(*results, key=key, reverse=True))
+    return merged if limit is None else merged[:limit]
+
+
+shards = ShardRouter(settings.SHARD_DATABASE_URLS)
+
+
+def shard_session(shard: Shard) -> Iterator[Session]:
+    db = shard.session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_patient_db(patient_id: int) -> Iterator[Session]:
+    """
+    FastAPI dependency: session on the shard holding {patient_id}.
+    """
+    yield from shard_session(shards.for_patient(patient_id))
+
+
+def get_facility_db(facility_id: int) -> Iterator[Session]:
+    """
+    FastAPI dependency: session on the shard of {facility_id}'s district.
+    """
+    yield from shard_session(shards.for_facility(facility_id))
+
+
+def get_scope_db(facility_id: int | None = None, vht_id: int | None = None) -> Iterator[Session]:
+    """
+    FastAPI dependency: session on the shard of ?facility_id= or ?vht_id=
+    (the default shard when neither is given).
+    """
+    if facility_id is not None:
+        shard = shards.for_facility(facility_id)
+    elif vht_id is not None:
+        shard = shards.for_vht(vht_id)
+    else:
+        shard = shards.default
+    yield from shard_session(shard)
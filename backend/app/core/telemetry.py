@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+# ---------- Metric primitives (Prometheus text format, no client dependency) ----------
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key: LabelKey, extra: Iterable[tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help = help_text
+        self._values: dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float]) -> None:
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (bucket counts, sum, count)
+        self._values: dict[LabelKey, tuple[list[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            if idx < len(counts):
+                counts[idx] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    lines.append(
+                        f"{self.name}_bucket{_fmt_labels(key, [('le', str(bound))])} {cumulative}"
+                    )
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {n}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.")
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS
+)
+HTTP_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS
+)
+HTTP_QUERY_COUNT = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", QUERY_COUNT_BUCKETS
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    "http_query_budget_exceeded_total", "Requests over the per-request query budget."
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency.", DB_LATENCY_BUCKETS
+)
+AGENT_RUNS = Counter("agent_runs_total", "Agent runs by final status and intent.")
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Planner LLM call latency.", LATENCY_BUCKETS
+)
+LLM_ERRORS = Counter("llm_errors_total", "Planner LLM calls that raised.")
+PLANS = Counter("planner_plans_total", "Plans by the backend that produced them.")
+LOCAL_PLANNER_LATENCY = Histogram(
+    "local_planner_duration_seconds", "Offline triage classifier latency.", DB_LATENCY_BUCKETS
+)
+EVENTS_PUBLISHED = Counter("events_published_total", "Live dashboard events by type.")
+EVENT_SUBSCRIBERS_DROPPED = Counter(
+    "event_subscribers_dropped_total", "Live subscribers dropped for falling behind."
+)
+
+METRICS: list[Counter | Histogram] = [
+    HTTP_REQUESTS,
+    HTTP_LATENCY,
+    HTTP_DB_TIME,
+    HTTP_QUERY_COUNT,
+    QUERY_BUDGET_EXCEEDED,
+    DB_QUERY_LATENCY,
+    AGENT_RUNS,
+    LLM_LATENCY,
+    LLM_ERRORS,
+    PLANS,
+    LOCAL_PLANNER_LATENCY,
+    EVENTS_PUBLISHED,
+    EVENT_SUBSCRIBERS_DROPPED,
+]
+
+
+# ---------- Per-request SQL accounting ----------
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    # Set to a list to capture statement text (profiled requests only)
+    statements: list[str] | None = None
+
+
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+def current_request_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Count and time every statement; attribute it to the current request.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if stats.statements is not None:
+                stats.statements.append(f"{elapsed * 1000:8.2f}ms  {statement}")
+
+
+class TelemetryMiddleware:
+    """
+    Per-route latency, DB time and query counts; logs routes that exceed
+    QUERY_BUDGET statements (likely N+1).
+    """
+
+    def __init__(self, app: ASGIApp, query_budget: int = 30) -> None:
+        self.app = app
+        self.query_budget = query_budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+
+            route = scope.get("route")
+            # Template path keeps label cardinality bounded
+            route_label = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+
+            HTTP_REQUESTS.inc(method=method, route=route_label, status=status_code)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route_label)
+            HTTP_DB_TIME.observe(stats.db_seconds, method=method, route=route_label)
+            HTTP_QUERY_COUNT.observe(stats.queries, method=method, route=route_label)
+
+            if stats.queries > self.query_budget:
+                QUERY_BUDGET_EXCEEDED.inc(method=method, route=route_label)
+                logger.warning(
+                    "Query budget exceeded: %s %s ran %d queries (budget %d, %.1fms in DB)",
+                    method,
+                    route_label,
+                    stats.queries,
+                    self.query_budget,
+                    stats.db_seconds * 1000,
+                )
+
+
+def _pool_lines(engine: Engine) -> list[str]:
+    pool = engine.pool
+    lines: list[str] = []
+    for name, attr, help_text in (
+        ("db_pool_size", "size", "Configured pool size."),
+        ("db_pool_checked_out", "checkedout", "Connections currently checked out."),
+        ("db_pool_overflow", "overflow", "Overflow connections in use."),
+        ("db_pool_checked_in", "checkedin", "Idle connections in the pool."),
+    ):
+        fn = getattr(pool, attr, None)
+        if fn is None:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {fn()}"]
+    return lines
+
+
+def render_metrics(engine: Engine) -> str:
+    lines: list[str] = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _pool_lines(engine)
+    return "\n".join(lines) + "\n"
+
@@ -0,0 +1,226 @@
+"""Single-writer lane for SQLite.
+
+Every runtime mutation (API routes, webhook ingestion, the follow-up
+scheduler, agent runs, escalations, archival) goes through run_write().
+Only the startup backfills/rebuilds in main.prepare_database and the
+offline reconciliation commands commit directly: they run before the
+lanes start, or in a separate process.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.db import apply_sqlite_pragmas, connect_args, engine_key
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+WriteFn = Callable[[Session], Any]
+
+
+class WriteLaneBusy(RuntimeError):
+    """The write queue stayed full for WRITE_LANE_SUBMIT_TIMEOUT (-> 503)."""
+
+
+@dataclass
+class _Job:
+    fn: WriteFn
+    future: Future = field(default_factory=Future)
+
+
+_STOP = object()
+
+
+def _writer_engine(url: str) -> Engine:
+    """
+    Dedicated engine for the writer thread.
+
+    pysqlite's implicit transaction handling breaks SAVEPOINT (releasing
+    the outermost savepoint commits), so this engine drives transactions
+    itself and takes the write lock up front with BEGIN IMMEDIATE.
+    """
+    writer = create_engine(url, connect_args=connect_args, future=True)
+    apply_sqlite_pragmas(writer)
+
+    @event.listens_for(writer, "connect")
+    def _no_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer
+
+
+class WriteLane:
+    """
+    Single writer thread that group-commits queued write functions.
+
+    Each job runs in its own SAVEPOINT on the writer's session, so one
+    failing job (validation error, constraint) is rolled back alone; the
+    whole batch then commits once. Reads stay on the normal engine and,
+    with WAL, never wait for the writer.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_queue: int = 1000,
+        max_batch: int = 64,
+        submit_timeout: float = 2.0,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.submit_timeout = submit_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+
+    # --- lifecycle ---
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="write-lane", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Drain queued writes, then stop.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # --- callers ---
+    def submit(self, fn: WriteFn) -> Future:
+        """
+        Queue fn(db) for the next group commit.
+
+        Blocks up to submit_timeout when the queue is full (backpressure),
+        then raises WriteLaneBusy.
+        """
+        job = _Job(fn)
+        try:
+            self._queue.put(job, timeout=self.submit_timeout)
+        except queue.Full:
+            raise WriteLaneBusy("Write queue is full") from None
+        return job.future
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # --- writer thread ---
+    def _loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            batch = [job]
+            # Whatever queued up while the last batch committed joins this one
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._commit_batch(batch)
+            if stop:
+                return
+
+    def _commit_batch(self, batch: list[_Job]) -> None:
+        outcomes: list[tuple[_Job, Any, BaseException | None]] = []
+        db = self.session_factory()
+        try:
+            for job in batch:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with db.begin_nested():
+                        result = job.fn(db)
+                    outcomes.append((job, result, None))
+                except Exception as e:
+                    outcomes.append((job, None, e))
+            db.commit()
+        except Exception as e:
+            logger.exception("Group commit of %d writes failed", len(batch))
+            db.rollback()
+            # Nothing in the batch was persisted
+            errors = {id(job): error for job, _, error in outcomes if error is not None}
+            outcomes = [
+                (job, None, errors.get(id(job), e))
+                for job in batch
+                if not job.future.cancelled()
+            ]
+        finally:
+            db.close()
+
+        for job, result, error in outcomes:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+
+# Process-wide lanes, one per database (started from app startup for SQLite)
+_lanes: dict[str, WriteLane] = {}
+
+
+def run_write(db: Session, fn: Callable[[Session], T]) -> T:
+    """
+    Run fn(session) and commit it; return fn's result.
+
+    With a lane running for db's database, fn executes on the writer
+    thread's session and is group-committed with other writes; otherwise
+    it runs on `db` and commits directly. fn must return plain values
+    (ids), not ORM objects, and callers should re-read anything they
+    loaded on `db` beforehand. Don't hold uncommitted writes on `db` while
+    calling this: the writer would wait on that lock.
+    """
+    lane = _lanes.get(engine_key(db.get_bind())) if _lanes else None
+    if lane is None:
+        result = fn(db)
+        db.commit()
+        return result
+    result = lane.submit(fn).result()
+    db.expire_all()
+    return result
+
+
+def start_write_lane(url: str = settings.DATABASE_URL) -> WriteLane | None:
+    if not url.startswith("sqlite"):
+        return None
+    key = make_url(url).render_as_string(hide_password=False)
+    if key not in _lanes:
+        lane = WriteLane(
+            sessionmaker(bind=_writer_engine(url), autocommit=False, autoflush=False),
+            max_queue=settings.WRITE_LANE_MAX_QUEUE,
+            max_batch=settings.WRITE_LANE_MAX_BATCH,
+            submit_timeout=settings.WRITE_LANE_SUBMIT_TIMEOUT,
+        )
+        lane.start()
+        _lanes[key] = lane
+    return _lanes[key]
+
+
+def stop_write_lane() -> None:
+    while _lanes:
+        _, lane = _lanes.popitem()
+        lane.stop()
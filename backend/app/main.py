@@ -1,13 +1,40 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 
-from app.core.db import Base, engine, SessionLocal
+from app.core.compression import CompressionMiddleware
+from app.core.config import settings
+from app.core.db import analyze_sqlite, create_schema, mark_schema_current, schema_is_current
+from app.core.profiling import ProfilingMiddleware
+from app.core.shards import Shard, shards
+from app.core.telemetry import TelemetryMiddleware, instrument_engine
+from app.core.write_lane import WriteLaneBusy, start_write_lane, stop_write_lane
 from app.api.routes_facilities import router as facilities_router
 from app.api.routes_patients import router as patients_router
 from app.api.routes_agent import router as agent_router
 from app.api.routes_checkin import router as checkin_router
-from app.seed.seed_data import seed_if_empty
+from app.api.routes_escalations import router as escalations_router
+from app.api.routes_webhooks import router as webhooks_router
+from app.api.routes_followups import router as followups_router
+from app.api.routes_metrics import router as metrics_router
+from app.api.routes_sync import router as sync_router
+from app.seed.seed_data import replicate_reference, seed_if_empty, seed_locations
+from app.services.agent_queue import shutdown_agent_queue
+from app.services.agent_service import start_agent_warmup
+from app.services.agent_runs import backfill_run_facilities
+from app.services.archive import start_archiver, stop_archiver
+from app.services.change_log import ensure_change_log
+from app.services.dashboard_stats import ensure_dashboard_stats
+from app.services.duplicates import ensure_block_keys
+from app.services.escalations import ensure_escalations
+from app.services.idempotency import purge_expired_keys
+from app.services.observation_index import backfill_observation_index
+from app.services.patient_search import ensure_search_backfill, ensure_search_index
+from app.services.referrals import get_referral_index
+from app.services.risk_engine import ensure_risk_table
+from app.services.scheduler import start_scheduler, stop_scheduler
+from app.services.timeline import ensure_status_history
 
 
 app = FastAPI(title="AI-Fest Prototype Backend", version="0.1.0")
@@ -21,19 +48,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for low-bandwidth field clients
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Opt-in per-request profiling (inside telemetry so SQL text can be captured)
+app.add_middleware(ProfilingMiddleware)
+
+# Per-route latency / SQL accounting (outermost, added last)
+for shard in shards.all():
+    instrument_engine(shard.engine)
+app.add_middleware(TelemetryMiddleware, query_budget=settings.QUERY_BUDGET)
+
 
 @app.on_event("startup")
 def on_startup():
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    # The default database is seeded first: shards copy its reference data
+    for shard in shards.all():
+        prepare_database(shard)
+    # Patient id -> shard directory (rows written before sharding, bulk loads)
+    shards.sync_directory()
+    # Nearest-facility grid for referrals (reference data lives in the default database)
+    with shards.default.session() as db:
+        get_referral_index(db)
+
+    # Funnel API writes through one group-committing writer thread per database
+    if settings.WRITE_LANE_ENABLED:
+        for shard in shards.all():
+            start_write_lane(str(shard.engine.url))
+
+    # Timed follow-ups (each worker runs one per database; leases prevent double-firing)
+    if settings.SCHEDULER_ENABLED:
+        for shard in shards.all():
+            start_scheduler(shard.session_factory)
+
+    # Batched background moves of old closed check-ins to cold storage
+    if settings.ARCHIVE_ENABLED:
+        for shard in shards.all():
+            start_archiver(shard.session_factory)
+
+    # The agent stack loads on first use; optionally build it off the request path now
+    if settings.AGENT_WARMUP:
+        start_agent_warmup()
+
+
+def prepare_database(shard: Shard) -> None:
+    # Schema and first-start backfills only when the models changed since
+    # this database was last prepared (or it is new)
+    migrate = not schema_is_current(shard.engine)
+
+    # Create tables (+ indexes added to existing tables)
+    if migrate:
+        create_schema(shard.engine)
+    ensure_search_index(shard.engine)
 
     # Seed if empty
-    db = SessionLocal()
+    db = shard.session()
     try:
-        seed_if_empty(db)
+        if shard is shards.default:
+            if migrate:
+                seed_if_empty(db)
+                # Coordinates for databases seeded before they existed
+                seed_locations(db)
+        else:
+            # Cheap version check; picks up reference edits made since the last start
+            with shards.default.session() as source:
+                replicate_reference(source, db)
+        if migrate:
+            # Index observations written before the projection existed
+            backfill_observation_index(db)
+            # Materialize risk scores if the table is new
+            ensure_risk_table(db)
+            ensure_dashboard_stats(db)
+            ensure_search_backfill(db)
+            ensure_block_keys(db)
+            # Offline-sync change log for data written before it existed
+            ensure_change_log(db)
+            # agent_runs.facility_id for runs recorded before the column
+            backfill_run_facilities(db)
+            # Starting status for patients registered before status history
+            ensure_status_history(db)
+            # Clinician queue for check-ins escalated before it existed
+            ensure_escalations(db)
+        # Idempotency keys past their TTL
+        purge_expired_keys(db)
     finally:
         db.close()
 
+    # Planner statistics (first start / after bulk loads)
+    analyze_sqlite(shard.engine)
+    if migrate:
+        mark_schema_current(shard.engine)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_archiver()
+    stop_scheduler()
+    # Finish agent runs in progress; defer the ones not started to the scheduler
+    shutdown_agent_queue()
+    # Drain pending writes last (agent runs above may still queue some)
+    stop_write_lane()
+
+
+@app.exception_handler(WriteLaneBusy)
+def write_lane_busy(request: Request, exc: WriteLaneBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
 
 @app.get("/")
 def health():
@@ -43,4 +167,9 @@ def health():
 app.include_router(facilities_router)
 app.include_router(patients_router)
 app.include_router(agent_router)
-app.include_router(checkin_router)  # check-in router
\ No newline at end of file
+app.include_router(checkin_router)  # check-in router
+app.include_router(escalations_router)
+app.include_router(webhooks_router)
+app.include_router(followups_router)
+app.include_router(metrics_router)
+app.include_router(sync_router)
\ No newline at end of file
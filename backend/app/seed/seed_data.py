@@ -2,8 +2,10 @@ import json
 from pathlib import Path
 from sqlalchemy.orm import Session
 from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from app.core.models import Facility, VHT
+from app.core.models import DataVersion, Facility, VHT, Village
+from app.services.data_versions import REFERENCE, bump_version, get_version
 
 
 DATA_PATH = Path(__file__).parent / "data.json"
@@ -20,7 +22,13 @@ def seed_if_empty(db: Session) -> None:
     # Seed facilities
     name_to_facility = {}
     for f in data.get("facilities", []):
-        facility = Facility(name=f["name"], level=f["level"], district=f.get("district"))
+        facility = Facility(
+            name=f["name"],
+            level=f["level"],
+            district=f.get("district"),
+            latitude=f.get("latitude"),
+            longitude=f.get("longitude"),
+        )
         db.add(facility)
         db.flush()  # get id without committing
         name_to_facility[facility.name] = facility
@@ -38,4 +46,77 @@ def seed_if_empty(db: Session) -> None:
         )
         db.add(vht)
 
+    for v in data.get("villages", []):
+        db.add(Village(**v))
+
+    # Invalidate cached facility / VHT lists on clients
+    bump_version(db, REFERENCE)
     db.commit()
+
+
+def seed_locations(db: Session) -> None:
+    """
+    Fill in seed facility coordinates and villages on databases seeded
+    before they existed (matched by facility name; surveyed values are
+    never overwritten). Commits when anything changed.
+    """
+    data = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+    coordinates = {
+        f["name"]: (f["latitude"], f["longitude"])
+        for f in data.get("facilities", [])
+        if f.get("latitude") is not None
+    }
+    seeded = db.execute(
+        select(Facility).where(Facility.name.in_(coordinates))
+    ).scalars().all()
+    if not seeded:
+        return  # not the seed dataset (synthetic / real facility list)
+
+    changed = False
+    for facility in seeded:
+        if facility.latitude is None:
+            facility.latitude, facility.longitude = coordinates[facility.name]
+            changed = True
+    if not db.execute(select(Village.id).limit(1)).first():
+        for v in data.get("villages", []):
+            db.add(Village(**v))
+            changed = True
+    if changed:
+        bump_version(db, REFERENCE)
+        db.commit()
+
+
+def replicate_reference(source: Session, target: Session) -> bool:
+    """
+    Copy facilities, VHTs and villages (same ids) from the default database into a
+    district shard, so joins and validation work locally there. Skipped
+    when the shard already has the source's reference version. Commits.
+    """
+    version, changed_at = get_version(source, REFERENCE)
+    if version == 0 or get_version(target, REFERENCE)[0] == version:
+        return False
+
+    for model in (Facility, VHT, Village):
+        columns = [c.key for c in model.__table__.columns]
+        rows = [
+            {key: getattr(obj, key) for key in columns}
+            for obj in source.execute(select(model)).scalars()
+        ]
+        if not rows:
+            continue
+        stmt = sqlite_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={key: stmt.excluded[key] for key in columns if key != "id"},
+        )
+        target.execute(stmt, rows)
+
+    stmt = sqlite_insert(DataVersion).values(
+        key=REFERENCE, version=version, updated_at=changed_at
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"], set_={"version": version, "updated_at": changed_at}
+    )
+    target.execute(stmt)
+    target.commit()
+    return True
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.models import CheckIn, utcnow
+from app.core.shards import shards
+from app.core.write_lane import run_write
+from app.services.scheduler import AGENT_RUN_TASK, notify_scheduled, schedule_task
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+
+# Submitted runs not yet finished (check-in id per future), capped by
+# AGENT_QUEUE_MAX_PENDING
+_pending: dict[Future, str] = {}
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.AGENT_WORKERS, thread_name_prefix="agent-plan"
+        )
+    return _executor
+
+
+def _run(checkin_id: str) -> None:
+    # Imported here so webhook-only code paths don't load the agent stack
+    from app.services.agent_service import run_agent_once
+
+    try:
+        run_agent_once(checkin_id)
+    except Exception:
+        logger.exception("Background agent run failed for check-in %s", checkin_id)
+
+
+def _done(future: Future) -> None:
+    # Cancelled runs stay listed so shutdown can defer them
+    if future.cancelled():
+        return
+    with _lock:
+        _pending.pop(future, None)
+
+
+def defer_agent_runs(checkin_ids: Iterable[str]) -> int:
+    """
+    Persist check-ins to plan later as scheduler tasks (due now).
+
+    The follow-up scheduler of each check-in's database picks them up,
+    so they survive restarts. Returns the number deferred.
+    """
+    by_shard: dict[str, tuple] = {}
+    for cid in checkin_ids:
+        shard = shards.for_checkin(cid)
+        by_shard.setdefault(shard.name, (shard, []))[1].append(cid)
+
+    deferred = 0
+    for shard, ids in by_shard.values():
+        with shard.session() as db:
+            rows = db.execute(
+                select(CheckIn.id, CheckIn.patient_id).where(CheckIn.id.in_(ids))
+            ).all()
+            due_at = utcnow()
+
+            def write(wdb, rows=rows, due_at=due_at) -> list[int]:
+                return [
+                    schedule_task(
+                        wdb,
+                        tool_name=AGENT_RUN_TASK,
+                        patient_id=patient_id,
+                        checkin_id=cid,
+                        due_at=due_at,
+                    )
+                    for cid, patient_id in rows
+                ]
+
+            for task_id in run_write(db, write):
+                notify_scheduled(db, task_id, due_at)
+        deferred += len(rows)
+    return deferred
+
+
+def enqueue_agent_runs(checkin_ids: Iterable[str]) -> list[Future]:
+    """
+    Plan check-ins asynchronously on AGENT_WORKERS threads.
+
+    At most AGENT_QUEUE_MAX_PENDING runs wait in memory; the rest are
+    deferred to the scheduler (defer_agent_runs) instead of growing an
+    unbounded in-memory backlog. Call only after the check-ins are
+    committed (workers use their own sessions).
+    """
+    executor = _get_executor()
+    futures: list[Future] = []
+    overflow: list[str] = []
+    with _lock:
+        for cid in checkin_ids:
+            if len(_pending) >= settings.AGENT_QUEUE_MAX_PENDING:
+                overflow.append(cid)
+                continue
+            future = executor.submit(_run, cid)
+            _pending[future] = cid
+            futures.append(future)
+    for future in futures:
+        future.add_done_callback(_done)
+
+    if overflow:
+        logger.warning("Agent queue full; deferring %d runs to the scheduler", len(overflow))
+        defer_agent_runs(overflow)
+    return futures
+
+
+def shutdown_agent_queue() -> None:
+    """
+    Stop the workers: runs in progress finish, runs not yet started are
+    cancelled and deferred to the scheduler for the next start.
+    """
+    global _executor
+    if _executor is None:
+        return
+    _executor.shutdown(wait=True, cancel_futures=True)
+    _executor = None
+    with _lock:
+        cancelled = [cid for future, cid in _pending.items() if future.cancelled()]
+        _pending.clear()
+    if cancelled:
+        defer_agent_runs(cancelled)
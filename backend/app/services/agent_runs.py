@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import base64
+from collections import defaultdict
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.models import AgentRun, CheckIn
+
+# SQLite expressions for the start of each summary bucket
+BUCKETS = {
+    "hour": lambda col: func.strftime("%Y-%m-%d %H:00:00", col),
+    "day": lambda col: func.date(col),
+    # Monday of the ISO week
+    "week": lambda col: func.date(col, "weekday 0", "-6 days"),
+}
+
+EQUALITY_FILTERS = ("patient_id", "checkin_id", "facility_id", "status", "intent")
+
+
+def encode_cursor(created_at: datetime, run_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{run_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Inverse of encode_cursor; raises ValueError on anything malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, run_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), int(run_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _filtered(stmt: Select, filters: dict[str, Any]) -> Select:
+    """
+    Apply the optional equality filters and the [since, until) time range.
+    """
+    for name in EQUALITY_FILTERS:
+        value = filters.get(name)
+        if value is not None:
+            stmt = stmt.where(getattr(AgentRun, name) == value)
+    if filters.get("since") is not None:
+        stmt = stmt.where(AgentRun.created_at >= filters["since"])
+    if filters.get("until") is not None:
+        stmt = stmt.where(AgentRun.created_at < filters["until"])
+    return stmt
+
+
+def list_runs(
+    db: Session, filters: dict[str, Any], cursor: str | None, limit: int
+) -> tuple[list[AgentRun], str | None]:
+    """
+    Newest-first page of runs and the cursor for the next page.
+
+    Keyset pagination on (created_at, id): each page is an index range
+    seek, so deep pages cost the same as the first.
+    """
+    stmt = _filtered(select(AgentRun), filters)
+    if cursor:
+        created_at, run_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(AgentRun.created_at, AgentRun.id) < (created_at, run_id))
+    stmt = stmt.order_by(AgentRun.created_at.desc(), AgentRun.id.desc()).limit(limit + 1)
+
+    runs = list(db.execute(stmt).scalars())
+    if len(runs) <= limit:
+        return runs, None
+    runs = runs[:limit]
+    return runs, encode_cursor(runs[-1].created_at, runs[-1].id)
+
+
+def summarize_runs(db: Session, filters: dict[str, Any], bucket: str) -> list[dict[str, Any]]:
+    """
+    Run counts per time bucket, split by intent, status and approval.
+
+    Grouped in SQL over the covering (facility_id | -, created_at, status,
+    intent, approved) indexes; only one row per (bucket, status, intent,
+    approved) combination comes back.
+    """
+    bucket_start = BUCKETS[bucket](AgentRun.created_at).label("bucket_start")
+    stmt = _filtered(
+        select(
+            bucket_start,
+            AgentRun.status,
+            AgentRun.intent,
+            AgentRun.approved,
+            func.count(),
+        ),
+        filters,
+    ).group_by(bucket_start, AgentRun.status, AgentRun.intent, AgentRun.approved)
+
+    buckets: dict[str, dict[str, Any]] = defaultdict(
+        lambda: {
+            "total": 0,
+            "not_approved": 0,
+            "by_intent": defaultdict(int),
+            "by_status": defaultdict(int),
+        }
+    )
+    for start, status, intent, approved, n in db.execute(stmt):
+        b = buckets[start]
+        b["total"] += n
+        if approved is False:
+            b["not_approved"] += n
+        b["by_intent"][intent or "none"] += n
+        b["by_status"][status] += n
+
+    return [
+        {
+            "bucket_start": datetime.fromisoformat(start),
+            "total": b["total"],
+            "not_approved": b["not_approved"],
+            "by_intent": dict(b["by_intent"]),
+            "by_status": dict(b["by_status"]),
+        }
+        for start, b in sorted(buckets.items())
+    ]
+
+
+def merge_summaries(per_shard: list[list[dict[str, Any]]]) -> list[dict[str, Any]]:
+    """
+    Add up summarize_runs() results from several shards bucket by bucket.
+    """
+    merged: dict[datetime, dict[str, Any]] = {}
+    for buckets in per_shard:
+        for b in buckets:
+            into = merged.setdefault(
+                b["bucket_start"],
+                {
+                    "bucket_start": b["bucket_start"],
+                    "total": 0,
+                    "not_approved": 0,
+                    "by_intent": defaultdict(int),
+                    "by_status": defaultdict(int),
+                },
+            )
+            into["total"] += b["total"]
+            into["not_approved"] += b["not_approved"]
+            for key, n in b["by_intent"].items():
+                into["by_intent"][key] += n
+            for key, n in b["by_status"].items():
+                into["by_status"][key] += n
+    return [
+        {**b, "by_intent": dict(b["by_intent"]), "by_status": dict(b["by_status"])}
+        for _, b in sorted(merged.items())
+    ]
+
+
+def backfill_run_facilities(db: Session) -> int:
+    """
+    Fill agent_runs.facility_id for runs recorded before the column existed.
+    Commits; returns the number of rows updated.
+    """
+    missing = db.execute(
+        select(AgentRun.id).where(AgentRun.facility_id.is_(None)).limit(1)
+    ).first()
+    if missing is None:
+        return 0
+    result = db.execute(
+        update(AgentRun)
+        .where(AgentRun.facility_id.is_(None))
+        .values(
+            facility_id=select(CheckIn.facility_id)
+            .where(CheckIn.id == AgentRun.checkin_id)
+            .scalar_subquery()
+        )
+    )
+    db.commit()
+    return result.rowcount
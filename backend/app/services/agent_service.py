@@ -52,20 +52,110 @@
 
 #     return final_state
 
-from datetime import datetime
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING
 from sqlalchemy import text
+from sqlalchemy.orm import Session
 
-from app.agents.graph import build_agent_graph
-from app.core.db import get_db
 from app.core.models import CheckIn
 from app.core.models import Patient
-from app.agents.graph import AgentState
+from app.core.config import settings
+from app.core.events import AGENT_RUN_COMPLETED, publish
+from app.core.shards import shards
+from app.core.telemetry import AGENT_RUNS
+from app.core.write_lane import run_write
+from app.services.dashboard_stats import record_agent_run
+from app.services.escalations import enqueue_escalation, escalation_queue
+from app.services.scheduler import notify_scheduled, schedule_task
+
+if TYPE_CHECKING:
+    from app.agents.graph import AgentState
+
+logger = logging.getLogger(__name__)
+
+
+# checkin_id -> Future of the run currently executing in this process
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_agent_graph():
+    """
+    The compiled agent graph, built once per process on first use.
+
+    Importing it loads langgraph and the planner, so routers and workers
+    that never run the agent start without it.
+    """
+    from app.agents.graph import build_agent_graph
+
+    return build_agent_graph()
+
+
+def warm_up_agent() -> None:
+    """
+    Build the agent graph (and the LLM client, unless plans are local
+    only) ahead of the first run. Called on a background thread at
+    startup when AGENT_WARMUP is set.
+    """
+    try:
+        get_agent_graph()
+        if settings.PLANNER_BACKEND != "local":
+            from app.agents.planner.planner import get_planner_chain
+
+            get_planner_chain()
+    except Exception:
+        logger.exception("Agent warm-up failed (first run will retry)")
+
+
+def start_agent_warmup() -> threading.Thread:
+    thread = threading.Thread(target=warm_up_agent, name="agent-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def run_agent_once(checkin_id: str):
+    """
+    run_agent with single-flight: concurrent calls for the same check-in
+    wait for the one in progress and share its result (one LLM call,
+    one agent_runs row, one set of SMS sends).
+    """
+    with _inflight_lock:
+        future = _inflight.get(checkin_id)
+        leader = future is None
+        if leader:
+            future = _inflight[checkin_id] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = run_agent(checkin_id)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(checkin_id, None)
 
 
 def run_agent(checkin_id: str):
-    graph = build_agent_graph()
+    db = shards.for_checkin(checkin_id).session()
+    try:
+        return _run_agent(db, checkin_id)
+    finally:
+        db.close()
 
-    db = next(get_db())
+
+def _run_agent(db: Session, checkin_id: str):
+    graph = get_agent_graph()
 
     # --- Fetch checkin ---
     checkin = db.query(CheckIn).filter(CheckIn.id == checkin_id).first()
@@ -78,7 +168,7 @@ def run_agent(checkin_id: str):
         raise ValueError(f"Patient {checkin.patient_id} not found")
 
     # --- Hydrate state ---
-    initial_state : AgentState = {
+    initial_state : "AgentState" = {
         "patient_id": patient.id,
         "checkin_id": checkin.id,
         "patient": {
@@ -102,23 +192,87 @@ def run_agent(checkin_id: str):
 
     # --- Run graph ---
     final_state = graph.invoke(initial_state)
+    plan = (final_state.get("plan") or {}).get("modified_plan") or {}
+    intent = plan.get("intent")
+    intent = str(getattr(intent, "value", intent)) if intent else None
+    approved = (final_state.get("plan") or {}).get("approved")
+    planner = (final_state.get("plan") or {}).get("planner")
+
+    facility_id, vht_id = checkin.facility_id, patient.vht_id
+    patient_id, checkin_id = patient.id, checkin.id
+
+    # --- Persist agent run (group-committed by the write lane) ---
+    def persist(wdb):
+        wdb.execute(
+            text(
+                """
+                INSERT INTO agent_runs
+                (patient_id, checkin_id, facility_id, status, intent, priority,
+                 approved, planner, created_at)
+                VALUES (:pid, :cid, :fid, :status, :intent, :priority,
+                 :approved, :planner, :created_at)
+                """
+            ),
+            {
+                "pid": patient_id,
+                "cid": checkin_id,
+                "fid": facility_id,
+                "status": final_state["status"],
+                "intent": intent,
+                "priority": plan.get("priority"),
+                "approved": approved,
+                "planner": planner,
+                "created_at": datetime.utcnow(),
+            },
+        )
+        record_agent_run(wdb, facility_id, vht_id, intent)
+
+        # --- Timed follow-up requested by the plan ---
+        followup = None
+        if "schedule_followup_sms" in (plan.get("tools") or []):
+            due_at = datetime.utcnow() + timedelta(hours=settings.FOLLOWUP_DEFAULT_HOURS)
+            task_id = schedule_task(
+                wdb,
+                tool_name="send_advice_sms",
+                patient_id=patient_id,
+                checkin_id=checkin_id,
+                due_at=due_at,
+                payload={"reason": "followup", "intent": intent},
+            )
+            followup = (task_id, due_at)
+
+        # --- Clinician queue (also catches plans the policy fell back to ESCALATE) ---
+        queue_key = None
+        if intent == "ESCALATE":
+            priority = plan.get("priority")
+            queue_key = enqueue_escalation(
+                wdb,
+                checkin_id=checkin_id,
+                patient_id=patient_id,
+                facility_id=facility_id,
+                priority=str(getattr(priority, "value", priority)) if priority else None,
+            )
+        return queue_key, followup
 
-    # --- Persist agent run ---
-    db.execute(
-        text(
-            """
-            INSERT INTO agent_runs
-            (patient_id, checkin_id, status, created_at)
-            VALUES (:pid, :cid, :status, :created_at)
-            """
-        ),
+    # In-memory queues only hear about rows once they are committed
+    queue_key, followup = run_write(db, persist)
+    if queue_key is not None:
+        escalation_queue(db).notify(facility_id, queue_key)
+    if followup is not None:
+        notify_scheduled(db, *followup)
+    AGENT_RUNS.inc(status=final_state["status"], intent=intent or "none")
+    publish(
+        facility_id,
+        AGENT_RUN_COMPLETED,
         {
-            "pid": patient.id,
-            "cid": checkin.id,
+            "checkin_id": checkin_id,
+            "patient_id": patient_id,
+            "vht_id": vht_id,
             "status": final_state["status"],
-            "created_at": datetime.utcnow(),
+            "intent": intent,
+            "priority": plan.get("priority"),
+            "requires_human": bool(plan.get("requires_human")),
         },
     )
-    db.commit()
 
     return final_state
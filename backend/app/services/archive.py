@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.models import (
+    AgentRun,
+    AgentRunArchive,
+    CheckIn,
+    CheckInArchive,
+    CheckInObservation,
+    CheckInObservationTag,
+    Escalation,
+    Patient,
+    ScheduledTask,
+    utcnow,
+)
+from app.core.write_lane import run_write
+from app.services.change_log import CHECKIN, REMOVE, facility_scope, record_changes, vht_scope
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_DATETIME_COLUMNS = ("created_at", "closed_at")
+
+
+def _pack(row: dict[str, Any]) -> bytes:
+    return zlib.compress(
+        json.dumps(
+            {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()},
+            separators=(",", ":"),
+        ).encode("utf-8")
+    )
+
+
+def unpack_row(payload: bytes) -> dict[str, Any]:
+    return json.loads(zlib.decompress(payload))
+
+
+def _row(obj: Any) -> dict[str, Any]:
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """
+    Move up to batch_size check-ins closed before cutoff (with their agent
+    runs) into the archive tables. Does not commit.
+
+    Candidates are picked inside the write transaction, so concurrent
+    passes (several workers) never move the same row twice. Check-ins
+    with a pending follow-up stay hot.
+    """
+    pending = select(ScheduledTask.checkin_id).where(
+        ScheduledTask.status.in_(("pending", "leased")),
+        ScheduledTask.checkin_id.is_not(None),
+    )
+    checkins = list(
+        db.execute(
+            select(CheckIn)
+            .where(
+                CheckIn.status == "closed",
+                CheckIn.closed_at < cutoff,
+                CheckIn.id.not_in(pending),
+            )
+            .order_by(CheckIn.closed_at)
+            .limit(batch_size)
+        ).scalars()
+    )
+    if not checkins:
+        return 0
+
+    ids = [c.id for c in checkins]
+    runs = list(db.execute(select(AgentRun).where(AgentRun.checkin_id.in_(ids))).scalars())
+    vht_by_patient = dict(
+        db.execute(
+            select(Patient.id, Patient.vht_id).where(
+                Patient.id.in_({c.patient_id for c in checkins})
+            )
+        ).all()
+    )
+    now = utcnow()
+
+    db.execute(
+        insert(CheckInArchive),
+        [
+            {
+                "id": c.id,
+                "patient_id": c.patient_id,
+                "facility_id": c.facility_id,
+                "created_at": c.created_at,
+                "closed_at": c.closed_at,
+                "archived_at": now,
+                "payload": _pack(_row(c)),
+            }
+            for c in checkins
+        ],
+    )
+    if runs:
+        db.execute(
+            insert(AgentRunArchive),
+            [
+                {
+                    "id": r.id,
+                    "checkin_id": r.checkin_id,
+                    "patient_id": r.patient_id,
+                    "facility_id": r.facility_id,
+                    "created_at": r.created_at,
+                    "archived_at": now,
+                    "payload": _pack(_row(r)),
+                }
+                for r in runs
+            ],
+        )
+
+    # Offline devices drop archived history on their next sync
+    record_changes(
+        db,
+        CHECKIN,
+        [
+            (c.id, [facility_scope(c.facility_id), vht_scope(vht_by_patient.get(c.patient_id))])
+            for c in checkins
+        ],
+        op=REMOVE,
+    )
+
+    # Observation projections are derived; the archived JSON keeps the source
+    db.execute(delete(CheckInObservationTag).where(CheckInObservationTag.checkin_id.in_(ids)))
+    db.execute(delete(CheckInObservation).where(CheckInObservation.checkin_id.in_(ids)))
+    db.execute(delete(AgentRun).where(AgentRun.checkin_id.in_(ids)))
+    db.execute(delete(Escalation).where(Escalation.checkin_id.in_(ids)))
+    db.execute(delete(CheckIn).where(CheckIn.id.in_(ids)))
+    return len(ids)
+
+
+def archive_closed_checkins(
+    db: Session,
+    older_than_days: int | None = None,
+    batch_size: int | None = None,
+    max_batches: int | None = None,
+) -> int:
+    """
+    Archive everything eligible in batches of batch_size, one write
+    transaction (through the write lane) per batch so API writes
+    interleave. Returns the number of check-ins moved.
+    """
+    days = older_than_days if older_than_days is not None else settings.ARCHIVE_AFTER_DAYS
+    size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = utcnow() - timedelta(days=days)
+
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        n = run_write(db, lambda wdb: archive_batch(wdb, cutoff, size))
+        moved += n
+        batches += 1
+        if n < size:
+            break
+    return moved
+
+
+def _archived_checkin(row: CheckInArchive) -> CheckIn:
+    """
+    Rehydrate an archived check-in as a transient (detached) CheckIn.
+    """
+    data = unpack_row(row.payload)
+    for key in CHECKIN_DATETIME_COLUMNS:
+        if data.get(key):
+            data[key] = datetime.fromisoformat(data[key])
+    return CheckIn(**data)
+
+
+def recent_checkins_with_archive(
+    db: Session, patient_id: int, hot: list[CheckIn], limit: int
+) -> list[CheckIn]:
+    """
+    Top up a patient's hot recent check-ins from the archive.
+
+    Only consulted when the hot table returned fewer than limit rows, so
+    patients with recent activity never touch cold storage.
+    """
+    if len(hot) >= limit:
+        return hot
+    cold = db.execute(
+        select(CheckInArchive)
+        .where(CheckInArchive.patient_id == patient_id)
+        .order_by(CheckInArchive.created_at.desc())
+        .limit(limit)
+    ).scalars()
+    merged = hot + [_archived_checkin(row) for row in cold]
+    merged.sort(key=lambda c: c.created_at, reverse=True)
+    return merged[:limit]
+
+
+def archived_agent_runs(db: Session, checkin_id: str) -> list[dict[str, Any]]:
+    """
+    Agent runs of an archived check-in as plain row dicts, newest first.
+    """
+    rows = db.execute(
+        select(AgentRunArchive.payload)
+        .where(AgentRunArchive.checkin_id == checkin_id)
+        .order_by(AgentRunArchive.created_at.desc(), AgentRunArchive.id.desc())
+    ).scalars()
+    return [unpack_row(payload) for payload in rows]
+
+
+class Archiver:
+    """
+    Background thread running an archival pass every
+    ARCHIVE_INTERVAL_SECONDS (first pass shortly after startup).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal) -> None:
+        self.session_factory = session_factory
+        self.interval = settings.ARCHIVE_INTERVAL_SECONDS
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> int:
+        db = self.session_factory()
+        try:
+            moved = archive_closed_checkins(db)
+        finally:
+            db.close()
+        if moved:
+            logger.info("Archived %d closed check-ins", moved)
+        return moved
+
+    def _loop(self) -> None:
+        # Let startup work (backfills, ANALYZE) finish first
+        wait = min(60.0, self.interval)
+        while not self._stop.wait(wait):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Archival pass failed")
+            wait = self.interval
+
+
+# Process-wide instances, one per database (started from app startup when enabled)
+_archivers: list[Archiver] = []
+
+
+def start_archiver(session_factory: Callable[[], Session] = SessionLocal) -> Archiver:
+    archiver = Archiver(session_factory)
+    archiver.start()
+    _archivers.append(archiver)
+    return archiver
+
+
+def stop_archiver() -> None:
+    while _archivers:
+        _archivers.pop().stop()
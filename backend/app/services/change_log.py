@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import DateTime, bindparam, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.models import CheckIn, DataVersion, Facility, SyncChange, utcnow
+
+# Sequence counter in data_versions (last allocated seq)
+SEQ_KEY = "change_log"
+
+PATIENT = "patient"
+CHECKIN = "checkin"
+VHT = "vht"
+FACILITY = "facility"
+
+UPSERT = "upsert"
+REMOVE = "remove"
+
+
+def facility_scope(facility_id: int) -> str:
+    return f"facility:{facility_id}"
+
+
+def vht_scope(vht_id: int | None) -> str | None:
+    return f"vht:{vht_id}" if vht_id else None
+
+
+def patient_scopes(facility_id: int, vht_id: int | None) -> set[str]:
+    """
+    Devices that sync a patient: its facility and its VHT (if assigned).
+    """
+    scopes = {facility_scope(facility_id)}
+    if vht_id:
+        scopes.add(vht_scope(vht_id))
+    return scopes
+
+
+def _reserve_seqs(db: Session, n: int) -> int:
+    """
+    Allocate n sequence numbers; returns the first one.
+
+    The counter row is bumped in the caller's write transaction, so the
+    write lock serializes allocation and seq order matches commit order.
+    """
+    stmt = sqlite_insert(DataVersion).values(key=SEQ_KEY, version=n, updated_at=utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"version": DataVersion.version + n, "updated_at": utcnow()},
+    ).returning(DataVersion.version)
+    last = db.execute(stmt).scalar_one()
+    return last - n + 1
+
+
+def record_changes(
+    db: Session,
+    entity: str,
+    changes: Iterable[tuple[Any, Iterable[str | None]]],
+    op: str = UPSERT,
+) -> None:
+    """
+    Log (entity_id, scopes) pairs as changed. Does not commit (same transaction as the write).
+
+    Rows are upserted per (entity, id, scope), so the log stays compacted
+    to the latest change of each entity.
+    """
+    keys = [
+        (str(entity_id), scope)
+        for entity_id, scopes in changes
+        for scope in sorted({s for s in scopes if s})
+    ]
+    if not keys:
+        return
+
+    first = _reserve_seqs(db, len(keys))
+    now = utcnow()
+    rows = [
+        {
+            "entity": entity,
+            "entity_id": entity_id,
+            "scope": scope,
+            "op": op,
+            "seq": first + i,
+            "changed_at": now,
+        }
+        for i, (entity_id, scope) in enumerate(keys)
+    ]
+    # executemany over one cached statement (a multi-row VALUES upsert
+    # recompiles for every batch size)
+    stmt = sqlite_insert(SyncChange)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["entity", "entity_id", "scope"],
+        set_={
+            "op": stmt.excluded.op,
+            "seq": stmt.excluded.seq,
+            "changed_at": stmt.excluded.changed_at,
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def record_patient_change(
+    db: Session,
+    patient_id: int,
+    before: tuple[int, int | None] | None,
+    after: tuple[int, int | None],
+) -> None:
+    """
+    Log a patient create/update given (facility_id, vht_id) before and after.
+    Does not commit.
+
+    A patient moved to another facility or VHT is removed from the old
+    devices; when the VHT changes, its check-ins follow it.
+    """
+    new_scopes = patient_scopes(*after)
+    old_scopes = patient_scopes(*before) if before is not None else set()
+
+    record_changes(db, PATIENT, [(patient_id, new_scopes)])
+    if old_scopes - new_scopes:
+        record_changes(db, PATIENT, [(patient_id, old_scopes - new_scopes)], op=REMOVE)
+
+    old_vht, new_vht = (before[1] if before else None), after[1]
+    if before is None or old_vht == new_vht:
+        return
+    checkin_ids = db.execute(
+        select(CheckIn.id).where(CheckIn.patient_id == patient_id)
+    ).scalars().all()
+    if new_vht:
+        record_changes(db, CHECKIN, [(cid, [vht_scope(new_vht)]) for cid in checkin_ids])
+    if old_vht:
+        record_changes(
+            db, CHECKIN, [(cid, [vht_scope(old_vht)]) for cid in checkin_ids], op=REMOVE
+        )
+
+
+def record_checkins(db: Session, checkins: Sequence[tuple[str, int, int | None]]) -> None:
+    """
+    Log new check-ins as (checkin_id, facility_id, patient's vht_id). Does not commit.
+    """
+    record_changes(
+        db,
+        CHECKIN,
+        [
+            (checkin_id, [facility_scope(facility_id), vht_scope(vht_id)])
+            for checkin_id, facility_id, vht_id in checkins
+        ],
+    )
+
+
+def changes_since(
+    db: Session, scope: str, since: int, limit: int
+) -> list[SyncChange]:
+    """
+    Next page of compacted changes for one scope, in seq order.
+    """
+    return list(
+        db.execute(
+            select(SyncChange)
+            .where(SyncChange.scope == scope, SyncChange.seq > since)
+            .order_by(SyncChange.seq)
+            .limit(limit)
+        ).scalars()
+    )
+
+
+# Full rebuild: every current row as an upsert, numbered in a stable order
+_BACKFILL_SQL = [
+    # (entity, scope expression, FROM/WHERE clause, order)
+    (FACILITY, "'facility:' || f.id", "FROM facilities f", "f.id"),
+    (VHT, "'facility:' || v.facility_id", "FROM vhts v", "v.id"),
+    (VHT, "'vht:' || v.id", "FROM vhts v", "v.id"),
+    (PATIENT, "'facility:' || p.facility_id", "FROM patients p", "p.id"),
+    (PATIENT, "'vht:' || p.vht_id", "FROM patients p WHERE p.vht_id IS NOT NULL", "p.id"),
+    (CHECKIN, "'facility:' || c.facility_id", "FROM checkins c", "c.created_at, c.id"),
+    (
+        CHECKIN,
+        "'vht:' || p.vht_id",
+        "FROM checkins c JOIN patients p ON p.id = c.patient_id WHERE p.vht_id IS NOT NULL",
+        "c.created_at, c.id",
+    ),
+]
+_ID_COLUMN = {FACILITY: "f.id", VHT: "v.id", PATIENT: "p.id", CHECKIN: "c.id"}
+
+
+def rebuild_change_log(db: Session) -> None:
+    """
+    Recreate the log from current data (startup backfill, bulk loads).
+
+    Numbering continues after the last allocated seq, so devices holding
+    any earlier cursor re-download everything once. Commits.
+    """
+    db.execute(text("DELETE FROM sync_changes"))
+    now = utcnow()
+    last = db.execute(
+        select(DataVersion.version).where(DataVersion.key == SEQ_KEY)
+    ).scalar() or 0
+    for entity, scope_expr, from_clause, order in _BACKFILL_SQL:
+        db.execute(
+            text(
+                "INSERT INTO sync_changes (entity, entity_id, scope, op, seq, changed_at) "
+                f"SELECT :entity, CAST({_ID_COLUMN[entity]} AS TEXT), {scope_expr}, :op, "
+                f":base + ROW_NUMBER() OVER (ORDER BY {order}), :now {from_clause}"
+            ).bindparams(bindparam("now", type_=DateTime)),
+            {"entity": entity, "op": UPSERT, "base": last, "now": now},
+        )
+        last = max(
+            last,
+            db.execute(select(func.coalesce(func.max(SyncChange.seq), 0))).scalar_one(),
+        )
+
+    stmt = sqlite_insert(DataVersion).values(key=SEQ_KEY, version=last, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"], set_={"version": last, "updated_at": now}
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def ensure_change_log(db: Session) -> None:
+    """
+    Backfill the log on first start (covers seeded reference data too).
+    """
+    has_rows = db.execute(select(SyncChange.seq).limit(1)).first()
+    has_data = db.execute(select(Facility.id).limit(1)).first()
+    if has_data and not has_rows:
+        rebuild_change_log(db)
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from typing import Any, NamedTuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.models import (
+    AgentRun,
+    CheckIn,
+    FacilityDailyStats,
+    FacilityVHTStats,
+    Patient,
+    utcnow,
+)
+
+# Patients without a VHT are counted under this vht_id
+NO_VHT = 0
+
+PATIENT_COUNTER_COLUMNS = (
+    "active",
+    "paused",
+    "closed",
+    "open_checkins",
+    "missed_anc_0",
+    "missed_anc_1",
+    "missed_anc_2",
+    "missed_anc_3_plus",
+)
+
+
+class PatientKey(NamedTuple):
+    facility_id: int
+    vht_id: int
+    status: str
+    missed_anc_count: int
+
+
+def patient_key(patient: Patient) -> PatientKey:
+    """
+    Snapshot of the fields that decide which counters a patient lands in.
+    Take one before and one after a write, then call apply_patient_change().
+    """
+    return PatientKey(
+        facility_id=patient.facility_id,
+        vht_id=patient.vht_id or NO_VHT,
+        status=patient.status,
+        missed_anc_count=patient.missed_anc_count or 0,
+    )
+
+
+def missed_anc_bucket(missed: int) -> str:
+    if missed >= 3:
+        return "missed_anc_3_plus"
+    return f"missed_anc_{missed}"
+
+
+def _patient_counters(key: PatientKey) -> dict[str, int]:
+    counters = {key.status: 1}
+    if key.status == "active":
+        counters[missed_anc_bucket(key.missed_anc_count)] = 1
+    return counters
+
+
+def _bump(db: Session, model: Any, key: dict[str, Any], deltas: dict[str, int]) -> None:
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET col = col + delta.
+    """
+    deltas = {col: n for col, n in deltas.items() if n}
+    if not deltas:
+        return
+    stmt = sqlite_insert(model).values(**key, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={col: getattr(model, col) + stmt.excluded[col] for col in deltas},
+    )
+    db.execute(stmt)
+
+
+def apply_patient_change(
+    db: Session, before: PatientKey | None, after: PatientKey | None
+) -> None:
+    """
+    Move a patient between counters (None = not counted, e.g. on create).
+
+    Does not commit: runs in the caller's write transaction.
+    """
+    deltas: dict[tuple[int, int], dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    if before is not None:
+        for col, n in _patient_counters(before).items():
+            deltas[(before.facility_id, before.vht_id)][col] -= n
+    if after is not None:
+        for col, n in _patient_counters(after).items():
+            deltas[(after.facility_id, after.vht_id)][col] += n
+
+    for (facility_id, vht_id), cols in deltas.items():
+        _bump(
+            db,
+            FacilityVHTStats,
+            {"facility_id": facility_id, "vht_id": vht_id},
+            dict(cols),
+        )
+
+
+def move_open_checkins(db: Session, patient_id: int, old_vht_id: int, new_vht_id: int) -> None:
+    """
+    Re-attribute a patient's open check-ins after the patient's VHT changed.
+    """
+    if old_vht_id == new_vht_id:
+        return
+    rows = db.execute(
+        select(CheckIn.facility_id, func.count())
+        .where(CheckIn.patient_id == patient_id)
+        .where(CheckIn.status == "open")
+        .group_by(CheckIn.facility_id)
+    ).all()
+    for facility_id, n in rows:
+        _bump(
+            db,
+            FacilityVHTStats,
+            {"facility_id": facility_id, "vht_id": old_vht_id},
+            {"open_checkins": -n},
+        )
+        _bump(
+            db,
+            FacilityVHTStats,
+            {"facility_id": facility_id, "vht_id": new_vht_id},
+            {"open_checkins": n},
+        )
+
+
+def record_checkin_opened(db: Session, facility_id: int, vht_id: int | None) -> None:
+    _bump(
+        db,
+        FacilityVHTStats,
+        {"facility_id": facility_id, "vht_id": vht_id or NO_VHT},
+        {"open_checkins": 1},
+    )
+
+
+def record_agent_run(
+    db: Session,
+    facility_id: int,
+    vht_id: int | None,
+    intent: str | None,
+    day: date | None = None,
+) -> None:
+    _bump(
+        db,
+        FacilityDailyStats,
+        {
+            "facility_id": facility_id,
+            "vht_id": vht_id or NO_VHT,
+            "day": day or utcnow().date(),
+        },
+        {"agent_runs": 1, "escalations": 1 if intent == "ESCALATE" else 0},
+    )
+
+
+def rebuild_dashboard_stats(db: Session) -> None:
+    """
+    Recompute all counters from source tables (reconciliation). Commits.
+
+    Daily agent counters are re-attributed to each patient's current VHT;
+    the incremental path attributes them to the VHT at run time.
+    """
+    counters: dict[tuple[int, int], dict[str, int]] = defaultdict(
+        lambda: dict.fromkeys(PATIENT_COUNTER_COLUMNS, 0)
+    )
+
+    patient_rows = db.execute(
+        select(
+            Patient.facility_id,
+            Patient.vht_id,
+            Patient.status,
+            Patient.missed_anc_count,
+            func.count(),
+        ).group_by(
+            Patient.facility_id,
+            Patient.vht_id,
+            Patient.status,
+            Patient.missed_anc_count,
+        )
+    ).all()
+    for facility_id, vht_id, status, missed, n in patient_rows:
+        key = PatientKey(facility_id, vht_id or NO_VHT, status, missed or 0)
+        for col in _patient_counters(key):
+            if col in counters[(key.facility_id, key.vht_id)]:
+                counters[(key.facility_id, key.vht_id)][col] += n
+
+    checkin_rows = db.execute(
+        select(CheckIn.facility_id, Patient.vht_id, func.count())
+        .join(Patient, Patient.id == CheckIn.patient_id)
+        .where(CheckIn.status == "open")
+        .group_by(CheckIn.facility_id, Patient.vht_id)
+    ).all()
+    for facility_id, vht_id, n in checkin_rows:
+        counters[(facility_id, vht_id or NO_VHT)]["open_checkins"] += n
+
+    run_day = func.date(AgentRun.created_at)
+    run_rows = db.execute(
+        select(
+            CheckIn.facility_id,
+            Patient.vht_id,
+            run_day,
+            func.count(),
+            func.sum(func.iif(AgentRun.intent == "ESCALATE", 1, 0)),
+        )
+        .join(CheckIn, CheckIn.id == AgentRun.checkin_id)
+        .join(Patient, Patient.id == AgentRun.patient_id)
+        .group_by(CheckIn.facility_id, Patient.vht_id, run_day)
+    ).all()
+
+    daily: dict[tuple[int, int, date], dict[str, int]] = defaultdict(
+        lambda: {"agent_runs": 0, "escalations": 0}
+    )
+    for facility_id, vht_id, day, runs, escalations in run_rows:
+        bucket = daily[(facility_id, vht_id or NO_VHT, date.fromisoformat(day))]
+        bucket["agent_runs"] += runs
+        bucket["escalations"] += escalations or 0
+
+    db.execute(delete(FacilityVHTStats))
+    db.execute(delete(FacilityDailyStats))
+    if counters:
+        db.execute(
+            insert(FacilityVHTStats),
+            [
+                {"facility_id": f, "vht_id": v, **cols}
+                for (f, v), cols in counters.items()
+            ],
+        )
+    if daily:
+        db.execute(
+            insert(FacilityDailyStats),
+            [
+                {"facility_id": f, "vht_id": v, "day": d, **cols}
+                for (f, v, d), cols in daily.items()
+            ],
+        )
+    db.commit()
+
+
+def ensure_dashboard_stats(db: Session) -> None:
+    """
+    Build the counters on first start (or after they were dropped).
+    """
+    has_rows = db.execute(select(FacilityVHTStats.facility_id).limit(1)).first()
+    has_patients = db.execute(select(Patient.id).limit(1)).first()
+    if has_patients and not has_rows:
+        rebuild_dashboard_stats(db)
+
+
+def facility_stats(db: Session, facility_id: int, day: date | None = None) -> dict[str, Any]:
+    """
+    Read the counters for one facility: O(#VHTs), independent of patient count.
+    """
+    day = day or utcnow().date()
+
+    by_vht: dict[int, dict[str, int]] = defaultdict(
+        lambda: {
+            **dict.fromkeys(PATIENT_COUNTER_COLUMNS, 0),
+            "agent_runs_today": 0,
+            "escalations_today": 0,
+        }
+    )
+    for row in db.execute(
+        select(FacilityVHTStats).where(FacilityVHTStats.facility_id == facility_id)
+    ).scalars():
+        for col in PATIENT_COUNTER_COLUMNS:
+            by_vht[row.vht_id][col] = getattr(row, col)
+
+    for row in db.execute(
+        select(FacilityDailyStats)
+        .where(FacilityDailyStats.facility_id == facility_id)
+        .where(FacilityDailyStats.day == day)
+    ).scalars():
+        by_vht[row.vht_id]["agent_runs_today"] = row.agent_runs
+        by_vht[row.vht_id]["escalations_today"] = row.escalations
+
+    totals: dict[str, int] = defaultdict(int)
+    for cols in by_vht.values():
+        for col, n in cols.items():
+            totals[col] += n
+
+    return {
+        "facility_id": facility_id,
+        "day": day,
+        "totals": dict(totals),
+        "by_vht": [
+            {"vht_id": vht_id if vht_id != NO_VHT else None, **cols}
+            for vht_id, cols in sorted(by_vht.items())
+        ],
+    }
+
+
+def _empty_counts() -> dict[str, int]:
+    return {
+        **dict.fromkeys(PATIENT_COUNTER_COLUMNS, 0),
+        "agent_runs_today": 0,
+        "escalations_today": 0,
+    }
+
+
+def counters_by_facility(db: Session, day: date) -> dict[int, dict[str, int]]:
+    """
+    Counters of every facility in one database, summed in SQL
+    (one GROUP BY per summary table).
+    """
+    by_facility: dict[int, dict[str, int]] = defaultdict(_empty_counts)
+    sums = [func.sum(getattr(FacilityVHTStats, col)) for col in PATIENT_COUNTER_COLUMNS]
+    for facility_id, *values in db.execute(
+        select(FacilityVHTStats.facility_id, *sums).group_by(FacilityVHTStats.facility_id)
+    ):
+        by_facility[facility_id].update(zip(PATIENT_COUNTER_COLUMNS, values))
+
+    for facility_id, runs, escalations in db.execute(
+        select(
+            FacilityDailyStats.facility_id,
+            func.sum(FacilityDailyStats.agent_runs),
+            func.sum(FacilityDailyStats.escalations),
+        )
+        .where(FacilityDailyStats.day == day)
+        .group_by(FacilityDailyStats.facility_id)
+    ):
+        by_facility[facility_id]["agent_runs_today"] = runs
+        by_facility[facility_id]["escalations_today"] = escalations
+    return dict(by_facility)
+
+
+def national_stats(
+    per_shard: list[dict[int, dict[str, int]]],
+    district_of: dict[int, str | None],
+    day: date,
+) -> dict[str, Any]:
+    """
+    Roll counters_by_facility() results from every shard up to districts
+    and a national total.
+    """
+    totals = _empty_counts()
+    by_district: dict[str | None, dict[str, int]] = defaultdict(_empty_counts)
+    for counters in per_shard:
+        for facility_id, cols in counters.items():
+            district = by_district[district_of.get(facility_id)]
+            for col, n in cols.items():
+                district[col] += n
+                totals[col] += n
+    return {
+        "day": day,
+        "totals": totals,
+        "by_district": [
+            {"district": district, **cols}
+            for district, cols in sorted(by_district.items(), key=lambda kv: kv[0] or "")
+        ],
+    }
+
+
+if __name__ == "__main__":
+    # Reconcile counters on every district shard: python -m app.services.dashboard_stats
+    from app.core.shards import shards
+
+    for shard in shards.all():
+        with shard.session() as session:
+            rebuild_dashboard_stats(session)
+        print(f"dashboard stats rebuilt ({shard.name})")
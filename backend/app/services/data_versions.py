@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.models import DataVersion, utcnow
+
+# Facilities + VHTs + villages (seeded / admin-managed, rarely changes)
+REFERENCE = "reference"
+
+
+def get_version(db: Session, key: str) -> tuple[int, datetime | None]:
+    """
+    Current (version, updated_at) for a data set; (0, None) if never bumped.
+    """
+    row = db.execute(
+        select(DataVersion.version, DataVersion.updated_at).where(DataVersion.key == key)
+    ).first()
+    if row is None:
+        return 0, None
+    return row[0], row[1]
+
+
+def bump_version(db: Session, key: str) -> None:
+    """
+    Increment a data set version. Does not commit (same transaction as the write).
+    """
+    now = utcnow()
+    stmt = sqlite_insert(DataVersion).values(key=key, version=1, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"version": DataVersion.version + 1, "updated_at": now},
+    )
+    db.execute(stmt)
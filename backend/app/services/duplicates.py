@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import combinations, groupby
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.models import Patient, PatientBlockKey, PatientPhone
+from app.services.patient_search import normalize_phone
+
+# Candidates read per blocking key at create time (bounds the lookup)
+BLOCK_LIMIT = 50
+# The bulk job skips blocks larger than this (a very common name in a big
+# village says little and costs block_size**2 comparisons)
+MAX_BLOCK_SIZE = 200
+# Score from which a pair is reported as a likely duplicate
+MIN_SCORE = 0.75
+
+# Score weights: name similarity, shared phone, same village (parish counts half)
+W_NAME = 0.6
+W_PHONE = 0.25
+W_PLACE = 0.15
+
+_TOKEN = re.compile(r"[a-z]+")
+
+_SOUNDEX = {
+    letter: digit
+    for digit, letters in (
+        ("1", "bfpv"),
+        ("2", "cgjkqsxz"),
+        ("3", "dt"),
+        ("4", "l"),
+        ("5", "mn"),
+        ("6", "r"),
+    )
+    for letter in letters
+}
+
+
+def name_tokens(name: str | None) -> list[str]:
+    return _TOKEN.findall((name or "").lower())
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Soundex code of one name part: spelling variants such as "Nakato" /
+    "Nakatto" or "Akello" / "Akelo" share a key.
+    """
+    token = token.lower()
+    codes = [token[0].upper()]
+    last = _SOUNDEX.get(token[0], "")
+    for letter in token[1:]:
+        code = _SOUNDEX.get(letter, "")
+        if code and code != last:
+            codes.append(code)
+        if letter not in "hw":
+            last = code
+    return ("".join(codes) + "000")[:4]
+
+
+def _place(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def block_keys(name: str | None, village: str | None, parish: str | None) -> set[str]:
+    """
+    One key per name part and place: "v:<soundex>|<village>" and
+    "p:<soundex>|<parish>", so swapped name order or a misspelt village
+    still shares a block.
+    """
+    village, parish = _place(village), _place(parish)
+    keys: set[str] = set()
+    for token in name_tokens(name):
+        if len(token) < 3:
+            continue
+        code = phonetic_key(token)
+        if village:
+            keys.add(f"v:{code}|{village}"[:150])
+        if parish:
+            keys.add(f"p:{code}|{parish}"[:150])
+    return keys
+
+
+def sync_block_keys(db: Session, patient: Patient) -> None:
+    """
+    Refresh one patient's blocking keys. Does not commit.
+    """
+    db.execute(delete(PatientBlockKey).where(PatientBlockKey.patient_id == patient.id))
+    keys = block_keys(patient.name, patient.village, patient.parish)
+    if keys:
+        db.execute(
+            insert(PatientBlockKey),
+            [{"key": key, "patient_id": patient.id} for key in sorted(keys)],
+        )
+
+
+def ensure_block_keys(db: Session, batch_size: int = 5000) -> None:
+    """
+    Build blocking keys for patients registered before they existed. Commits.
+    """
+    has_keys = db.execute(select(PatientBlockKey.patient_id).limit(1)).first()
+    if has_keys:
+        return
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Patient.id, Patient.name, Patient.village, Patient.parish)
+            .where(Patient.id > last_id)
+            .order_by(Patient.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        keys = [
+            {"key": key, "patient_id": row.id}
+            for row in rows
+            for key in block_keys(row.name, row.village, row.parish)
+        ]
+        if keys:
+            db.execute(insert(PatientBlockKey), keys)
+        db.commit()
+        last_id = rows[-1].id
+
+
+# --- scoring ---
+def jaro_winkler(a: str, b: str, prefix_scale: float = 0.1) -> float:
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b:
+        return 0.0
+    la, lb = len(a), len(b)
+    window = max(0, max(la, lb) // 2 - 1)
+    a_hit = [False] * la
+    b_hit = [False] * lb
+    matches = 0
+    for i, ch in enumerate(a):
+        for j in range(max(0, i - window), min(lb, i + window + 1)):
+            if not b_hit[j] and b[j] == ch:
+                a_hit[i] = b_hit[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i in range(la):
+        if a_hit[i]:
+            while not b_hit[j]:
+                j += 1
+            if a[i] != b[j]:
+                transpositions += 1
+            j += 1
+    jaro = (matches / la + matches / lb + (matches - transpositions / 2) / matches) / 3
+
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+@lru_cache(maxsize=65_536)
+def name_similarity(a: str | None, b: str | None) -> float:
+    """
+    Jaro-Winkler of the whole names with parts sorted (order-insensitive),
+    or the mean best match of the shorter name's parts ("Joan Akello" vs
+    "Akello Joan Grace"), whichever is higher. Cached: common names recur
+    across many pairs.
+    """
+    ta, tb = name_tokens(a), name_tokens(b)
+    if not ta or not tb:
+        return 0.0
+    whole = jaro_winkler(" ".join(sorted(ta)), " ".join(sorted(tb)))
+    short, long_ = (ta, tb) if len(ta) <= len(tb) else (tb, ta)
+    parts = sum(max(jaro_winkler(s, t) for t in long_) for s in short) / len(short)
+    return max(whole, parts)
+
+
+@dataclass(frozen=True)
+class Profile:
+    id: int
+    name: str
+    village: str
+    parish: str
+    phones: frozenset[str]
+
+
+def _profile(row) -> Profile:
+    phones = frozenset(
+        e164 for raw in (row.phone, row.backup_phone) if (e164 := normalize_phone(raw))
+    )
+    return Profile(row.id, row.name, _place(row.village), _place(row.parish), phones)
+
+
+def score_pair(a: Profile, b: Profile, min_score: float = 0.0) -> tuple[float, list[str]]:
+    """
+    Likelihood in [0, 1] that two registrations are the same mother, and
+    what matched (name, phone, village / parish).
+
+    Phone and place are scored first; when even an identical name could
+    not lift the pair to min_score, the name comparison is skipped and the
+    (lower) partial score returned.
+    """
+    matched: list[str] = []
+    phone = 1.0 if a.phones & b.phones else 0.0
+    if phone:
+        matched.append("phone")
+    if a.village and a.village == b.village:
+        place = 1.0
+        matched.append("village")
+    elif a.parish and a.parish == b.parish:
+        place = 0.5
+        matched.append("parish")
+    else:
+        place = 0.0
+    partial = W_PHONE * phone + W_PLACE * place
+    if partial + W_NAME < min_score:
+        return round(partial, 4), matched
+
+    name = name_similarity(a.name, b.name)
+    if name >= 0.85:
+        matched.insert(0, "name")
+    return round(W_NAME * name + partial, 4), matched
+
+
+_PROFILE_COLUMNS = (
+    Patient.id,
+    Patient.name,
+    Patient.phone,
+    Patient.backup_phone,
+    Patient.village,
+    Patient.parish,
+)
+
+
+# --- create time: one new registration against its blocks ---
+def find_duplicates(
+    db: Session,
+    name: str,
+    village: str | None,
+    parish: str | None,
+    phones: Iterable[str | None] = (),
+    exclude: int | None = None,
+    min_score: float = MIN_SCORE,
+    limit: int = 5,
+) -> list[tuple[Patient, float, list[str]]]:
+    """
+    Likely existing registrations of a mother, best first.
+
+    Reads at most BLOCK_LIMIT ids per blocking key and phone (index
+    seeks), so the cost doesn't grow with the cohort.
+    """
+    candidate = Profile(
+        exclude or 0,
+        name,
+        _place(village),
+        _place(parish),
+        frozenset(e164 for raw in phones if (e164 := normalize_phone(raw))),
+    )
+    ids: set[int] = set()
+    for key in sorted(block_keys(name, village, parish)):
+        ids.update(
+            db.execute(
+                select(PatientBlockKey.patient_id)
+                .where(PatientBlockKey.key == key)
+                .limit(BLOCK_LIMIT)
+            ).scalars()
+        )
+    for phone in sorted(candidate.phones):
+        ids.update(
+            db.execute(
+                select(PatientPhone.patient_id)
+                .where(PatientPhone.phone_e164 == phone)
+                .limit(BLOCK_LIMIT)
+            ).scalars()
+        )
+    ids.discard(exclude)
+    if not ids:
+        return []
+
+    scored = []
+    for patient in db.execute(select(Patient).where(Patient.id.in_(ids))).scalars():
+        score, matched = score_pair(candidate, _profile(patient), min_score)
+        if score >= min_score:
+            scored.append((patient, score, matched))
+    scored.sort(key=lambda item: (-item[1], item[0].id))
+    return scored[:limit]
+
+
+# --- bulk job: every block of the table ---
+@dataclass
+class DedupeStats:
+    blocks: int = 0
+    skipped_blocks: int = 0
+    pairs_compared: int = 0
+    duplicates: int = 0
+    skipped_keys: list[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class DuplicatePair:
+    a: Profile
+    b: Profile
+    score: float
+    matched: list[str]
+
+
+def _blocks(db: Session, stmt, max_block: int, stats: DedupeStats) -> Iterator[list[int]]:
+    """
+    Groups of patient ids sharing a key, streamed in key order from the
+    (key, patient_id) index.
+    """
+    rows = db.execute(stmt.execution_options(yield_per=10_000))
+    for key, group in groupby(rows, key=itemgetter(0)):
+        ids = [row[1] for row in group]
+        if len(ids) < 2:
+            continue
+        if len(ids) > max_block:
+            stats.skipped_blocks += 1
+            if len(stats.skipped_keys) < 20:
+                stats.skipped_keys.append(key)
+            continue
+        stats.blocks += 1
+        yield ids
+
+
+def duplicate_pairs(
+    db: Session,
+    min_score: float = MIN_SCORE,
+    max_block: int = MAX_BLOCK_SIZE,
+    batch_size: int = 5000,
+    stats: DedupeStats | None = None,
+) -> Iterator[DuplicatePair]:
+    """
+    All likely duplicate pairs in this database.
+
+    Only pairs sharing a blocking key or a phone are scored, each once;
+    profiles are loaded per batch of candidate pairs, so memory holds one
+    batch plus the set of pairs already compared.
+    """
+    stats = stats if stats is not None else DedupeStats()
+    seen: set[tuple[int, int]] = set()
+    pending: list[tuple[int, int]] = []
+
+    def flush() -> Iterator[DuplicatePair]:
+        ids = {i for pair in pending for i in pair}
+        profiles = {
+            row.id: _profile(row)
+            for row in db.execute(select(*_PROFILE_COLUMNS).where(Patient.id.in_(ids)))
+        }
+        for a, b in pending:
+            if a not in profiles or b not in profiles:
+                continue
+            stats.pairs_compared += 1
+            score, matched = score_pair(profiles[a], profiles[b], min_score)
+            if score >= min_score:
+                stats.duplicates += 1
+                yield DuplicatePair(profiles[a], profiles[b], score, matched)
+        pending.clear()
+
+    sources = [
+        select(PatientBlockKey.key, PatientBlockKey.patient_id).order_by(
+            PatientBlockKey.key, PatientBlockKey.patient_id
+        ),
+        select(PatientPhone.phone_e164, PatientPhone.patient_id).order_by(
+            PatientPhone.phone_e164, PatientPhone.patient_id
+        ),
+    ]
+    for stmt in sources:
+        for ids in _blocks(db, stmt, max_block, stats):
+            for pair in combinations(sorted(set(ids)), 2):
+                if pair not in seen:
+                    seen.add(pair)
+                    pending.append(pair)
+            if len(pending) >= batch_size:
+                yield from flush()
+    if pending:
+        yield from flush()
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import engine_key
+from app.core.models import Escalation, PatientRisk, utcnow
+from app.core.write_lane import run_write
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+
+# Plan priorities, most urgent first; anything else sorts after them
+PRIORITY_RANK = {"CRITICAL": 2, "HIGH": 1}
+
+# Heap order: priority, then risk, then longest waiting (id breaks ties)
+Key = tuple[int, float, datetime, int]
+
+
+def queue_key(
+    priority: str | None, risk_score: float, created_at: datetime, escalation_id: int
+) -> Key:
+    rank = PRIORITY_RANK.get((priority or "").upper(), 0)
+    return -rank, -(risk_score or 0.0), created_at, escalation_id
+
+
+def _row_key(row) -> Key:
+    return queue_key(row.priority, row.risk_score, row.created_at, row.id)
+
+
+def _claimable(now: datetime):
+    return or_(
+        Escalation.status == QUEUED,
+        and_(Escalation.status == LEASED, Escalation.lease_expires_at < now),
+    )
+
+
+def enqueue_escalation(
+    db: Session,
+    checkin_id: str,
+    patient_id: int,
+    facility_id: int,
+    priority: str | None,
+) -> Key | None:
+    """
+    Queue an escalated check-in for its facility's clinicians, ranked by
+    the plan priority and the patient's current risk score. A check-in
+    escalated again (agent re-run) keeps its place in the queue but takes
+    the new priority; one already handled stays done. Does not commit.
+
+    Returns the queue key to hand to notify() once committed, or None.
+    """
+    risk = db.execute(
+        select(PatientRisk.score).where(PatientRisk.patient_id == patient_id)
+    ).scalar()
+    stmt = sqlite_insert(Escalation).values(
+        checkin_id=checkin_id,
+        patient_id=patient_id,
+        facility_id=facility_id,
+        priority=priority,
+        risk_score=risk or 0.0,
+        status=QUEUED,
+        claims=0,
+        created_at=utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["checkin_id"],
+        set_={"priority": stmt.excluded.priority, "risk_score": stmt.excluded.risk_score},
+        where=Escalation.status != DONE,
+    ).returning(
+        Escalation.id, Escalation.priority, Escalation.risk_score, Escalation.created_at
+    )
+    row = db.execute(stmt).first()
+    return _row_key(row) if row is not None else None
+
+
+def ensure_escalations(db: Session) -> None:
+    """
+    Queue open check-ins whose latest agent run escalated, for databases
+    that predate the queue. Commits.
+    """
+    has_rows = db.execute(select(Escalation.id).limit(1)).first()
+    if has_rows:
+        return
+    db.execute(
+        text(
+            "INSERT INTO escalations "
+            "(checkin_id, patient_id, facility_id, priority, risk_score, status, "
+            "claims, created_at) "
+            "SELECT c.id, c.patient_id, c.facility_id, r.priority, "
+            "COALESCE(pr.score, 0), 'queued', 0, r.created_at "
+            "FROM agent_runs r JOIN checkins c ON c.id = r.checkin_id "
+            "LEFT JOIN patient_risk pr ON pr.patient_id = c.patient_id "
+            "WHERE r.id IN (SELECT MAX(id) FROM agent_runs GROUP BY checkin_id) "
+            "AND r.intent = 'ESCALATE' AND c.status = 'open'"
+        )
+    )
+    db.commit()
+
+
+@dataclass
+class _Lease:
+    facility_id: int
+    key: Key
+    owner: str
+    expires_at: datetime
+
+
+class EscalationQueue:
+    """
+    Per-facility min-heaps over the persisted escalations table.
+
+    The table is the source of truth and arbitrates between workers: a
+    case is only handed out by a conditional UPDATE that succeeds while it
+    is queued or its lease has expired. The heaps only decide which case
+    to try, so claim / complete / release are a heap pop or push plus one
+    single-row write, O(log n) per facility.
+
+    Removal is lazy: _queued maps each live case to its current key and
+    heap entries that no longer match are skipped when they surface.
+    Leases are mirrored in a min-heap by expiry, so expired ones go back
+    into their facility's heap on the next access. Each facility's heap is
+    rebuilt from the table every ESCALATION_REFRESH_SECONDS to pick up
+    cases queued, claimed or released through other workers.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._heaps: dict[int, list[Key]] = {}
+        self._queued: dict[int, tuple[int, Key]] = {}
+        self._leases: dict[int, _Lease] = {}
+        self._lease_heap: list[tuple[datetime, int]] = []
+        self._synced_at: dict[int, float] = {}
+
+    # --- in-memory bookkeeping (lock held) ---
+    def _push(self, facility_id: int, key: Key) -> None:
+        escalation_id = key[-1]
+        if escalation_id in self._leases or self._queued.get(escalation_id) == (facility_id, key):
+            return
+        self._queued[escalation_id] = (facility_id, key)
+        heapq.heappush(self._heaps.setdefault(facility_id, []), key)
+
+    def _pop(self, facility_id: int) -> Key | None:
+        heap = self._heaps.get(facility_id)
+        while heap:
+            key = heapq.heappop(heap)
+            if self._queued.get(key[-1]) == (facility_id, key):
+                del self._queued[key[-1]]
+                return key
+        return None
+
+    def _expire(self, now: datetime) -> None:
+        while self._lease_heap and self._lease_heap[0][0] < now:
+            expires_at, escalation_id = heapq.heappop(self._lease_heap)
+            lease = self._leases.get(escalation_id)
+            if lease is not None and lease.expires_at == expires_at:
+                del self._leases[escalation_id]
+                self._push(lease.facility_id, lease.key)
+
+    def _hold(self, facility_id: int, key: Key, owner: str, expires_at: datetime) -> None:
+        escalation_id = key[-1]
+        self._queued.pop(escalation_id, None)
+        self._leases[escalation_id] = _Lease(facility_id, key, owner, expires_at)
+        heapq.heappush(self._lease_heap, (expires_at, escalation_id))
+
+    def _forget(self, escalation_id: int) -> None:
+        self._queued.pop(escalation_id, None)
+        self._leases.pop(escalation_id, None)
+
+    # --- sync with the table ---
+    def _sync(self, db: Session, facility_id: int) -> None:
+        synced_at = self._synced_at.get(facility_id)
+        if synced_at is not None and time.monotonic() - synced_at < settings.ESCALATION_REFRESH_SECONDS:
+            return
+        self.reload(db, facility_id)
+
+    def reload(self, db: Session, facility_id: int) -> int:
+        """
+        Rebuild a facility's heap from its claimable rows (index on
+        facility_id, status). Returns the queue length.
+        """
+        now = utcnow()
+        rows = db.execute(
+            select(
+                Escalation.id,
+                Escalation.priority,
+                Escalation.risk_score,
+                Escalation.created_at,
+            ).where(Escalation.facility_id == facility_id, _claimable(now))
+        ).all()
+        keys = [_row_key(row) for row in rows]
+        with self._lock:
+            for key in keys:
+                # Leased here but claimable in the table: released or lapsed elsewhere
+                self._leases.pop(key[-1], None)
+            stale = [i for i, (f, _) in self._queued.items() if f == facility_id]
+            for escalation_id in stale:
+                del self._queued[escalation_id]
+            heapq.heapify(keys)
+            self._heaps[facility_id] = keys
+            for key in keys:
+                self._queued[key[-1]] = (facility_id, key)
+            self._synced_at[facility_id] = time.monotonic()
+        return len(keys)
+
+    def notify(self, facility_id: int, key: Key) -> None:
+        """
+        A case was (re-)queued and committed; make it claimable here now.
+        """
+        with self._lock:
+            current = self._queued.get(key[-1])
+            if current is not None and current != (facility_id, key):
+                # Re-prioritized: the old heap entry goes stale
+                del self._queued[key[-1]]
+            self._push(facility_id, key)
+
+    # --- reads ---
+    def peek(self, db: Session, facility_id: int, limit: int) -> list[int]:
+        """
+        Ids of the next limit cases in claim order.
+        """
+        self._sync(db, facility_id)
+        with self._lock:
+            self._expire(utcnow())
+            live = (
+                key
+                for key in self._heaps.get(facility_id, ())
+                if self._queued.get(key[-1]) == (facility_id, key)
+            )
+            return [key[-1] for key in heapq.nsmallest(limit, live)]
+
+    # --- clinician actions ---
+    def claim(
+        self, db: Session, facility_id: int, clinician: str, lease_seconds: int
+    ) -> int | None:
+        """
+        Lease the most urgent case to clinician. Returns its id, or None
+        when the facility's queue is empty. Commits.
+        """
+        self._sync(db, facility_id)
+        while True:
+            now = utcnow()
+            with self._lock:
+                self._expire(now)
+                key = self._pop(facility_id)
+            if key is None:
+                return None
+            escalation_id = key[-1]
+            expires_at = now + timedelta(seconds=lease_seconds)
+
+            def write(wdb: Session) -> bool:
+                result = wdb.execute(
+                    update(Escalation)
+                    .where(Escalation.id == escalation_id, _claimable(now))
+                    .values(
+                        status=LEASED,
+                        lease_owner=clinician,
+                        lease_expires_at=expires_at,
+                        claims=Escalation.claims + 1,
+                    )
+                )
+                return result.rowcount > 0
+
+            try:
+                claimed = run_write(db, write)
+            except Exception:
+                with self._lock:
+                    self._push(facility_id, key)
+                raise
+            if claimed:
+                with self._lock:
+                    self._hold(facility_id, key, clinician, expires_at)
+                return escalation_id
+            # Claimed or closed through another worker: try the next case
+
+    def renew(
+        self, db: Session, escalation: Escalation, clinician: str, lease_seconds: int
+    ) -> bool:
+        """
+        Extend clinician's lease (also re-takes a lapsed one nobody else
+        claimed). Commits.
+        """
+        escalation_id, facility_id = escalation.id, escalation.facility_id
+        key = _row_key(escalation)
+        expires_at = utcnow() + timedelta(seconds=lease_seconds)
+
+        def write(wdb: Session) -> bool:
+            result = wdb.execute(
+                update(Escalation)
+                .where(
+                    Escalation.id == escalation_id,
+                    Escalation.status == LEASED,
+                    Escalation.lease_owner == clinician,
+                )
+                .values(lease_expires_at=expires_at)
+            )
+            return result.rowcount > 0
+
+        if not run_write(db, write):
+            return False
+        with self._lock:
+            self._leases.pop(escalation_id, None)
+            self._hold(facility_id, key, clinician, expires_at)
+        return True
+
+    def release(self, db: Session, escalation: Escalation, clinician: str) -> bool:
+        """
+        Hand clinician's case back to the queue at its original place. Commits.
+        """
+        escalation_id, facility_id = escalation.id, escalation.facility_id
+        key = _row_key(escalation)
+
+        def write(wdb: Session) -> bool:
+            result = wdb.execute(
+                update(Escalation)
+                .where(
+                    Escalation.id == escalation_id,
+                    Escalation.status == LEASED,
+                    Escalation.lease_owner == clinician,
+                )
+                .values(status=QUEUED, lease_owner=None, lease_expires_at=None)
+            )
+            return result.rowcount > 0
+
+        if not run_write(db, write):
+            return False
+        with self._lock:
+            self._leases.pop(escalation_id, None)
+            self._push(facility_id, key)
+        return True
+
+    def complete(
+        self, db: Session, escalation_id: int, clinician: str, outcome: str | None = None
+    ) -> bool:
+        """
+        Close clinician's case. Allowed after the lease lapsed as long as
+        nobody else has claimed it since. Commits.
+        """
+
+        def write(wdb: Session) -> bool:
+            now = utcnow()
+            result = wdb.execute(
+                update(Escalation)
+                .where(
+                    Escalation.id == escalation_id,
+                    Escalation.status == LEASED,
+                    Escalation.lease_owner == clinician,
+                )
+                .values(
+                    status=DONE,
+                    lease_expires_at=None,
+                    completed_at=now,
+                    completed_by=clinician,
+                    outcome=outcome,
+                )
+            )
+            return result.rowcount > 0
+
+        if not run_write(db, write):
+            return False
+        with self._lock:
+            self._forget(escalation_id)
+        return True
+
+
+# Process-wide queues, one per database
+_queues: dict[str, EscalationQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def escalation_queue(db: Session) -> EscalationQueue:
+    key = engine_key(db.get_bind())
+    queue = _queues.get(key)
+    if queue is None:
+        with _queues_lock:
+            queue = _queues.setdefault(key, EscalationQueue())
+    return queue
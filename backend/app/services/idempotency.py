@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.models import IdempotencyKey, utcnow
+
+CHECKIN_CREATE = "POST /checkins"
+AGENT_RUN = "POST /agent/run"
+
+MAX_KEY_LENGTH = 200
+
+
+def request_fingerprint(payload: Any) -> str:
+    """
+    Stable hash of a JSON-able request (key order doesn't matter).
+    """
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_stored(db: Session, scope: str, key: str) -> IdempotencyKey | None:
+    """
+    Unexpired stored response for (scope, key), if any.
+    """
+    return db.execute(
+        select(IdempotencyKey)
+        .where(IdempotencyKey.scope == scope)
+        .where(IdempotencyKey.key == key)
+        .where(IdempotencyKey.expires_at > utcnow())
+    ).scalar_one_or_none()
+
+
+def store_response(
+    db: Session,
+    scope: str,
+    key: str,
+    request_hash: str,
+    status_code: int,
+    body: Any,
+) -> bool:
+    """
+    Remember the response for a key. Does not commit: write it in the
+    same transaction as the side effect so both land or neither does.
+
+    An expired row for the same key is overwritten; returns False if an
+    unexpired one already exists (a concurrent duplicate got there first).
+    """
+    now = utcnow()
+    values = {
+        "request_hash": request_hash,
+        "status_code": status_code,
+        "response_json": json.dumps(body, default=str),
+        "created_at": now,
+        "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+    }
+    stmt = sqlite_insert(IdempotencyKey).values(scope=scope, key=key, **values)
+    result = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+            set_=values,
+            where=IdempotencyKey.expires_at <= now,
+        )
+    )
+    return result.rowcount > 0
+
+
+def purge_expired_keys(db: Session) -> int:
+    """
+    Delete expired keys. Commits.
+    """
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= utcnow()))
+    db.commit()
+    return result.rowcount
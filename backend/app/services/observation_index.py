@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.models import CheckIn, CheckInObservation, CheckInObservationTag
+
+# List-valued observation keys -> tag kind stored in checkin_observation_tags
+TAG_KEYS = {
+    "danger_signs": "danger_sign",
+    "symptoms": "symptom",
+}
+
+
+def normalize_tag(value: Any) -> str | None:
+    """
+    Normalize a symptom / danger sign for indexing.
+
+    "Fast Breathing" and "fast_breathing" should match the same filter.
+    """
+    if value is None:
+        return None
+    text = str(value).strip().lower().replace("-", "_").replace(" ", "_")
+    return text[:100] or None
+
+
+def _to_bool(value: Any) -> bool | None:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in {"true", "yes", "y", "1"}:
+            return True
+        if lowered in {"false", "no", "n", "0"}:
+            return False
+    return None
+
+
+def _to_float(value: Any) -> float | None:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def index_observations(
+    db: Session, checkin_id: str, observations: dict[str, Any] | None
+) -> None:
+    """
+    (Re)write the queryable projection for one check-in.
+
+    Does not commit: callers index in the same transaction as the
+    check-in write so the projection never drifts from observations_json.
+    """
+    db.execute(
+        delete(CheckInObservationTag).where(
+            CheckInObservationTag.checkin_id == checkin_id
+        )
+    )
+    db.execute(
+        delete(CheckInObservation).where(CheckInObservation.checkin_id == checkin_id)
+    )
+
+    if not isinstance(observations, dict):
+        return
+
+    db.add(
+        CheckInObservation(
+            checkin_id=checkin_id,
+            fever=_to_bool(observations.get("fever")),
+            temp_c=_to_float(observations.get("temp_c")),
+        )
+    )
+
+    for key, kind in TAG_KEYS.items():
+        raw = observations.get(key) or []
+        if isinstance(raw, str):
+            raw = [raw]
+        values = {normalize_tag(v) for v in raw if not isinstance(v, (dict, list))}
+        for value in sorted(v for v in values if v):
+            db.add(CheckInObservationTag(checkin_id=checkin_id, kind=kind, value=value))
+
+
+def backfill_observation_index(db: Session, batch_size: int = 500) -> int:
+    """
+    Index check-ins that have observations_json but no projection row yet.
+
+    Safe to run repeatedly (startup, after restores). Returns rows indexed.
+    """
+    indexed = 0
+    while True:
+        rows = db.execute(
+            select(CheckIn.id, CheckIn.observations_json)
+            .outerjoin(CheckInObservation, CheckInObservation.checkin_id == CheckIn.id)
+            .where(CheckIn.observations_json.is_not(None))
+            .where(CheckInObservation.checkin_id.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        for checkin_id, raw in rows:
+            try:
+                loaded = json.loads(raw)
+            except (TypeError, ValueError):
+                loaded = None
+            # Corrupt / non-dict JSON still gets an empty row so it isn't retried
+            index_observations(db, checkin_id, loaded if isinstance(loaded, dict) else {})
+        db.commit()
+        indexed += len(rows)
+
+    return indexed
+
+
+def filter_checkins(
+    stmt,
+    *,
+    fever: bool | None = None,
+    temp_min: float | None = None,
+    temp_max: float | None = None,
+    danger_signs: Iterable[str] = (),
+    symptoms: Iterable[str] = (),
+):
+    """
+    Push observation filters into a select(CheckIn) statement.
+
+    Tag filters are AND-ed: every requested sign must be present.
+    """
+    if fever is not None or temp_min is not None or temp_max is not None:
+        stmt = stmt.join(
+            CheckInObservation, CheckInObservation.checkin_id == CheckIn.id
+        )
+        if fever is not None:
+            stmt = stmt.where(CheckInObservation.fever == fever)
+        if temp_min is not None:
+            stmt = stmt.where(CheckInObservation.temp_c >= temp_min)
+        if temp_max is not None:
+            stmt = stmt.where(CheckInObservation.temp_c <= temp_max)
+
+    for kind, values in (("danger_sign", danger_signs), ("symptom", symptoms)):
+        wanted = {v for v in (normalize_tag(x) for x in values) if v}
+        if not wanted:
+            continue
+        matching = (
+            select(CheckInObservationTag.checkin_id)
+            .where(CheckInObservationTag.kind == kind)
+            .where(CheckInObservationTag.value.in_(wanted))
+            .group_by(CheckInObservationTag.checkin_id)
+            .having(func.count(CheckInObservationTag.value) == len(wanted))
+        )
+        stmt = stmt.where(CheckIn.id.in_(matching))
+
+    return stmt
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import re
+from difflib import SequenceMatcher
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.models import Patient, PatientPhone
+
+DEFAULT_COUNTRY_CODE = "256"  # Uganda
+
+FTS_TABLE = "patient_search_fts"
+
+# Set by ensure_search_index(); False if this SQLite build lacks FTS5 trigram
+FTS_AVAILABLE = False
+
+# Max FTS candidates re-scored in Python per query
+CANDIDATE_LIMIT = 200
+
+
+def normalize_phone(raw: str | None, country_code: str = DEFAULT_COUNTRY_CODE) -> str | None:
+    """
+    Best-effort E.164 normalization for Ugandan numbers.
+
+    "0772 123456", "772123456", "+256-772-123456", "00256772123456"
+    all become "+256772123456". Returns None if nothing usable remains.
+    """
+    if not raw:
+        return None
+    digits = re.sub(r"\D", "", raw)
+    if not digits:
+        return None
+
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0") and len(digits) == 10:
+        digits = country_code + digits[1:]
+    elif len(digits) == 9 and not raw.strip().startswith("+"):
+        digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Create the FTS5 trigram table (idempotent) and record availability.
+    """
+    global FTS_AVAILABLE
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    "USING fts5(name, village, parish, tokenize='trigram')"
+                )
+            )
+        FTS_AVAILABLE = True
+    except OperationalError:
+        # SQLite < 3.34 or built without FTS5: search falls back to LIKE
+        FTS_AVAILABLE = False
+
+
+def sync_patient_search(db: Session, patient: Patient) -> None:
+    """
+    Refresh phone keys + FTS row for one patient. Does not commit.
+    """
+    db.execute(delete(PatientPhone).where(PatientPhone.patient_id == patient.id))
+    phones = [
+        {"patient_id": patient.id, "kind": kind, "phone_e164": e164}
+        for kind, raw in (("primary", patient.phone), ("backup", patient.backup_phone))
+        if (e164 := normalize_phone(raw))
+    ]
+    if phones:
+        db.execute(insert(PatientPhone), phones)
+
+    if FTS_AVAILABLE:
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": patient.id})
+        db.execute(
+            text(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, village, parish) "
+                "VALUES (:id, :name, :village, :parish)"
+            ),
+            {
+                "id": patient.id,
+                "name": patient.name,
+                "village": patient.village,
+                "parish": patient.parish or "",
+            },
+        )
+
+
+def rebuild_search_index(db: Session, batch_size: int = 1000) -> int:
+    """
+    Rebuild phone keys and the FTS table from patients. Commits.
+    """
+    db.execute(delete(PatientPhone))
+    if FTS_AVAILABLE:
+        db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+    count = 0
+    last_id = 0
+    while True:
+        patients = (
+            db.execute(
+                select(Patient)
+                .where(Patient.id > last_id)
+                .order_by(Patient.id)
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not patients:
+            break
+        for patient in patients:
+            sync_patient_search(db, patient)
+        last_id = patients[-1].id
+        count += len(patients)
+        db.commit()
+        db.expunge_all()
+
+    db.commit()
+    return count
+
+
+def ensure_search_backfill(db: Session) -> None:
+    """
+    Populate the index on first start (existing patients, empty index).
+    """
+    has_patients = db.execute(select(Patient.id).limit(1)).first()
+    if not has_patients:
+        return
+    if FTS_AVAILABLE:
+        indexed = db.execute(text(f"SELECT rowid FROM {FTS_TABLE} LIMIT 1")).first()
+    else:
+        indexed = db.execute(select(PatientPhone.patient_id).limit(1)).first()
+    if not indexed:
+        rebuild_search_index(db)
+
+
+def find_by_phone(db: Session, phone: str) -> list[int]:
+    """
+    Patient ids whose primary or backup phone normalizes to `phone`.
+    """
+    e164 = normalize_phone(phone)
+    if e164 is None:
+        return []
+    return list(
+        db.execute(
+            select(PatientPhone.patient_id)
+            .where(PatientPhone.phone_e164 == e164)
+            .distinct()
+        ).scalars()
+    )
+
+
+def _trigram_query(value: str) -> str | None:
+    """
+    OR of the query's trigrams: tolerant of misspellings, ranked by bm25.
+    """
+    cleaned = " ".join(value.lower().split())
+    grams = {cleaned[i : i + 3] for i in range(len(cleaned) - 2)}
+    grams = {g for g in grams if g.strip() and len(g.strip()) == 3}
+    if not grams:
+        return None
+    ored = " OR ".join('"' + g.replace('"', '""') + '"' for g in sorted(grams))
+    return f"name : ({ored})"
+
+
+def _place_phrase(value: str) -> str | None:
+    """
+    Substring phrase over village/parish; None if too short for trigrams.
+    """
+    cleaned = " ".join(value.lower().split())
+    if len(cleaned) < 3:
+        return None
+    return '{village parish} : "' + cleaned.replace('"', '""') + '"'
+
+
+def _similarity(a: str | None, b: str | None) -> float:
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+
+def _name_similarity(query: str, name: str) -> float:
+    """
+    Whole-name similarity, or the best single name part ("joan" vs "Akello Joan").
+    """
+    parts = name.split()
+    return max([_similarity(query, name)] + [_similarity(query, p) for p in parts])
+
+
+def search_by_name(
+    db: Session,
+    q: str,
+    village: str | None = None,
+    facility_id: int | None = None,
+    limit: int = 20,
+) -> list[tuple[Patient, float]]:
+    """
+    Fuzzy name search, scoped by optional village and facility.
+
+    FTS5 trigram OR-query pulls a bounded, bm25-ranked candidate set;
+    only those are re-scored with a string similarity in Python. The
+    village (substring of village or parish) and facility filters are
+    applied before the candidate cut, so a common name can't push the
+    in-scope patients out of it.
+    """
+    fts_query = _trigram_query(q)
+    if FTS_AVAILABLE and fts_query:
+        clauses = [f"{FTS_TABLE} MATCH :q"]
+        params: dict = {"limit": CANDIDATE_LIMIT}
+        place = _place_phrase(village) if village else None
+        if place:
+            fts_query = f"{fts_query} AND {place}"
+        elif village:
+            clauses.append("(patients.village LIKE :village OR patients.parish LIKE :village)")
+            params["village"] = f"%{village.strip()}%"
+        if facility_id is not None:
+            clauses.append("patients.facility_id = :facility_id")
+            params["facility_id"] = facility_id
+        params["q"] = fts_query
+        candidate_ids = list(
+            db.execute(
+                text(
+                    f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} "
+                    f"JOIN patients ON patients.id = {FTS_TABLE}.rowid "
+                    f"WHERE {' AND '.join(clauses)} "
+                    f"ORDER BY {FTS_TABLE}.rank LIMIT :limit"
+                ),
+                params,
+            ).scalars()
+        )
+        stmt = select(Patient).where(Patient.id.in_(candidate_ids))
+    else:
+        stmt = select(Patient).where(Patient.name.ilike(f"%{q.strip()}%"))
+        if village:
+            pattern = f"%{village.strip()}%"
+            stmt = stmt.where(Patient.village.ilike(pattern) | Patient.parish.ilike(pattern))
+        if facility_id is not None:
+            stmt = stmt.where(Patient.facility_id == facility_id)
+        stmt = stmt.limit(CANDIDATE_LIMIT)
+
+    scored: list[tuple[Patient, float]] = []
+    for patient in db.execute(stmt).scalars():
+        score = _name_similarity(q, patient.name)
+        if village:
+            score = 0.7 * score + 0.3 * _similarity(village, patient.village)
+        scored.append((patient, round(score, 4)))
+
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.models import Facility, Village
+from app.services.data_versions import REFERENCE, get_version
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+@dataclass(frozen=True)
+class FacilityPoint:
+    id: int
+    name: str
+    level: str
+    district: str | None
+    latitude: float
+    longitude: float
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _village_key(name: str | None) -> str:
+    return " ".join((name or "").lower().split())
+
+
+class ReferralIndex:
+    """
+    Uniform grid over facility coordinates, one grid per level.
+
+    Points are projected to km (equirectangular about the facilities' mean
+    latitude) and bucketed into square cells of cell_km. nearest() scans
+    rings of cells outwards from the query cell, ranking candidates by
+    great-circle distance, and stops once the k-th best is closer than
+    anything the next ring could hold, so a lookup touches a handful of
+    cells regardless of how many facilities there are.
+    """
+
+    def __init__(
+        self,
+        facilities: Iterable[FacilityPoint],
+        villages: Iterable[tuple[str, str | None, float, float]] = (),
+        cell_km: float = 10.0,
+        version: int = 0,
+    ) -> None:
+        self.version = version
+        self.cell_km = cell_km
+        self.facilities = {f.id: f for f in facilities}
+        lats = [f.latitude for f in self.facilities.values()]
+        self._cos = math.cos(math.radians(sum(lats) / len(lats))) if lats else 1.0
+        # Planar km overstate east-west distances polewards of the mean
+        # latitude; scaling the ring bound by this keeps the search exact
+        max_lat = min(89.0, max((abs(lat) for lat in lats), default=0.0) + 1.0)
+        self._slack = 0.99 * min(1.0, math.cos(math.radians(max_lat)) / self._cos)
+
+        # level -> (cell x, cell y) -> facilities
+        self._grids: dict[str, dict[tuple[int, int], list[FacilityPoint]]] = {}
+        # level -> bounding box of occupied cells (x0, x1, y0, y1), facility count
+        self._extent: dict[str, tuple[int, int, int, int]] = {}
+        self._counts: dict[str, int] = {}
+        for f in self.facilities.values():
+            cell = self._cell(*self._project(f.latitude, f.longitude))
+            self._grids.setdefault(f.level, {}).setdefault(cell, []).append(f)
+        for level, grid in self._grids.items():
+            xs = [c[0] for c in grid]
+            ys = [c[1] for c in grid]
+            self._extent[level] = (min(xs), max(xs), min(ys), max(ys))
+            self._counts[level] = sum(len(points) for points in grid.values())
+
+        # normalized village name -> {normalized parish or "": (lat, lon)}
+        self._villages: dict[str, dict[str, tuple[float, float]]] = {}
+        for name, parish, lat, lon in villages:
+            self._villages.setdefault(_village_key(name), {})[_village_key(parish)] = (lat, lon)
+
+    def _project(self, lat: float, lon: float) -> tuple[float, float]:
+        return (
+            math.radians(lon) * EARTH_RADIUS_KM * self._cos,
+            math.radians(lat) * EARTH_RADIUS_KM,
+        )
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return int(math.floor(x / self.cell_km)), int(math.floor(y / self.cell_km))
+
+    @property
+    def levels(self) -> list[str]:
+        return sorted(self._grids)
+
+    def locate_village(self, name: str | None, parish: str | None = None) -> tuple[float, float] | None:
+        """
+        Coordinates of a village: exact (name, parish) match, else the
+        village without a parish, else the only village of that name.
+        """
+        by_parish = self._villages.get(_village_key(name))
+        if not by_parish:
+            return None
+        for key in (_village_key(parish), ""):
+            if key in by_parish:
+                return by_parish[key]
+        if len(by_parish) == 1:
+            return next(iter(by_parish.values()))
+        return None
+
+    def locate(
+        self,
+        village: str | None = None,
+        parish: str | None = None,
+        facility_id: int | None = None,
+    ) -> tuple[float, float, str] | None:
+        """
+        Best known position of a patient: her village, else her registered
+        facility. Returns (latitude, longitude, "village" | "facility").
+        """
+        position = self.locate_village(village, parish)
+        if position is not None:
+            return position[0], position[1], "village"
+        facility = self.facilities.get(facility_id) if facility_id is not None else None
+        if facility is not None:
+            return facility.latitude, facility.longitude, "facility"
+        return None
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 3,
+        level: str | None = None,
+        exclude: int | None = None,
+    ) -> list[tuple[FacilityPoint, float]]:
+        """
+        The k nearest facilities (of level, or any level) as
+        (facility, distance_km), closest first.
+        """
+        levels = [lvl for lvl in ([level] if level else self._grids) if lvl in self._grids]
+        excluded = self.facilities.get(exclude) if exclude is not None else None
+        want = min(
+            k,
+            sum(self._counts[lvl] for lvl in levels)
+            - (excluded is not None and excluded.level in levels),
+        )
+        if want <= 0:
+            return []
+        grids = [self._grids[lvl] for lvl in levels]
+        qx, qy = self._project(latitude, longitude)
+        cx, cy = self._cell(qx, qy)
+
+        # Rings before the searched grids' bounding box are empty; rings past
+        # it hold nothing new
+        x0 = min(self._extent[lvl][0] for lvl in levels)
+        x1 = max(self._extent[lvl][1] for lvl in levels)
+        y0 = min(self._extent[lvl][2] for lvl in levels)
+        y1 = max(self._extent[lvl][3] for lvl in levels)
+        first_ring = max(0, x0 - cx, cx - x1, y0 - cy, cy - y1)
+        last_ring = max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+
+        # max-heap of the best want: (-distance km, id, facility)
+        best: list[tuple[float, int, FacilityPoint]] = []
+        for ring in range(first_ring, last_ring + 1):
+            for cell in _ring_cells(cx, cy, ring):
+                for grid in grids:
+                    for f in grid.get(cell, ()):
+                        if f.id == exclude:
+                            continue
+                        d = haversine_km(latitude, longitude, f.latitude, f.longitude)
+                        if len(best) < want:
+                            heapq.heappush(best, (-d, -f.id, f))
+                        elif (d, f.id) < (-best[0][0], -best[0][1]):
+                            heapq.heapreplace(best, (-d, -f.id, f))
+            # Cells beyond this ring are at least ring * cell_km away (planar)
+            if len(best) == want and -best[0][0] <= ring * self.cell_km * self._slack:
+                break
+
+        return sorted(((f, -d) for d, _, f in best), key=lambda item: (item[1], item[0].id))
+
+
+def _ring_cells(cx: int, cy: int, ring: int) -> Iterable[tuple[int, int]]:
+    if ring == 0:
+        yield cx, cy
+        return
+    for dx in range(-ring, ring + 1):
+        yield cx + dx, cy - ring
+        yield cx + dx, cy + ring
+    for dy in range(-ring + 1, ring):
+        yield cx - ring, cy + dy
+        yield cx + ring, cy + dy
+
+
+def build_referral_index(db: Session) -> ReferralIndex:
+    version, _ = get_version(db, REFERENCE)
+    facilities = [
+        FacilityPoint(*row)
+        for row in db.execute(
+            select(
+                Facility.id,
+                Facility.name,
+                Facility.level,
+                Facility.district,
+                Facility.latitude,
+                Facility.longitude,
+            ).where(Facility.latitude.is_not(None), Facility.longitude.is_not(None))
+        ).all()
+    ]
+    villages = db.execute(
+        select(Village.name, Village.parish, Village.latitude, Village.longitude)
+    ).all()
+    return ReferralIndex(
+        facilities,
+        [tuple(v) for v in villages],
+        cell_km=settings.REFERRAL_GRID_KM,
+        version=version,
+    )
+
+
+# --- process-wide index, rebuilt when the reference data version changes ---
+_lock = threading.Lock()
+_index: ReferralIndex | None = None
+_checked_at = 0.0
+
+
+def get_referral_index(db: Session) -> ReferralIndex:
+    """
+    The current index. The reference version is re-read at most every
+    REFERRAL_REFRESH_SECONDS, so facility / village edits (which bump it)
+    reach every worker without a query per lookup.
+    """
+    global _index, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < settings.REFERRAL_REFRESH_SECONDS:
+        return _index
+    with _lock:
+        if _index is None or now - _checked_at >= settings.REFERRAL_REFRESH_SECONDS:
+            version, _ = get_version(db, REFERENCE)
+            if _index is None or _index.version != version:
+                _index = build_referral_index(db)
+            _checked_at = now
+        return _index
+
+
+def current_referral_index() -> ReferralIndex | None:
+    """
+    The last built index without touching the database (None before
+    startup built it), for callers that have no session, e.g. tools.
+    """
+    return _index
+
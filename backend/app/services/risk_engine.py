@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.write_lane import run_write
+
+from app.core.models import (
+    CheckIn,
+    CheckInObservationTag,
+    Patient,
+    PatientRisk,
+    utcnow,
+)
+
+# Only danger signs from recent, still-open check-ins count towards risk
+DANGER_SIGN_WINDOW_DAYS = 14
+
+# Additive weights; the final score is clipped to [0, 1]
+W_MISSED_ANC = 0.12
+MAX_MISSED_ANC = 3
+W_THIRD_TRIMESTER = 0.10  # >= 28 weeks
+W_TERM = 0.05  # extra on top of third trimester, >= 37 weeks
+W_PRIOR_MALARIA = 0.15
+W_HIGH_BURDEN = 0.10
+W_DANGER_SIGN = 0.25
+MAX_DANGER_SIGNS = 2
+
+TIER_HIGH = 0.6
+TIER_MEDIUM = 0.3
+
+
+def score_cohort(
+    missed_anc: np.ndarray,
+    gestational_age_weeks: np.ndarray,
+    prior_malaria: np.ndarray,
+    high_burden_zone: np.ndarray,
+    danger_signs: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized risk score for a whole cohort (one element per patient).
+    """
+    score = (
+        W_MISSED_ANC * np.minimum(missed_anc, MAX_MISSED_ANC)
+        + W_THIRD_TRIMESTER * (gestational_age_weeks >= 28)
+        + W_TERM * (gestational_age_weeks >= 37)
+        + W_PRIOR_MALARIA * prior_malaria
+        + W_HIGH_BURDEN * high_burden_zone
+        + W_DANGER_SIGN * np.minimum(danger_signs, MAX_DANGER_SIGNS)
+    )
+    return np.clip(score, 0.0, 1.0)
+
+
+def tiers_for(scores: np.ndarray) -> np.ndarray:
+    return np.where(
+        scores >= TIER_HIGH, "high", np.where(scores >= TIER_MEDIUM, "medium", "low")
+    )
+
+
+def _compute_rows(db: Session, patient_ids: list[int] | None) -> list[dict]:
+    """
+    Load inputs for active patients (all, or the given ids) in two queries
+    and score them in a single vectorized pass.
+    """
+    stmt = select(
+        Patient.id,
+        Patient.facility_id,
+        Patient.missed_anc_count,
+        Patient.gestational_age_weeks,
+        Patient.prior_malaria,
+        Patient.high_burden_zone,
+    ).where(Patient.status == "active")
+    if patient_ids is not None:
+        stmt = stmt.where(Patient.id.in_(patient_ids))
+    rows = db.execute(stmt).all()
+    if not rows:
+        return []
+
+    since = utcnow() - timedelta(days=DANGER_SIGN_WINDOW_DAYS)
+    signs_stmt = (
+        select(
+            CheckIn.patient_id,
+            func.count(func.distinct(CheckInObservationTag.value)),
+            func.min(CheckIn.created_at),
+        )
+        .join(CheckInObservationTag, CheckInObservationTag.checkin_id == CheckIn.id)
+        .where(CheckInObservationTag.kind == "danger_sign")
+        .where(CheckIn.status == "open")
+        .where(CheckIn.created_at >= since)
+        .group_by(CheckIn.patient_id)
+    )
+    if patient_ids is not None:
+        signs_stmt = signs_stmt.where(CheckIn.patient_id.in_(patient_ids))
+    sign_counts: dict[int, int] = {}
+    valid_until: dict[int, datetime] = {}
+    for patient_id, count, oldest in db.execute(signs_stmt).all():
+        sign_counts[patient_id] = count
+        valid_until[patient_id] = oldest + timedelta(days=DANGER_SIGN_WINDOW_DAYS)
+
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    cols = np.array([r[2:] for r in rows], dtype=np.float64)
+    danger = np.fromiter(
+        (sign_counts.get(int(i), 0) for i in ids), dtype=np.float64, count=len(rows)
+    )
+
+    scores = score_cohort(cols[:, 0], cols[:, 1], cols[:, 2], cols[:, 3], danger)
+    tiers = tiers_for(scores)
+    now = utcnow()
+
+    return [
+        {
+            "patient_id": int(ids[i]),
+            "facility_id": rows[i][1],
+            "score": round(float(scores[i]), 4),
+            "tier": str(tiers[i]),
+            "danger_sign_count": int(danger[i]),
+            "computed_at": now,
+            "valid_until": valid_until.get(int(ids[i])),
+        }
+        for i in range(len(rows))
+    ]
+
+
+def rebuild_risk_table(db: Session) -> int:
+    """
+    Recompute patient_risk for the whole active cohort. Commits.
+    """
+    rows = _compute_rows(db, None)
+    db.execute(delete(PatientRisk))
+    if rows:
+        db.execute(insert(PatientRisk), rows)
+    db.commit()
+    return len(rows)
+
+
+def refresh_patient_risk(db: Session, patient_ids: Iterable[int]) -> None:
+    """
+    Incrementally rescore the given patients.
+
+    Does not commit: called from write paths (update_patient,
+    create_checkin) so the score lands in the same transaction.
+    Patients that are no longer active drop out of the table.
+    """
+    ids = sorted(set(patient_ids))
+    if not ids:
+        return
+
+    # Make pending check-in / observation rows visible to the scoring queries
+    db.flush()
+
+    rows = _compute_rows(db, ids)
+    db.execute(delete(PatientRisk).where(PatientRisk.patient_id.in_(ids)))
+    if rows:
+        db.execute(insert(PatientRisk), rows)
+
+
+def refresh_expired_risk(db: Session, facility_id: int | None = None) -> int:
+    """
+    Rescore patients whose counted danger signs have aged out of the window.
+
+    Does not commit. Without this a mother with no new writes would keep
+    her danger-sign score indefinitely.
+    """
+    stmt = select(PatientRisk.patient_id).where(PatientRisk.valid_until <= utcnow())
+    if facility_id is not None:
+        stmt = stmt.where(PatientRisk.facility_id == facility_id)
+    ids = list(db.execute(stmt).scalars())
+    refresh_patient_risk(db, ids)
+    return len(ids)
+
+
+def ensure_risk_table(db: Session) -> None:
+    """
+    Build the table on first start (or after it was dropped); otherwise
+    rescore rows that went stale while the server was down.
+    """
+    has_rows = db.execute(select(PatientRisk.patient_id).limit(1)).first()
+    has_patients = db.execute(select(Patient.id).limit(1)).first()
+    # Rows scored before valid_until existed can't tell when they expire
+    legacy = db.execute(
+        select(PatientRisk.patient_id)
+        .where(PatientRisk.danger_sign_count > 0)
+        .where(PatientRisk.valid_until.is_(None))
+        .limit(1)
+    ).first()
+    if has_patients and (not has_rows or legacy):
+        rebuild_risk_table(db)
+    elif refresh_expired_risk(db):
+        db.commit()
+
+
+def top_at_risk(db: Session, facility_id: int, top: int) -> list[tuple[PatientRisk, Patient]]:
+    """
+    Highest-risk patients of a facility, served from the materialized table.
+
+    Rows past valid_until are rescored first so the ranking never carries
+    danger signs that have left the window.
+    """
+    expired = db.execute(
+        select(PatientRisk.patient_id)
+        .where(PatientRisk.facility_id == facility_id)
+        .where(PatientRisk.valid_until <= utcnow())
+        .limit(1)
+    ).first()
+    if expired:
+        run_write(db, lambda wdb: refresh_expired_risk(wdb, facility_id))
+
+    stmt = (
+        select(PatientRisk, Patient)
+        .join(Patient, Patient.id == PatientRisk.patient_id)
+        .where(PatientRisk.facility_id == facility_id)
+        .order_by(PatientRisk.score.desc(), PatientRisk.patient_id)
+        .limit(top)
+    )
+    return [(risk, patient) for risk, patient in db.execute(stmt).all()]
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.agents.tools import execute_tool
+from app.core.config import settings
+from app.core.db import SessionLocal, engine_key
+from app.core.models import CheckIn, Facility, Patient, ScheduledTask, utcnow
+from app.core.write_lane import run_write
+from app.services.sms_templates import Rendered, TemplateError, render_sms
+
+logger = logging.getLogger(__name__)
+
+# Retry backoff after a failed fire: attempts * this
+RETRY_BACKOFF = timedelta(minutes=5)
+
+# Tools whose message text is rendered per batch before firing
+SMS_TOOLS = {"send_advice_sms"}
+
+# Internal task: plan a check-in the agent queue had no room for
+AGENT_RUN_TASK = "run_agent"
+
+
+def schedule_task(
+    db: Session,
+    tool_name: str,
+    patient_id: int,
+    due_at: datetime,
+    checkin_id: str | None = None,
+    payload: dict[str, Any] | None = None,
+) -> int:
+    """
+    Persist a timed action. Does not commit.
+
+    Call notify_scheduled() once the transaction has committed so a
+    near-term task fires without waiting for the next refresh.
+    """
+    return db.execute(
+        insert(ScheduledTask)
+        .values(
+            tool_name=tool_name,
+            patient_id=patient_id,
+            checkin_id=checkin_id,
+            payload_json=json.dumps(payload) if payload is not None else None,
+            due_at=due_at,
+            status="pending",
+            attempts=0,
+            created_at=utcnow(),
+        )
+        .returning(ScheduledTask.id)
+    ).scalar_one()
+
+
+def notify_scheduled(db: Session, task_id: int, due_at: datetime) -> None:
+    """
+    Nudge this process's scheduler for db's database about a committed task.
+
+    Only after commit: a task popped before its row is visible would fail
+    the lease and drop out of the heap, and a rolled-back one would linger.
+    Other workers find it on their next scan.
+    """
+    scheduler = _schedulers.get(engine_key(db.get_bind())) if _schedulers else None
+    if scheduler is not None:
+        scheduler.notify(task_id, due_at)
+
+
+def cancel_task(db: Session, task_id: int) -> bool:
+    """
+    Cancel a task that hasn't fired yet. Does not commit.
+    """
+    result = db.execute(
+        update(ScheduledTask)
+        .where(ScheduledTask.id == task_id)
+        .where(ScheduledTask.status == "pending")
+        .values(status="cancelled")
+    )
+    return result.rowcount > 0
+
+
+def _default_executor(task: ScheduledTask, patient: dict, checkin: dict) -> None:
+    if task.tool_name == AGENT_RUN_TASK:
+        # Imported here so the scheduler doesn't load the agent stack up front
+        from app.services.agent_service import run_agent_once
+
+        run_agent_once(task.checkin_id)
+        return
+    execute_tool(task.tool_name, patient, checkin)
+
+
+class FollowUpScheduler:
+    """
+    In-memory min-heap over the persisted scheduled_tasks table.
+
+    Only tasks due within SCHEDULER_HORIZON_SECONDS are held in memory, so
+    hundreds of thousands of far-future follow-ups cost nothing until they
+    approach. Due tasks are leased in one UPDATE per batch; a worker that
+    dies mid-batch lets its leases expire and another worker re-fires them.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        executor: Callable[[ScheduledTask, dict, dict], None] = _default_executor,
+        owner: str | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.executor = executor
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+
+        self.horizon = timedelta(seconds=settings.SCHEDULER_HORIZON_SECONDS)
+        self.refresh_every = timedelta(seconds=settings.SCHEDULER_REFRESH_SECONDS)
+        self.lease = timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS)
+        self.batch_size = settings.SCHEDULER_BATCH_SIZE
+
+        self._heap: list[tuple[datetime, int]] = []
+        self._queued: set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._next_refresh = datetime.min
+
+    # --- lifecycle ---
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._loop, name="followup-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self, task_id: int, due_at: datetime) -> None:
+        if due_at > utcnow() + self.horizon:
+            return
+        with self._lock:
+            if task_id not in self._queued:
+                heapq.heappush(self._heap, (due_at, task_id))
+                self._queued.add(task_id)
+        self._wake.set()
+
+    # --- loop ---
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                now = utcnow()
+                if now >= self._next_refresh:
+                    self.refresh()
+                    self._next_refresh = now + self.refresh_every
+                self.fire_due()
+            except Exception:
+                logger.exception("Scheduler iteration failed")
+
+            self._wake.wait(timeout=self._seconds_until_next())
+            self._wake.clear()
+
+    def _seconds_until_next(self) -> float:
+        now = utcnow()
+        wait = (self._next_refresh - now).total_seconds()
+        with self._lock:
+            if self._heap:
+                wait = min(wait, (self._heap[0][0] - now).total_seconds())
+        return max(0.0, wait)
+
+    def refresh(self) -> int:
+        """
+        Load tasks due within the horizon (and expired leases) into the heap.
+        """
+        now = utcnow()
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(ScheduledTask.id, ScheduledTask.due_at)
+                .where(
+                    or_(
+                        and_(
+                            ScheduledTask.status == "pending",
+                            ScheduledTask.due_at <= now + self.horizon,
+                        ),
+                        and_(
+                            ScheduledTask.status == "leased",
+                            ScheduledTask.lease_expires_at < now,
+                        ),
+                    )
+                )
+                .order_by(ScheduledTask.due_at)
+                .limit(self.batch_size * 50)
+            ).all()
+        finally:
+            db.close()
+
+        added = 0
+        with self._lock:
+            for task_id, due_at in rows:
+                if task_id not in self._queued:
+                    heapq.heappush(self._heap, (due_at, task_id))
+                    self._queued.add(task_id)
+                    added += 1
+        return added
+
+    def _pop_due(self) -> list[int]:
+        now = utcnow()
+        due: list[int] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                _, task_id = heapq.heappop(self._heap)
+                self._queued.discard(task_id)
+                due.append(task_id)
+        return due
+
+    def fire_due(self) -> int:
+        """
+        Lease and execute everything currently due, batch by batch.
+        """
+        fired = 0
+        while True:
+            ids = self._pop_due()
+            if not ids:
+                return fired
+            fired += self._fire_batch(ids)
+
+    def _fire_batch(self, ids: list[int]) -> int:
+        now = utcnow()
+        db = self.session_factory()
+        try:
+            # Claim: only pending tasks or leases that have expired
+            claim = (
+                update(ScheduledTask)
+                .where(ScheduledTask.id.in_(ids))
+                .where(ScheduledTask.due_at <= now)
+                .where(
+                    or_(
+                        ScheduledTask.status == "pending",
+                        and_(
+                            ScheduledTask.status == "leased",
+                            ScheduledTask.lease_expires_at < now,
+                        ),
+                    )
+                )
+                .values(
+                    status="leased",
+                    lease_owner=self.owner,
+                    lease_expires_at=now + self.lease,
+                    attempts=ScheduledTask.attempts + 1,
+                )
+            )
+
+            def lease(wdb: Session) -> None:
+                wdb.execute(claim)
+
+            run_write(db, lease)
+
+            tasks = (
+                db.execute(
+                    select(ScheduledTask)
+                    .where(ScheduledTask.id.in_(ids))
+                    .where(ScheduledTask.status == "leased")
+                    .where(ScheduledTask.lease_owner == self.owner)
+                )
+                .scalars()
+                .all()
+            )
+            if not tasks:
+                return 0
+
+            patients = {
+                p.id: p
+                for p in db.execute(
+                    select(Patient).where(Patient.id.in_({t.patient_id for t in tasks}))
+                ).scalars()
+            }
+            checkin_ids = {t.checkin_id for t in tasks if t.checkin_id}
+            checkins = (
+                {
+                    c.id: c
+                    for c in db.execute(
+                        select(CheckIn).where(CheckIn.id.in_(checkin_ids))
+                    ).scalars()
+                }
+                if checkin_ids
+                else {}
+            )
+
+            messages = _render_messages(db, tasks, patients)
+
+            done: list[int] = []
+            failed: list[tuple[int, dict[str, Any]]] = []
+            for task in tasks:
+                patient = patients.get(task.patient_id)
+                checkin = checkins.get(task.checkin_id) if task.checkin_id else None
+                try:
+                    self.executor(
+                        task,
+                        _patient_context(patient, task.patient_id),
+                        _checkin_context(checkin, task, messages.get(task.id)),
+                    )
+                    done.append(task.id)
+                except Exception as e:
+                    logger.exception("Scheduled task %s failed", task.id)
+                    failed.append((task.id, _failure_values(task, str(e))))
+
+            if done or failed:
+                run_write(db, lambda wdb: self._record_outcomes(wdb, done, failed))
+            return len(done)
+        finally:
+            db.close()
+
+    def _record_outcomes(
+        self, db: Session, done: list[int], failed: list[tuple[int, dict[str, Any]]]
+    ) -> None:
+        if done:
+            db.execute(
+                update(ScheduledTask)
+                .where(ScheduledTask.id.in_(done))
+                .where(ScheduledTask.lease_owner == self.owner)
+                .values(status="done", fired_at=utcnow(), lease_expires_at=None)
+            )
+        for task_id, values in failed:
+            db.execute(update(ScheduledTask).where(ScheduledTask.id == task_id).values(**values))
+
+
+def _failure_values(task: ScheduledTask, error: str) -> dict[str, Any]:
+    """
+    Release a failed lease: retry with backoff, or give up after max attempts.
+    """
+    if task.attempts >= settings.SCHEDULER_MAX_ATTEMPTS:
+        values: dict[str, Any] = {"status": "failed"}
+    else:
+        retry_at = utcnow() + RETRY_BACKOFF * task.attempts
+        values = {"status": "pending", "due_at": retry_at}
+    return {"lease_owner": None, "lease_expires_at": None, "last_error": error[:500], **values}
+
+
+def _patient_context(patient: Patient | None, patient_id: int) -> dict[str, Any]:
+    if patient is None:
+        return {"id": patient_id, "name": None}
+    return {
+        "id": patient.id,
+        "name": patient.name,
+        "phone": patient.phone,
+        "village": patient.village,
+        "parish": patient.parish,
+        "facility_id": patient.facility_id,
+        "preferred_language": patient.preferred_language,
+        "consent_sms": patient.consent_sms,
+    }
+
+
+def _template_kind(task: ScheduledTask) -> str:
+    payload = json.loads(task.payload_json) if task.payload_json else {}
+    if payload.get("template"):
+        return str(payload["template"])
+    return "followup" if payload.get("reason") == "followup" else "advice"
+
+
+def _render_messages(
+    db: Session, tasks: list[ScheduledTask], patients: dict[int, Patient]
+) -> dict[int, Rendered]:
+    """
+    SMS text for the batch's messaging tasks, rendered one template batch
+    at a time (grouped by template and language) instead of per send.
+    """
+    sms_tasks = [t for t in tasks if t.tool_name in SMS_TOOLS and t.patient_id in patients]
+    if not sms_tasks:
+        return {}
+    facility_ids = {patients[t.patient_id].facility_id for t in sms_tasks}
+    facilities = dict(
+        db.execute(select(Facility.id, Facility.name).where(Facility.id.in_(facility_ids))).all()
+    )
+
+    by_kind: dict[str, list[ScheduledTask]] = {}
+    for task in sms_tasks:
+        by_kind.setdefault(_template_kind(task), []).append(task)
+
+    messages: dict[int, Rendered] = {}
+    for kind, kind_tasks in by_kind.items():
+        rows = []
+        for task in kind_tasks:
+            patient = patients[task.patient_id]
+            rows.append(
+                {
+                    "name": patient.name,
+                    "village": patient.village,
+                    "facility": facilities.get(patient.facility_id),
+                    "preferred_language": patient.preferred_language,
+                }
+            )
+        try:
+            rendered = render_sms(kind, rows)
+        except TemplateError:
+            logger.exception("Rendering '%s' SMS failed", kind)
+            continue
+        messages.update(zip((t.id for t in kind_tasks), rendered))
+    return messages
+
+
+def _checkin_context(
+    checkin: CheckIn | None, task: ScheduledTask, message: Rendered | None = None
+) -> dict[str, Any]:
+    context: dict[str, Any] = {
+        "payload": json.loads(task.payload_json) if task.payload_json else None
+    }
+    if message is not None:
+        context["message"] = {
+            "text": message.text,
+            "language": message.language,
+            "segments": message.segments,
+            "encoding": message.encoding,
+        }
+    if checkin is not None:
+        context.update(
+            {
+                "id": checkin.id,
+                "source": checkin.source,
+                "status": checkin.status,
+                "initial_complaint": checkin.initial_complaint,
+            }
+        )
+    return context
+
+
+# Process-wide instances, one per database (started from app startup when enabled)
+_schedulers: dict[str, FollowUpScheduler] = {}
+
+
+def start_scheduler(session_factory: sessionmaker = SessionLocal) -> FollowUpScheduler:
+    key = engine_key(session_factory.kw["bind"])
+    if key not in _schedulers:
+        scheduler = FollowUpScheduler(session_factory)
+        scheduler.start()
+        _schedulers[key] = scheduler
+    return _schedulers[key]
+
+
+def stop_scheduler() -> None:
+    while _schedulers:
+        _, scheduler = _schedulers.popitem()
+        scheduler.stop()
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import uuid
+from typing import Sequence
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.core.events import CHECKIN_CREATED, publish
+from app.core.models import CheckIn, InboundMessage, Patient, PatientPhone, utcnow
+from app.core.schemas import InboundMessageIn
+from app.core.shards import Shard, shards
+from app.core.write_lane import run_write
+from app.services.change_log import record_checkins
+from app.services.dashboard_stats import record_checkin_opened
+from app.services.patient_search import normalize_phone
+from app.services.risk_engine import refresh_patient_risk
+
+
+def _resolve_senders(db: Session, phones: set[str]) -> dict[str, Patient]:
+    """
+    E.164 sender -> patient, in one indexed query.
+
+    If a number is shared (e.g. a husband's phone registered for two
+    mothers) the most recently updated active patient wins.
+    """
+    if not phones:
+        return {}
+    rows = db.execute(
+        select(PatientPhone.phone_e164, Patient)
+        .join(Patient, Patient.id == PatientPhone.patient_id)
+        .where(PatientPhone.phone_e164.in_(phones))
+        .order_by(
+            PatientPhone.phone_e164,
+            (Patient.status == "active").desc(),
+            Patient.updated_at.desc(),
+        )
+    ).all()
+    resolved: dict[str, Patient] = {}
+    for phone, patient in rows:
+        resolved.setdefault(phone, patient)
+    return resolved
+
+
+def split_by_shard(messages: Sequence[InboundMessageIn]) -> list[tuple[Shard, list[int]]]:
+    """
+    Group a batch (as message positions) by the shard of each sender's
+    patient, resolving senders on every shard at once. Unmatched senders
+    go to the default shard, which records them as unmatched.
+    """
+    if not shards.enabled:
+        return [(shards.default, list(range(len(messages))))]
+
+    phones = {p for p in (normalize_phone(m.sender) for m in messages) if p}
+    best: dict[str, tuple[tuple, Shard]] = {}
+    for shard, resolved in zip(
+        shards.all(), shards.scatter(lambda db: _resolve_senders(db, phones))
+    ):
+        for phone, patient in resolved.items():
+            # Same rule as _resolve_senders, across shards
+            rank = (patient.status == "active", patient.updated_at)
+            if phone not in best or rank > best[phone][0]:
+                best[phone] = (rank, shard)
+
+    groups: dict[str, tuple[Shard, list[int]]] = {}
+    for i, msg in enumerate(messages):
+        e164 = normalize_phone(msg.sender)
+        shard = best[e164][1] if e164 in best else shards.default
+        groups.setdefault(shard.name, (shard, []))[1].append(i)
+    return list(groups.values())
+
+
+def ingest_batch(
+    db: Session, messages: Sequence[InboundMessageIn]
+) -> tuple[dict, list[str]]:
+    """
+    Dedupe, resolve and bulk-insert a batch of inbound messages.
+
+    Returns (summary, created_checkin_ids). The batch is written as one
+    job on the write lane; a duplicate that races in between raises
+    IntegrityError to the caller.
+    """
+    # Dedupe within the batch (gateway retransmits can arrive together)
+    unique: dict[str, InboundMessageIn] = {}
+    for msg in messages:
+        unique.setdefault(msg.gateway_message_id, msg)
+
+    seen = set(
+        db.execute(
+            select(InboundMessage.gateway_message_id).where(
+                InboundMessage.gateway_message_id.in_(unique)
+            )
+        ).scalars()
+    )
+
+    fresh = [m for mid, m in unique.items() if mid not in seen]
+    senders = {m.gateway_message_id: normalize_phone(m.sender) for m in fresh}
+    patients = _resolve_senders(db, {p for p in senders.values() if p})
+
+    now = utcnow()
+    inbound_rows: list[dict] = []
+    checkin_rows: list[dict] = []
+    results: dict[str, dict] = {}
+
+    for msg in fresh:
+        e164 = senders[msg.gateway_message_id]
+        patient = patients.get(e164) if e164 else None
+        checkin_id = str(uuid.uuid4()) if patient else None
+
+        if patient is not None:
+            checkin_rows.append(
+                {
+                    "id": checkin_id,
+                    "patient_id": patient.id,
+                    "facility_id": patient.facility_id,
+                    "status": "open",
+                    "source": msg.channel,
+                    "initial_complaint": (msg.text or "")[:500] or None,
+                    "recorded_by": "gateway",
+                    "created_at": msg.received_at or now,
+                }
+            )
+
+        inbound_rows.append(
+            {
+                "gateway_message_id": msg.gateway_message_id,
+                "channel": msg.channel,
+                "sender": msg.sender,
+                "sender_e164": e164,
+                "text": msg.text,
+                "status": "checkin_created" if patient else "unmatched",
+                "patient_id": patient.id if patient else None,
+                "checkin_id": checkin_id,
+                "received_at": msg.received_at or now,
+                "created_at": now,
+            }
+        )
+        results[msg.gateway_message_id] = {
+            "gateway_message_id": msg.gateway_message_id,
+            "status": "checkin_created" if patient else "unmatched",
+            "patient_id": patient.id if patient else None,
+            "checkin_id": checkin_id,
+        }
+
+    vht_by_patient = {p.id: p.vht_id for p in patients.values()}
+
+    def write(wdb: Session) -> None:
+        if checkin_rows:
+            wdb.execute(insert(CheckIn), checkin_rows)
+        if inbound_rows:
+            wdb.execute(insert(InboundMessage), inbound_rows)
+
+        # Derived tables, same transaction as the check-ins
+        for row in checkin_rows:
+            record_checkin_opened(wdb, row["facility_id"], vht_by_patient[row["patient_id"]])
+        refresh_patient_risk(wdb, [row["patient_id"] for row in checkin_rows])
+        record_checkins(
+            wdb,
+            [
+                (row["id"], row["facility_id"], vht_by_patient[row["patient_id"]])
+                for row in checkin_rows
+            ],
+        )
+
+    run_write(db, write)
+
+    for row in checkin_rows:
+        publish(
+            row["facility_id"],
+            CHECKIN_CREATED,
+            {
+                "id": row["id"],
+                "patient_id": row["patient_id"],
+                "facility_id": row["facility_id"],
+                "source": row["source"],
+                "status": row["status"],
+                "created_at": row["created_at"].isoformat(),
+                "vht_id": vht_by_patient[row["patient_id"]],
+                "initial_complaint": row["initial_complaint"],
+            },
+        )
+
+    ordered: list[dict] = []
+    for msg in messages:
+        mid = msg.gateway_message_id
+        if mid in results:
+            ordered.append(results.pop(mid))
+        else:
+            # retransmit: already stored earlier or repeated within this batch
+            ordered.append({"gateway_message_id": mid, "status": "duplicate"})
+
+    summary = {
+        "received": len(messages),
+        "created": len(checkin_rows),
+        "duplicates": sum(1 for r in ordered if r["status"] == "duplicate"),
+        "unmatched": sum(1 for r in ordered if r["status"] == "unmatched"),
+        "results": ordered,
+    }
+    return summary, [row["id"] for row in checkin_rows]
@@ -0,0 +1,365 @@
+"""
+Outbound SMS templates: one JSON file per language in SMS_TEMPLATE_DIR,
+
+    {"language": "lg", "names": ["luganda"],
+     "templates": {"advice": {"text": "Gyebale ko {name}, ...", "truncate": ["name"]}}}
+
+compiled once into positional format strings and cached process-wide; the
+directory is re-checked every SMS_TEMPLATE_CHECK_SECONDS and edited files
+are picked up without a restart.
+
+Batches are rendered column-wise: each field is cleaned and measured once
+per distinct value, so per message only the length arithmetic and one
+str.format remain. Every message is held to SMS_MAX_SEGMENTS at render
+time (GSM-7 or UCS-2, whichever the text needs).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import string
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Sequence
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Fields a template may use (missing values render as "")
+FIELDS = {"name", "village", "facility"}
+
+GSM7 = "gsm7"
+UCS2 = "ucs2"
+
+# GSM 03.38 default alphabet; extension characters cost two septets
+_GSM_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+_GSM_EXTENDED = frozenset("^{}\\[~]|€\f")
+_GSM = _GSM_BASIC | _GSM_EXTENDED
+
+# Characters per segment: (single message, each part of a concatenated one)
+_SEGMENT = {GSM7: (160, 153), UCS2: (70, 67)}
+
+# Truncated fields keep at least this many characters
+MIN_FIELD_CHARS = 3
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def sms_units(text: str) -> tuple[int | None, int]:
+    """
+    Length of text in GSM-7 septets (None if it needs UCS-2) and in UCS-2
+    code units.
+    """
+    ucs2 = len(text.encode("utf-16-le")) // 2
+    if not _GSM.issuperset(text):
+        return None, ucs2
+    return len(text) + sum(1 for ch in text if ch in _GSM_EXTENDED), ucs2
+
+
+def segments_for(units: int, encoding: str) -> int:
+    single, part = _SEGMENT[encoding]
+    if units <= single:
+        return 1
+    return -(-units // part)
+
+
+def max_units(encoding: str, max_segments: int) -> int:
+    single, part = _SEGMENT[encoding]
+    return single if max_segments <= 1 else part * max_segments
+
+
+def _to_gsm(value: str) -> str:
+    """
+    Strip accents GSM-7 can't carry ("é" is native and kept), so one name
+    doesn't switch the whole message to UCS-2 and halve its length.
+    """
+    if _GSM.issuperset(value):
+        return value
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(
+        ch for ch in decomposed if ch in _GSM or not unicodedata.combining(ch)
+    )
+
+
+@dataclass(frozen=True)
+class Rendered:
+    text: str
+    language: str
+    segments: int
+    encoding: str
+    truncated: bool
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    language: str
+    kind: str
+    # Positional format string ({0}, {1} ... one per distinct field)
+    fmt: str
+    fields: tuple[str, ...]
+    truncate: tuple[str, ...]
+    literal_gsm: int | None
+    literal_ucs2: int
+    # Occurrences of each field in the text (a repeated field costs twice)
+    counts: tuple[int, ...]
+
+    @classmethod
+    def compile(
+        cls, language: str, kind: str, text: str, truncate: Sequence[str] = ()
+    ) -> "CompiledTemplate":
+        fields: list[str] = []
+        counts: list[int] = []
+        parts: list[str] = []
+        literal = []
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"{language}/{kind}: {e}") from e
+        for text_part, field, spec, conversion in parsed:
+            literal.append(text_part)
+            parts.append(text_part.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field not in FIELDS:
+                raise TemplateError(f"{language}/{kind}: unknown field {{{field}}}")
+            if spec or conversion:
+                raise TemplateError(f"{language}/{kind}: format specs are not supported")
+            if field not in fields:
+                fields.append(field)
+                counts.append(0)
+            index = fields.index(field)
+            counts[index] += 1
+            parts.append(f"{{{index}}}")
+        unknown = set(truncate) - set(fields)
+        if unknown:
+            raise TemplateError(f"{language}/{kind}: truncate lists unused fields {sorted(unknown)}")
+
+        literal_gsm, literal_ucs2 = sms_units("".join(literal))
+        encoding = GSM7 if literal_gsm is not None else UCS2
+        literal_units = literal_gsm if literal_gsm is not None else literal_ucs2
+        if literal_units > max_units(encoding, settings.SMS_MAX_SEGMENTS):
+            raise TemplateError(
+                f"{language}/{kind}: text alone exceeds {settings.SMS_MAX_SEGMENTS} segment(s)"
+            )
+        return cls(
+            language=language,
+            kind=kind,
+            fmt="".join(parts),
+            fields=tuple(fields),
+            truncate=tuple(truncate),
+            literal_gsm=literal_gsm,
+            literal_ucs2=literal_ucs2,
+            counts=tuple(counts),
+        )
+
+    def render_batch(
+        self, rows: Sequence[Mapping[str, Any]], max_segments: int | None = None
+    ) -> list[Rendered]:
+        max_segments = max_segments or settings.SMS_MAX_SEGMENTS
+        gsm_limit = max_units(GSM7, max_segments)
+        ucs2_limit = max_units(UCS2, max_segments)
+
+        # value -> (cleaned, gsm units or None, ucs2 units), once per distinct value
+        measured: dict[Any, tuple[str, int | None, int]] = {}
+
+        def measure(raw: Any) -> tuple[str, int | None, int]:
+            hit = measured.get(raw)
+            if hit is None:
+                value = " ".join(str(raw).split()) if raw is not None else ""
+                if self.literal_gsm is not None:
+                    value = _to_gsm(value)
+                hit = measured[raw] = (value, *sms_units(value))
+            return hit
+
+        columns = [[measure(row.get(field)) for row in rows] for field in self.fields]
+
+        out: list[Rendered] = []
+        for values in zip(*columns) if columns else ((),) * len(rows):
+            gsm: int | None = self.literal_gsm
+            ucs2 = self.literal_ucs2
+            for (_, value_gsm, value_ucs2), count in zip(values, self.counts):
+                ucs2 += value_ucs2 * count
+                if gsm is not None:
+                    gsm = gsm + value_gsm * count if value_gsm is not None else None
+            text = self.fmt.format(*(v[0] for v in values))
+            if gsm is not None and gsm <= gsm_limit:
+                out.append(Rendered(text, self.language, segments_for(gsm, GSM7), GSM7, False))
+            elif gsm is None and ucs2 <= ucs2_limit:
+                out.append(Rendered(text, self.language, segments_for(ucs2, UCS2), UCS2, False))
+            else:
+                out.append(self._shorten([v[0] for v in values], max_segments))
+        return out
+
+    def _shorten(self, values: list[str], max_segments: int) -> Rendered:
+        """
+        Over the limit: trim the truncatable fields (in order, down to
+        MIN_FIELD_CHARS), and as a last resort cut the text itself.
+        """
+        for field in self.truncate:
+            index = self.fields.index(field)
+            while len(values[index]) > MIN_FIELD_CHARS:
+                text = self.fmt.format(*values)
+                encoding, units, limit = self._measure(text, max_segments)
+                if units <= limit:
+                    break
+                over = -(-(units - limit) // self.counts[index])
+                keep = max(MIN_FIELD_CHARS, len(values[index]) - over)
+                values[index] = values[index][:keep].rstrip()
+        text = self.fmt.format(*values)
+        encoding, units, limit = self._measure(text, max_segments)
+        while units > limit:
+            text = text[: len(text) - max(1, (units - limit) // 2)]
+            encoding, units, limit = self._measure(text, max_segments)
+        return Rendered(text, self.language, segments_for(units, encoding), encoding, True)
+
+    @staticmethod
+    def _measure(text: str, max_segments: int) -> tuple[str, int, int]:
+        gsm, ucs2 = sms_units(text)
+        if gsm is not None:
+            return GSM7, gsm, max_units(GSM7, max_segments)
+        return UCS2, ucs2, max_units(UCS2, max_segments)
+
+
+@dataclass(frozen=True)
+class LanguageFile:
+    code: str
+    names: tuple[str, ...]
+    templates: dict[str, CompiledTemplate]
+
+
+class TemplateCatalog:
+    def __init__(self, files: dict[str, LanguageFile], signature: tuple = ()) -> None:
+        self.files = files
+        self.signature = signature
+        self.templates: dict[str, dict[str, CompiledTemplate]] = {}
+        self.aliases: dict[str, str] = {}
+        for language in files.values():
+            self.templates[language.code] = language.templates
+            for alias in (language.code, *language.names):
+                self.aliases[alias.strip().lower()] = language.code
+
+    @property
+    def languages(self) -> list[str]:
+        return sorted(self.templates)
+
+    def resolve(self, language: str | None) -> str:
+        """
+        Catalog language for a patient's preferred_language ("Luganda",
+        "lg", ...), else SMS_DEFAULT_LANGUAGE.
+        """
+        key = (language or "").strip().lower()
+        return self.aliases.get(key, settings.SMS_DEFAULT_LANGUAGE)
+
+    def template(self, kind: str, language: str | None) -> CompiledTemplate:
+        for code in (self.resolve(language), settings.SMS_DEFAULT_LANGUAGE):
+            compiled = self.templates.get(code, {}).get(kind)
+            if compiled is not None:
+                return compiled
+        raise TemplateError(f"No '{kind}' template for {language or 'default'} or the default language")
+
+
+def _signature(directory: Path) -> tuple:
+    try:
+        files = sorted(directory.glob("*.json"))
+    except OSError:
+        return ()
+    signature = []
+    for path in files:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def _load_file(path: Path) -> LanguageFile:
+    spec = json.loads(path.read_text(encoding="utf-8"))
+    code = str(spec.get("language") or path.stem).lower()
+    compiled = {}
+    for kind, entry in spec["templates"].items():
+        if isinstance(entry, str):
+            entry = {"text": entry}
+        compiled[kind] = CompiledTemplate.compile(
+            code, kind, entry["text"], entry.get("truncate", ())
+        )
+    return LanguageFile(code, tuple(str(n) for n in spec.get("names", [])), compiled)
+
+
+def load_catalog(directory: str, previous: TemplateCatalog | None = None) -> TemplateCatalog:
+    """
+    Compile the language files in directory; unchanged files are reused
+    from previous. A file that fails to parse or compile is logged and its
+    last good version kept (or, on first load, left out so its patients
+    get the default language) rather than taking messaging down.
+    """
+    root = Path(directory)
+    signature = _signature(root)
+    old_signature = {entry[0]: entry for entry in previous.signature} if previous else {}
+    files: dict[str, LanguageFile] = {}
+    for entry in signature:
+        name = entry[0]
+        if old_signature.get(name) == entry and name in previous.files:
+            files[name] = previous.files[name]
+            continue
+        try:
+            files[name] = _load_file(root / name)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            logger.exception("Loading SMS templates %s failed", root / name)
+            if previous is not None and name in previous.files:
+                files[name] = previous.files[name]
+    return TemplateCatalog(files, signature)
+
+
+# --- process-wide catalog, recompiled when the directory changes ---
+_lock = threading.Lock()
+_catalog: TemplateCatalog | None = None
+_checked_at = 0.0
+
+
+def get_catalog() -> TemplateCatalog:
+    """
+    The compiled catalog. File metadata is re-read at most every
+    SMS_TEMPLATE_CHECK_SECONDS, so rendering never touches the disk.
+    """
+    global _catalog, _checked_at
+    now = time.monotonic()
+    if _catalog is not None and now - _checked_at < settings.SMS_TEMPLATE_CHECK_SECONDS:
+        return _catalog
+    with _lock:
+        if _catalog is None or now - _checked_at >= settings.SMS_TEMPLATE_CHECK_SECONDS:
+            directory = settings.SMS_TEMPLATE_DIR
+            if _catalog is None or _catalog.signature != _signature(Path(directory)):
+                _catalog = load_catalog(directory, _catalog)
+            _checked_at = now
+        return _catalog
+
+
+def render_sms(kind: str, rows: Iterable[Mapping[str, Any]]) -> list[Rendered]:
+    """
+    Render template kind for each row (fields plus preferred_language), in
+    input order. Rows are grouped by language so each template renders
+    its rows as one batch.
+    """
+    rows = list(rows)
+    catalog = get_catalog()
+    by_template: dict[CompiledTemplate, list[int]] = {}
+    for i, row in enumerate(rows):
+        compiled = catalog.template(kind, row.get("preferred_language"))
+        by_template.setdefault(compiled, []).append(i)
+
+    out: list[Rendered | None] = [None] * len(rows)
+    for compiled, indexes in by_template.items():
+        for i, rendered in zip(indexes, compiled.render_batch([rows[i] for i in indexes])):
+            out[i] = rendered
+    return out  # type: ignore[return-value]
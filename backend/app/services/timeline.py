@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import base64
+import heapq
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Callable
+
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.models import (
+    AgentRun,
+    AgentRunArchive,
+    CheckIn,
+    CheckInArchive,
+    Patient,
+    PatientStatusChange,
+    utcnow,
+)
+from app.services.archive import unpack_row
+
+# Event types; at equal timestamps the higher rank is listed first
+# (newest first), so a run reads above the check-in it planned
+CHECKIN = "checkin"
+CHECKIN_CLOSED = "checkin_closed"
+AGENT_RUN = "agent_run"
+STATUS_CHANGE = "status_change"
+RANK = {CHECKIN: 0, CHECKIN_CLOSED: 1, AGENT_RUN: 2, STATUS_CHANGE: 3}
+EVENT_TYPES = list(RANK)
+
+Cursor = tuple[datetime, str, str]
+# (type, SELECT, timestamp column, id column, id type, row -> event)
+Stream = tuple[str, Select, Any, Any, type, Callable[[Any], dict[str, Any]]]
+
+
+def encode_cursor(at: datetime, kind: str, event_id: Any) -> str:
+    raw = f"{at.isoformat()}|{kind}|{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    Inverse of encode_cursor; raises ValueError on anything malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        at, kind, event_id = raw.split("|", 2)
+        if kind not in RANK:
+            raise ValueError(kind)
+        return datetime.fromisoformat(at), kind, event_id
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def record_status_change(
+    db: Session,
+    patient_id: int,
+    from_status: str | None,
+    to_status: str,
+    reason: str | None = None,
+) -> None:
+    """
+    Log a program status change (from_status None = registration).
+    No-op when the status is unchanged. Does not commit.
+    """
+    if from_status == to_status:
+        return
+    db.add(
+        PatientStatusChange(
+            patient_id=patient_id,
+            from_status=from_status,
+            to_status=to_status,
+            reason=reason,
+            changed_at=utcnow(),
+        )
+    )
+
+
+def ensure_status_history(db: Session) -> None:
+    """
+    Give patients created before status history existed a starting entry:
+    registration for active patients, else their current status as of
+    the last update (the best time known). Commits.
+    """
+    has_rows = db.execute(select(PatientStatusChange.id).limit(1)).first()
+    has_patients = db.execute(select(Patient.id).limit(1)).first()
+    if has_rows or not has_patients:
+        return
+    db.execute(
+        text(
+            "INSERT INTO patient_status_changes "
+            "(patient_id, from_status, to_status, reason, changed_at) "
+            "SELECT id, NULL, status, status_reason, "
+            "CASE WHEN status = 'active' THEN created_at "
+            "ELSE COALESCE(updated_at, created_at) END FROM patients"
+        )
+    )
+    db.commit()
+
+
+# --- streams: each an index-ordered scan of one table, newest first ---
+def _after(at_col, id_col, kind: str, cursor: Cursor | None, id_type: type) -> list:
+    """
+    Keyset condition for one stream: rows that sort after the cursor in
+    the merged (at, rank, id) descending order.
+    """
+    if cursor is None:
+        return []
+    at, cursor_kind, cursor_id = cursor
+    if RANK[kind] < RANK[cursor_kind]:
+        return [at_col <= at]
+    if RANK[kind] > RANK[cursor_kind]:
+        return [at_col < at]
+    return [tuple_(at_col, id_col) < (at, id_type(cursor_id))]
+
+
+def _scan(
+    db: Session,
+    stream: Stream,
+    cursor: Cursor | None,
+    limit: int,
+) -> list[tuple[tuple, dict[str, Any]]]:
+    """
+    Up to limit events of one stream after the cursor, newest first, as
+    ((at, rank, id), event) for the merge.
+    """
+    kind, stmt, at_col, id_col, id_type, to_event = stream
+    stmt = (
+        stmt.where(*_after(at_col, id_col, kind, cursor, id_type))
+        .order_by(at_col.desc(), id_col.desc())
+        .limit(limit)
+    )
+    events = []
+    for row in db.execute(stmt):
+        event = to_event(row)
+        events.append(((event["at"], RANK[kind], row.id), event))
+    return events
+
+
+def _checkin_event(row) -> dict[str, Any]:
+    return {
+        "type": CHECKIN,
+        "at": row.created_at,
+        "id": row.id,
+        "checkin_id": row.id,
+        "data": {
+            "source": row.source,
+            "status": row.status,
+            "initial_complaint": row.initial_complaint,
+            "facility_id": row.facility_id,
+            "archived": False,
+        },
+    }
+
+
+def _archived_checkin_event(row) -> dict[str, Any]:
+    data = unpack_row(row.payload)
+    return {
+        "type": CHECKIN,
+        "at": row.created_at,
+        "id": row.id,
+        "checkin_id": row.id,
+        "data": {
+            "source": data.get("source"),
+            "status": data.get("status"),
+            "initial_complaint": data.get("initial_complaint"),
+            "facility_id": row.facility_id,
+            "archived": True,
+        },
+    }
+
+
+def _closed_event(row) -> dict[str, Any]:
+    return {
+        "type": CHECKIN_CLOSED,
+        "at": row.closed_at,
+        "id": row.id,
+        "checkin_id": row.id,
+        "data": {"facility_id": row.facility_id},
+    }
+
+
+def _run_data(run: dict[str, Any], archived: bool) -> dict[str, Any]:
+    return {
+        "status": run.get("status"),
+        "intent": run.get("intent"),
+        "priority": run.get("priority"),
+        "approved": run.get("approved"),
+        "planner": run.get("planner"),
+        "archived": archived,
+    }
+
+
+def _run_event(row) -> dict[str, Any]:
+    return {
+        "type": AGENT_RUN,
+        "at": row.created_at,
+        "id": str(row.id),
+        "checkin_id": row.checkin_id,
+        "data": _run_data(row._mapping, archived=False),
+    }
+
+
+def _archived_run_event(row) -> dict[str, Any]:
+    return {
+        "type": AGENT_RUN,
+        "at": row.created_at,
+        "id": str(row.id),
+        "checkin_id": row.checkin_id,
+        "data": _run_data(unpack_row(row.payload), archived=True),
+    }
+
+
+def _status_event(row) -> dict[str, Any]:
+    return {
+        "type": STATUS_CHANGE,
+        "at": row.changed_at,
+        "id": str(row.id),
+        "checkin_id": None,
+        "data": {
+            "from_status": row.from_status,
+            "to_status": row.to_status,
+            "reason": row.reason,
+        },
+    }
+
+
+def _streams(patient_id: int) -> list[Stream]:
+    """
+    One stream per source table, each read through a
+    (patient_id, timestamp[, id]) index.
+    """
+    return [
+        (
+            CHECKIN,
+            select(
+                CheckIn.id,
+                CheckIn.created_at,
+                CheckIn.source,
+                CheckIn.status,
+                CheckIn.initial_complaint,
+                CheckIn.facility_id,
+            ).where(CheckIn.patient_id == patient_id),
+            CheckIn.created_at, CheckIn.id, str, _checkin_event,
+        ),
+        (
+            CHECKIN,
+            select(
+                CheckInArchive.id,
+                CheckInArchive.created_at,
+                CheckInArchive.facility_id,
+                CheckInArchive.payload,
+            ).where(CheckInArchive.patient_id == patient_id),
+            CheckInArchive.created_at, CheckInArchive.id, str, _archived_checkin_event,
+        ),
+        (
+            CHECKIN_CLOSED,
+            # closed_at IS NOT NULL matches the partial index
+            select(CheckIn.id, CheckIn.closed_at, CheckIn.facility_id).where(
+                CheckIn.patient_id == patient_id, CheckIn.closed_at.is_not(None)
+            ),
+            CheckIn.closed_at, CheckIn.id, str, _closed_event,
+        ),
+        (
+            CHECKIN_CLOSED,
+            select(
+                CheckInArchive.id, CheckInArchive.closed_at, CheckInArchive.facility_id
+            ).where(
+                CheckInArchive.patient_id == patient_id, CheckInArchive.closed_at.is_not(None)
+            ),
+            CheckInArchive.closed_at, CheckInArchive.id, str, _closed_event,
+        ),
+        (
+            AGENT_RUN,
+            select(
+                AgentRun.id,
+                AgentRun.checkin_id,
+                AgentRun.created_at,
+                AgentRun.status,
+                AgentRun.intent,
+                AgentRun.priority,
+                AgentRun.approved,
+                AgentRun.planner,
+            ).where(AgentRun.patient_id == patient_id),
+            AgentRun.created_at, AgentRun.id, int, _run_event,
+        ),
+        (
+            AGENT_RUN,
+            select(
+                AgentRunArchive.id,
+                AgentRunArchive.checkin_id,
+                AgentRunArchive.created_at,
+                AgentRunArchive.payload,
+            ).where(AgentRunArchive.patient_id == patient_id),
+            AgentRunArchive.created_at, AgentRunArchive.id, int, _archived_run_event,
+        ),
+        (
+            STATUS_CHANGE,
+            select(
+                PatientStatusChange.id,
+                PatientStatusChange.changed_at,
+                PatientStatusChange.from_status,
+                PatientStatusChange.to_status,
+                PatientStatusChange.reason,
+            ).where(PatientStatusChange.patient_id == patient_id),
+            PatientStatusChange.changed_at, PatientStatusChange.id, int, _status_event,
+        ),
+    ]
+
+
+def patient_timeline(
+    db: Session,
+    patient_id: int,
+    cursor: str | None,
+    limit: int,
+    types: set[str] | None = None,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """
+    Newest-first page of a patient's check-ins, check-in closures, agent
+    runs (with their plans) and status changes, hot and archived, and the
+    cursor for the next page.
+
+    Each stream is a keyset range scan of at most limit + 1 rows in index
+    order; heapq.merge interleaves them on (timestamp, type rank, id). A
+    page reads O(streams x limit) rows however long the history is.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    streams = [
+        _scan(db, stream, position, limit + 1)
+        for stream in _streams(patient_id)
+        if types is None or stream[0] in types
+    ]
+    merged = heapq.merge(*streams, key=itemgetter(0), reverse=True)
+    page = [event for _, event in islice(merged, limit + 1)]
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    last = page[-1]
+    return page, encode_cursor(last["at"], last["type"], last["id"])
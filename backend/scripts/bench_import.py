@@ -0,0 +1,163 @@
+"""Cold-start benchmark: time to import the API app, with results kept across commits.
+
+    cd backend
+    python scripts/bench_import.py
+    python scripts/bench_import.py --runs 10 --budget 1.0
+
+Each run imports app.main in a fresh interpreter (what a uvicorn worker or
+reload pays before serving) and reports the median, the slowest top-level
+packages by import time (python -X importtime) and whether the
+agent stack (langgraph, langchain) was loaded eagerly. One JSON line per
+invocation is appended to --results and compared with the previous run
+with the same label. With --budget the exit status is 1 when the median
+exceeds it (for CI).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Modules that should only load on the first agent run
+AGENT_MODULES = ["langgraph", "langchain_core", "langchain_google_genai", "app.agents.graph"]
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|\s*(\S+)")
+
+
+def _run_child(importtime: bool) -> tuple[dict, str]:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", _CHILD % (AGENT_MODULES,)]
+    out = subprocess.run(
+        cmd,
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if out.returncode != 0:
+        raise SystemExit(f"import app.main failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1]), out.stderr
+
+
+def _top_packages(importtime_log: str, limit: int) -> list[tuple[str, float]]:
+    """
+    ms spent importing each top-level package's own modules (self time,
+    so nested imports are charged to the package that owns them).
+    """
+    totals: dict[str, float] = {}
+    for line in importtime_log.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        package = match.group(3).split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _previous_run(path: Path, label: str) -> dict | None:
+    if not path.exists():
+        return None
+    previous = None
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get("label") == label:
+            previous = entry
+    return previous
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Packages listed by import time")
+    parser.add_argument("--budget", type=float, default=None, help="Max median seconds")
+    parser.add_argument(
+        "--results", default=str(BACKEND_DIR / "benchmarks" / "import_time.jsonl")
+    )
+    parser.add_argument("--label", default="default", help="Groups comparable runs")
+    args = parser.parse_args()
+
+    # Warm the OS file cache so the first sample isn't an outlier
+    _run_child(importtime=False)
+    samples = [_run_child(importtime=False)[0] for _ in range(args.runs)]
+    seconds = sorted(s["seconds"] for s in samples)
+    traced, log = _run_child(importtime=True)
+
+    result = {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": _git_commit(),
+        "label": args.label,
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "median_s": statistics.median(seconds),
+        "min_s": seconds[0],
+        "max_s": seconds[-1],
+        "agent_modules_loaded": traced["loaded"],
+        "top_packages_ms": dict(_top_packages(log, args.top)),
+    }
+
+    results_path = Path(args.results)
+    previous = _previous_run(results_path, args.label)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with results_path.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(result) + "\n")
+
+    line = (
+        f"import app.main: median {result['median_s'] * 1000:.0f}ms"
+        f" (min {result['min_s'] * 1000:.0f}ms, max {result['max_s'] * 1000:.0f}ms,"
+        f" {args.runs} runs)"
+    )
+    if previous and previous.get("median_s"):
+        change = (result["median_s"] - previous["median_s"]) / previous["median_s"] * 100
+        line += f"   {change:+.1f}% vs {previous.get('commit') or 'previous'}"
+    print(line)
+    for package, ms in result["top_packages_ms"].items():
+        print(f"  {package:<28} {ms:>8.1f}ms")
+    if result["agent_modules_loaded"]:
+        print(f"agent stack imported eagerly: {', '.join(result['agent_modules_loaded'])}")
+    print(f"\nresults appended to {results_path}")
+
+    if args.budget is not None and result["median_s"] > args.budget:
+        raise SystemExit(
+            f"median {result['median_s']:.3f}s exceeds budget {args.budget:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
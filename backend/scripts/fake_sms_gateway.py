@@ -0,0 +1,123 @@
+"""Local fake SMS/USSD gateway for exercising POST /webhooks/inbound.
+
+    cd backend
+    uvicorn app.main:app --port 8000           # with WEBHOOK_AUTO_PLAN=false for pure ingestion
+    python scripts/fake_sms_gateway.py --messages 20000 --batch 500
+
+Senders are taken from existing patients (GET /patients?fields=phone). A share
+of messages are retransmits (same gateway id) and unknown numbers, and the
+script checks that the server reports them as duplicates / unmatched.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import urllib.request
+import uuid
+
+COMPLAINTS = [
+    "headache and fever",
+    "baby not moving much",
+    "bleeding since morning",
+    "swollen feet",
+    "vomiting",
+    "cough for 3 days",
+]
+
+
+def _request(url: str, method: str = "GET", body: dict | None = None, token: str = "") -> dict:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("X-Gateway-Token", token)
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return json.loads(resp.read())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--retransmit-rate", type=float, default=0.1)
+    parser.add_argument("--unknown-rate", type=float, default=0.05)
+    parser.add_argument("--token", default="")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patients = _request(f"{args.base_url}/patients?fields=phone")
+    phones = [p["phone"] for p in patients if p.get("phone")]
+    if not phones:
+        raise SystemExit("No patients with phones; seed some first.")
+    # Last 9 digits: enough to keep "unknown" senders off registered numbers
+    known = {"".join(filter(str.isdigit, p))[-9:] for p in phones}
+
+    sent_ids: list[str] = []
+    expected_dupes = expected_unknown = 0
+    totals = {"received": 0, "created": 0, "duplicates": 0, "unmatched": 0}
+    latencies: list[float] = []
+
+    started = time.perf_counter()
+    remaining = args.messages
+    while remaining > 0:
+        batch = []
+        for _ in range(min(args.batch, remaining)):
+            retransmit = bool(sent_ids) and rng.random() < args.retransmit_rate
+            if retransmit:
+                mid = rng.choice(sent_ids)
+                expected_dupes += 1
+            else:
+                mid = str(uuid.uuid4())
+                sent_ids.append(mid)
+            if rng.random() < args.unknown_rate:
+                sender = f"+2567{rng.randrange(10**7, 10**8)}"
+                while sender[-9:] in known:
+                    sender = f"+2567{rng.randrange(10**7, 10**8)}"
+                # Retransmits are reported as duplicates, whoever the sender
+                if not retransmit:
+                    expected_unknown += 1
+            else:
+                sender = rng.choice(phones)
+            batch.append(
+                {
+                    "gateway_message_id": mid,
+                    "sender": sender,
+                    "text": rng.choice(COMPLAINTS),
+                    "channel": rng.choice(["sms", "sms", "ussd"]),
+                }
+            )
+        remaining -= len(batch)
+
+        t0 = time.perf_counter()
+        result = _request(
+            f"{args.base_url}/webhooks/inbound", "POST", {"messages": batch}, args.token
+        )
+        latencies.append(time.perf_counter() - t0)
+        for key in totals:
+            totals[key] += result[key]
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(json.dumps(totals, indent=2))
+    print(f"expected duplicates >= {expected_dupes}")
+    print(f"expected unmatched >= {expected_unknown}")
+    print(f"messages/min: {args.messages / elapsed * 60:,.0f}")
+    print(
+        "batch latency p50={:.1f}ms p95={:.1f}ms".format(
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.95) - 1] * 1000 if len(latencies) > 1 else 0,
+        )
+    )
+    if totals["duplicates"] < expected_dupes:
+        raise SystemExit("Dedupe check failed")
+    if totals["unmatched"] < expected_unknown:
+        raise SystemExit("Unmatched-sender check failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Find likely duplicate patient registrations across the whole cohort.
+
+    cd backend
+    python scripts/find_duplicates.py --out ./data/duplicates.jsonl
+    python scripts/find_duplicates.py --min-score 0.85 --max-block 100
+
+Every district shard is scanned in parallel. Only registrations sharing a
+blocking key (phonetic name part + village or parish) or a phone number are
+compared, so the work grows with block sizes rather than with n**2; blocks
+larger than --max-block are skipped and listed. One JSON line per pair
+(best first) is written to --out, or to stdout without it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.shards import shards  # noqa: E402
+from app.services.duplicates import (  # noqa: E402
+    MAX_BLOCK_SIZE,
+    MIN_SCORE,
+    DedupeStats,
+    duplicate_pairs,
+)
+
+
+def _side(profile) -> dict:
+    return {
+        "id": profile.id,
+        "name": profile.name,
+        "village": profile.village,
+        "parish": profile.parish,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=None, help="JSON lines file (default: stdout)")
+    parser.add_argument("--min-score", type=float, default=MIN_SCORE)
+    parser.add_argument("--max-block", type=int, default=MAX_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    def scan(db: Session) -> tuple[list[dict], DedupeStats]:
+        stats = DedupeStats()
+        pairs = [
+            {
+                "score": pair.score,
+                "matched_on": pair.matched,
+                "a": _side(pair.a),
+                "b": _side(pair.b),
+            }
+            for pair in duplicate_pairs(
+                db, min_score=args.min_score, max_block=args.max_block, stats=stats
+            )
+        ]
+        return pairs, stats
+
+    started = time.perf_counter()
+    results = shards.scatter(scan)
+    elapsed = time.perf_counter() - started
+
+    pairs = sorted(
+        (pair for shard_pairs, _ in results for pair in shard_pairs),
+        key=lambda p: (-p["score"], p["a"]["id"], p["b"]["id"]),
+    )
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for pair in pairs:
+            out.write(json.dumps(pair) + "\n")
+    finally:
+        if args.out:
+            out.close()
+
+    for shard, (_, stats) in zip(shards.all(), results):
+        print(
+            f"{shard.name}: {stats.blocks:,} blocks, {stats.pairs_compared:,} pairs compared,"
+            f" {stats.duplicates:,} likely duplicates",
+            file=sys.stderr,
+        )
+        if stats.skipped_blocks:
+            print(
+                f"  skipped {stats.skipped_blocks:,} blocks over {args.max_block}:"
+                f" {', '.join(stats.skipped_keys)}",
+                file=sys.stderr,
+            )
+    print(f"{len(pairs):,} pairs in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
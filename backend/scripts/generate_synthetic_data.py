@@ -0,0 +1,386 @@
+"""Deterministic synthetic data generator for production-scale testing.
+
+    cd backend
+    DATABASE_URL=sqlite:///./data/bench.db python scripts/generate_synthetic_data.py \
+        --facilities 500 --vhts 20000 --patients 500000 --checkins 5000000
+
+The same --seed and --as-of always produce the same rows. Check-ins carry
+realistic observations_json; the observation index, phone/name search index,
+risk table, dashboard counters and sync change log are written or rebuilt so
+the database looks exactly like one grown through the API. Refuses to touch a
+database that already has patients unless --reset is given (drops every table).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import insert, select, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.db import Base, SessionLocal, create_schema, engine  # noqa: E402
+from app.core.models import (  # noqa: E402
+    VHT,
+    CheckIn,
+    CheckInObservation,
+    CheckInObservationTag,
+    Facility,
+    Patient,
+    PatientBlockKey,
+    PatientPhone,
+    Village,
+)
+from app.services import patient_search  # noqa: E402
+from app.services.change_log import rebuild_change_log  # noqa: E402
+from app.services.dashboard_stats import rebuild_dashboard_stats  # noqa: E402
+from app.services.duplicates import block_keys  # noqa: E402
+from app.services.data_versions import REFERENCE, bump_version  # noqa: E402
+from app.services.observation_index import TAG_KEYS, normalize_tag  # noqa: E402
+from app.services.risk_engine import rebuild_risk_table  # noqa: E402
+
+DISTRICTS = [
+    "Kiryandongo", "Wakiso", "Kampala", "Mukono", "Gulu", "Lira", "Mbarara",
+    "Kabale", "Masaka", "Jinja", "Mbale", "Soroti", "Arua", "Hoima", "Kasese",
+    "Moroto", "Kotido", "Napak", "Tororo", "Iganga",
+]
+# Approximate district centres (lat, lon); facilities scatter around them
+DISTRICT_CENTRES = {
+    "Kiryandongo": (1.88, 32.06), "Wakiso": (0.40, 32.48), "Kampala": (0.32, 32.58),
+    "Mukono": (0.35, 32.75), "Gulu": (2.78, 32.30), "Lira": (2.25, 32.90),
+    "Mbarara": (-0.61, 30.65), "Kabale": (-1.25, 29.99), "Masaka": (-0.33, 31.73),
+    "Jinja": (0.44, 33.20), "Mbale": (1.08, 34.18), "Soroti": (1.71, 33.61),
+    "Arua": (3.02, 30.91), "Hoima": (1.43, 31.35), "Kasese": (0.18, 30.08),
+    "Moroto": (2.53, 34.66), "Kotido": (3.01, 34.11), "Napak": (2.25, 34.25),
+    "Tororo": (0.69, 34.18), "Iganga": (0.61, 33.47),
+}
+FIRST_NAMES = [
+    "Akello", "Apio", "Nakato", "Babirye", "Namubiru", "Auma", "Atim", "Nansubuga",
+    "Kemigisa", "Tumusiime", "Nabirye", "Achieng", "Adong", "Nalwanga", "Kyomuhendo",
+    "Mbabazi", "Namutebi", "Ayebare", "Nabukenya", "Akol",
+]
+LAST_NAMES = [
+    "Grace", "Joan", "Sarah", "Esther", "Florence", "Harriet", "Prossy", "Brenda",
+    "Ruth", "Agnes", "Winnie", "Doreen", "Annet", "Immaculate", "Sylvia", "Juliet",
+    "Mary", "Rebecca", "Christine", "Betty",
+]
+VHT_NAMES = ["Sarah", "John", "Grace", "Peter", "Mary", "James", "Moses", "Rose"]
+VILLAGE_SUFFIXES = ["Zone A", "Zone B", "Village A", "Village B", "Central", "East", "West"]
+LANGUAGES = ["English", "Luganda", "Acholi", "Lango", "Runyankole", "Ateso", None]
+SOURCES = ["vht", "vht", "vht", "sms", "ussd", "HC2", "web"]
+
+SYMPTOMS = [
+    "headache", "cough", "nausea", "vomiting", "back pain", "swollen feet",
+    "dizziness", "abdominal pain", "loss of appetite", "fatigue",
+]
+DANGER_SIGNS = [
+    "vaginal bleeding", "severe headache", "blurred vision", "convulsions",
+    "fast breathing", "reduced fetal movement", "high fever",
+]
+COMPLAINTS = {
+    "headache": "headache since yesterday",
+    "cough": "cough for 3 days",
+    "nausea": "feeling sick in the morning",
+    "vomiting": "vomiting after meals",
+    "back pain": "lower back pain",
+    "swollen feet": "feet are swollen",
+    "dizziness": "feeling dizzy",
+    "abdominal pain": "pain in the belly",
+    "loss of appetite": "not eating well",
+    "fatigue": "very tired",
+}
+
+
+def _facility_rows(rng: random.Random, count: int, now: datetime) -> list[dict]:
+    rows = []
+    for i in range(1, count + 1):
+        district = DISTRICTS[(i - 1) % len(DISTRICTS)]
+        level = "HC3" if rng.random() < 0.3 else "HC2"
+        rows.append(
+            {
+                "id": i,
+                "name": f"{district} Health Center {'III' if level == 'HC3' else 'II'} #{i}",
+                "level": level,
+                "district": district,
+                "created_at": now - timedelta(days=730),
+            }
+        )
+    return rows
+
+
+def _place(rows: list[dict], seed: int) -> list[dict]:
+    """
+    Give facilities coordinates near their district centre and return
+    village rows around each facility (own RNG, so the rest of the
+    dataset is the same as without coordinates).
+    """
+    geo = random.Random(seed)
+    villages = []
+    for row in rows:
+        lat, lon = DISTRICT_CENTRES[row["district"]]
+        row["latitude"] = round(lat + geo.uniform(-0.3, 0.3), 5)
+        row["longitude"] = round(lon + geo.uniform(-0.3, 0.3), 5)
+        for name in _villages(row["id"]):
+            villages.append(
+                {
+                    "name": name,
+                    "district": row["district"],
+                    "latitude": round(row["latitude"] + geo.uniform(-0.05, 0.05), 5),
+                    "longitude": round(row["longitude"] + geo.uniform(-0.05, 0.05), 5),
+                    "created_at": row["created_at"],
+                }
+            )
+    return villages
+
+
+def _villages(facility_id: int) -> list[str]:
+    return [f"F{facility_id} {suffix}" for suffix in VILLAGE_SUFFIXES]
+
+
+def _phone(prefix: str, n: int) -> str:
+    # Unique per entity, valid Ugandan mobile shape
+    return f"+256{prefix}{n:07d}"
+
+
+def _observations(rng: random.Random) -> dict:
+    symptoms = rng.sample(SYMPTOMS, k=rng.choice([0, 1, 1, 2, 2, 3]))
+    fever = rng.random() < 0.2
+    obs: dict = {
+        "fever": fever,
+        "temp_c": round(rng.uniform(37.8, 40.2) if fever else rng.uniform(36.1, 37.4), 1),
+        "symptoms": symptoms,
+    }
+    if rng.random() < 0.05:
+        obs["danger_signs"] = rng.sample(DANGER_SIGNS, k=rng.choice([1, 1, 2]))
+    if rng.random() < 0.3:
+        obs["bp"] = f"{rng.randint(95, 160)}/{rng.randint(60, 105)}"
+    return obs
+
+
+def _complaint(rng: random.Random, obs: dict) -> str | None:
+    if obs.get("danger_signs"):
+        return obs["danger_signs"][0]
+    if obs["symptoms"]:
+        return COMPLAINTS[obs["symptoms"][0]]
+    return None if rng.random() < 0.5 else "routine check"
+
+
+def _index_rows(checkin_id: str, obs: dict) -> tuple[dict, list[dict]]:
+    """
+    Same projection index_observations() writes, as plain rows for bulk insert.
+    """
+    projection = {"checkin_id": checkin_id, "fever": obs["fever"], "temp_c": obs["temp_c"]}
+    tags = []
+    for key, kind in TAG_KEYS.items():
+        for value in sorted({normalize_tag(v) for v in obs.get(key) or []}):
+            tags.append({"checkin_id": checkin_id, "kind": kind, "value": value})
+    return projection, tags
+
+
+def _progress(label: str, done: int, total: int, started: float) -> None:
+    rate = done / max(time.perf_counter() - started, 1e-9)
+    print(f"\r{label}: {done:,}/{total:,} ({rate:,.0f}/s)", end="", flush=True)
+
+
+def generate(db: Session, args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    now = args.as_of
+    batch = args.batch_size
+
+    facilities = _facility_rows(rng, args.facilities, now)
+    villages = _place(facilities, args.seed)
+    # Core inserts against Model.__table__: the ORM bulk path is ~3x slower here
+    db.execute(insert(Facility.__table__), facilities)
+    db.execute(insert(Village.__table__), villages)
+
+    vhts = []
+    vhts_by_facility: dict[int, list[tuple[int, str]]] = {}
+    for i in range(1, args.vhts + 1):
+        facility_id = (i - 1) % args.facilities + 1
+        village = rng.choice(_villages(facility_id))
+        vhts.append(
+            {
+                "id": i,
+                "name": f"VHT {rng.choice(VHT_NAMES)} {i}",
+                "phone": _phone("70", i),
+                "village": village,
+                "facility_id": facility_id,
+                "created_at": now - timedelta(days=700),
+            }
+        )
+        vhts_by_facility.setdefault(facility_id, []).append((i, village))
+    db.execute(insert(VHT.__table__), vhts)
+    bump_version(db, REFERENCE)
+    db.commit()
+    print(f"facilities: {args.facilities:,}  villages: {len(villages):,}  vhts: {args.vhts:,}")
+
+    # Patients (+ phone keys, FTS rows and duplicate blocking keys, as
+    # sync_patient_search / sync_block_keys would write)
+    patient_facility: list[int] = [0] * (args.patients + 1)
+    started = time.perf_counter()
+    for start in range(1, args.patients + 1, batch):
+        patients, phones, fts, keys = [], [], [], []
+        for pid in range(start, min(start + batch, args.patients + 1)):
+            facility_id = rng.randint(1, args.facilities)
+            vht_choices = vhts_by_facility.get(facility_id)
+            vht_id, village = (
+                rng.choice(vht_choices)
+                if vht_choices and rng.random() < 0.9
+                else (None, rng.choice(_villages(facility_id)))
+            )
+            created = now - timedelta(days=rng.randint(1, 270), minutes=rng.randint(0, 1439))
+            roll = rng.random()
+            status = "active" if roll < 0.85 else "paused" if roll < 0.92 else "closed"
+            backup = _phone("78", pid) if rng.random() < 0.25 else None
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            patients.append(
+                {
+                    "id": pid,
+                    "name": name,
+                    "phone": _phone("77", pid),
+                    "backup_phone": backup,
+                    "village": village,
+                    "parish": f"Parish {facility_id}-{rng.randint(1, 4)}",
+                    "facility_id": facility_id,
+                    "vht_id": vht_id,
+                    "gestational_age_weeks": rng.randint(6, 41),
+                    "missed_anc_count": rng.choices([0, 1, 2, 3, 4], [60, 20, 10, 6, 4])[0],
+                    "prior_malaria": rng.random() < 0.2,
+                    "high_burden_zone": rng.random() < 0.3,
+                    "consent_sms": rng.random() < 0.8,
+                    "preferred_language": rng.choice(LANGUAGES),
+                    "status": status,
+                    "status_reason": None if status == "active" else "synthetic",
+                    "created_at": created,
+                    "updated_at": created,
+                }
+            )
+            patient_facility[pid] = facility_id
+            phones.append({"patient_id": pid, "kind": "primary", "phone_e164": _phone("77", pid)})
+            if backup:
+                phones.append({"patient_id": pid, "kind": "backup", "phone_e164": backup})
+            fts.append({"id": pid, "name": name, "village": village, "parish": patients[-1]["parish"]})
+            keys += [
+                {"key": key, "patient_id": pid}
+                for key in block_keys(name, village, patients[-1]["parish"])
+            ]
+
+        db.execute(insert(Patient.__table__), patients)
+        db.execute(insert(PatientPhone.__table__), phones)
+        db.execute(insert(PatientBlockKey.__table__), keys)
+        if patient_search.FTS_AVAILABLE:
+            db.execute(
+                text(
+                    f"INSERT INTO {patient_search.FTS_TABLE} (rowid, name, village, parish) "
+                    "VALUES (:id, :name, :village, :parish)"
+                ),
+                fts,
+            )
+        db.commit()
+        _progress("patients", pid, args.patients, started)
+    print()
+
+    # Check-ins: mostly closed history, recent ones still open
+    started = time.perf_counter()
+    done = 0
+    while done < args.checkins:
+        checkins, projections, tags = [], [], []
+        for _ in range(min(batch, args.checkins - done)):
+            pid = rng.randint(1, args.patients)
+            checkin_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            created = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            is_open = created > now - timedelta(days=7) and rng.random() < 0.6
+            obs = _observations(rng)
+            checkins.append(
+                {
+                    "id": checkin_id,
+                    "patient_id": pid,
+                    "facility_id": patient_facility[pid],
+                    "status": "open" if is_open else "closed",
+                    "source": rng.choice(SOURCES),
+                    "initial_complaint": _complaint(rng, obs),
+                    "observations_json": json.dumps(obs),
+                    "recorded_by": "synthetic",
+                    "notes": None,
+                    "created_at": created,
+                    "closed_at": None if is_open else created + timedelta(hours=rng.randint(1, 72)),
+                }
+            )
+            projection, checkin_tags = _index_rows(checkin_id, obs)
+            projections.append(projection)
+            tags.extend(checkin_tags)
+
+        db.execute(insert(CheckIn.__table__), checkins)
+        db.execute(insert(CheckInObservation.__table__), projections)
+        if tags:
+            db.execute(insert(CheckInObservationTag.__table__), tags)
+        db.commit()
+        done += len(checkins)
+        _progress("checkins", done, args.checkins, started)
+    print()
+
+    t0 = time.perf_counter()
+    scored = rebuild_risk_table(db)
+    print(f"risk table: {scored:,} patients ({time.perf_counter() - t0:.1f}s)")
+    t0 = time.perf_counter()
+    rebuild_dashboard_stats(db)
+    print(f"dashboard stats rebuilt ({time.perf_counter() - t0:.1f}s)")
+    t0 = time.perf_counter()
+    rebuild_change_log(db)
+    print(f"sync change log rebuilt ({time.perf_counter() - t0:.1f}s)")
+
+    if engine.dialect.name == "sqlite":
+        # Fresh planner statistics for the loaded row counts
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facilities", type=int, default=500)
+    parser.add_argument("--vhts", type=int, default=20_000)
+    parser.add_argument("--patients", type=int, default=500_000)
+    parser.add_argument("--checkins", type=int, default=5_000_000)
+    parser.add_argument("--seed", type=int, default=26)
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+        help="Anchor timestamp (ISO); defaults to today 00:00 UTC",
+    )
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--reset", action="store_true", help="Drop all tables first")
+    args = parser.parse_args()
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {patient_search.FTS_TABLE}"))
+    create_schema()
+    patient_search.ensure_search_index(engine)
+
+    db = SessionLocal()
+    try:
+        if db.execute(select(Facility.id).limit(1)).first():
+            raise SystemExit("Database is not empty; pass --reset to regenerate.")
+        if engine.dialect.name == "sqlite":
+            # Bulk load only: durability doesn't matter for a throwaway dataset
+            db.execute(text("PRAGMA journal_mode=WAL"))
+            db.execute(text("PRAGMA synchronous=OFF"))
+        started = time.perf_counter()
+        generate(db, args)
+        print(f"done in {time.perf_counter() - started:.0f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""HTTP load test for the core API routes, with results kept across commits.
+
+    cd backend
+    DATABASE_URL=sqlite:///./data/bench.db python scripts/load_test.py
+    python scripts/load_test.py --base-url http://localhost:8000 --scenarios list,detail
+
+Without --base-url the app is served in-process by uvicorn on a free port with
+a deterministic fake planner (no LLM calls), so agent runs measure our own
+overhead. Scenarios: list, detail, patch, checkin, agent. Each run appends one
+JSON line (commit, settings, per-scenario throughput and latency percentiles)
+to --results and prints the change against the previous run with the same label.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+SCENARIOS = ["list", "detail", "patch", "checkin", "agent"]
+
+COMPLAINTS = ["headache and fever", "swollen feet", "cough for 3 days", "bleeding since morning"]
+SYMPTOMS = ["headache", "cough", "nausea", "swollen feet", "dizziness"]
+
+
+def _request(base_url: str, method: str, path: str, body: Any = None) -> Any:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(f"{base_url}{path}", data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        payload = resp.read()
+    return json.loads(payload) if payload else None
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+# ---------- in-process server with a fake planner ----------
+def _fake_plan(checkin: dict, patient: dict) -> dict:
+    complaint = (checkin.get("initial_complaint") or "").lower()
+    escalate = "bleed" in complaint
+    return {
+        "approved": True,
+        "reason": "load-test planner",
+        "modified_plan": {
+            "intent": "ESCALATE" if escalate else "ADVICE",
+            "reason": "load test",
+            "priority": "HIGH" if escalate else None,
+            "requires_human": escalate,
+            "tools": [],
+        },
+    }
+
+
+def _serve_in_process(llm_latency_ms: float) -> tuple[str, Callable[[], None]]:
+    import uvicorn
+
+    import app.agents.graph as agent_graph
+    from app.main import app
+
+    def planner(checkin: dict, patient: dict) -> dict:
+        if llm_latency_ms:
+            time.sleep(llm_latency_ms / 1000)
+        return _fake_plan(checkin, patient)
+
+    agent_graph.plan_checkin = planner
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("In-process server failed to start")
+        time.sleep(0.05)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+# ---------- scenarios ----------
+class Workload:
+    """
+    Request generators per scenario, over a sample of existing patients.
+    """
+
+    def __init__(self, base_url: str, rng: random.Random, sample_facilities: int) -> None:
+        self.base_url = base_url
+        self.rng = rng
+        self.patients: list[dict] = []
+        self.checkin_ids: list[str] = []
+        self._lock = threading.Lock()
+
+        facilities = _request(base_url, "GET", "/facilities")
+        for facility in rng.sample(facilities, min(sample_facilities, len(facilities))):
+            self.patients += _request(
+                base_url,
+                "GET",
+                f"/patients?facility_id={facility['id']}&fields=facility_id,vht_id",
+            )
+        if not self.patients:
+            raise SystemExit(
+                "No patients found; run scripts/generate_synthetic_data.py first."
+            )
+
+    def _patient(self) -> dict:
+        return self.rng.choice(self.patients)
+
+    def next_request(self, scenario: str) -> tuple[str, str, Any]:
+        patient = self._patient()
+        if scenario == "list":
+            query = f"facility_id={patient['facility_id']}"
+            if patient.get("vht_id"):
+                query += f"&vht_id={patient['vht_id']}"
+            return "GET", f"/patients?{query}", None
+        if scenario == "detail":
+            return "GET", f"/patients/{patient['id']}", None
+        if scenario == "patch":
+            body = {"missed_anc_count": self.rng.randint(0, 3)}
+            return "PATCH", f"/patients/{patient['id']}", body
+        if scenario == "checkin":
+            body = {
+                "patient_id": patient["id"],
+                "facility_id": patient["facility_id"],
+                "source": "vht",
+                "initial_complaint": self.rng.choice(COMPLAINTS),
+                "observations": {
+                    "fever": self.rng.random() < 0.2,
+                    "temp_c": round(self.rng.uniform(36.2, 39.5), 1),
+                    "symptoms": self.rng.sample(SYMPTOMS, 2),
+                },
+            }
+            return "POST", "/checkins", body
+        if scenario == "agent":
+            with self._lock:
+                checkin_id = self.rng.choice(self.checkin_ids)
+            return "POST", f"/agent/run?checkin_id={checkin_id}", None
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    def record(self, scenario: str, response: Any) -> None:
+        if scenario == "checkin" and isinstance(response, dict) and response.get("id"):
+            with self._lock:
+                self.checkin_ids.append(response["id"])
+
+
+def run_scenario(
+    workload: Workload, scenario: str, requests: int, concurrency: int
+) -> dict[str, Any]:
+    if scenario == "agent" and not workload.checkin_ids:
+        # Agent runs need fresh check-ins to plan
+        for _ in range(min(requests, 50)):
+            method, path, body = workload.next_request("checkin")
+            workload.record("checkin", _request(workload.base_url, method, path, body))
+
+    planned = [workload.next_request(scenario) for _ in range(requests)]
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(item: tuple[str, str, Any]) -> None:
+        nonlocal errors
+        method, path, body = item
+        t0 = time.perf_counter()
+        try:
+            response = _request(workload.base_url, method, path, body)
+        except (urllib.error.URLError, OSError):
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - t0
+        workload.record(scenario, response)
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, planned))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(_percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+# ---------- results ----------
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _previous_run(path: Path, label: str) -> dict | None:
+    if not path.exists():
+        return None
+    previous = None
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get("label") == label:
+            previous = entry
+    return previous
+
+
+def _print_report(result: dict, previous: dict | None) -> None:
+    print(f"\n{'scenario':<9} {'rps':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'errors':>7}")
+    for name, stats in result["scenarios"].items():
+        line = (
+            f"{name:<9} {stats['rps']:>9.1f} {stats['p50_ms']:>8.1f}ms"
+            f" {stats['p90_ms']:>8.1f}ms {stats['p99_ms']:>8.1f}ms {stats['errors']:>7}"
+        )
+        before = (previous or {}).get("scenarios", {}).get(name)
+        if before and before.get("rps"):
+            change = (stats["rps"] - before["rps"]) / before["rps"] * 100
+            line += f"   rps {change:+.1f}% vs {previous.get('commit') or 'previous'}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=None, help="Target server (default: in-process)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="Per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sample-facilities", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Fake planner delay")
+    parser.add_argument("--results", default=str(BACKEND_DIR / "benchmarks" / "results.jsonl"))
+    parser.add_argument("--label", default="default", help="Groups comparable runs")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = sorted(set(scenarios) - set(SCENARIOS))
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {unknown}")
+
+    stop: Callable[[], None] = lambda: None
+    base_url = args.base_url
+    if base_url is None:
+        base_url, stop = _serve_in_process(args.llm_latency_ms)
+
+    try:
+        workload = Workload(base_url, random.Random(args.seed), args.sample_facilities)
+        results: dict[str, Any] = {}
+        for scenario in scenarios:
+            print(f"running {scenario} ({args.requests} requests, c={args.concurrency})")
+            results[scenario] = run_scenario(
+                workload, scenario, args.requests, args.concurrency
+            )
+    finally:
+        stop()
+
+    result = {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": _git_commit(),
+        "label": args.label,
+        "target": args.base_url or "in-process",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "sampled_patients": len(workload.patients),
+        "scenarios": results,
+    }
+
+    results_path = Path(args.results)
+    previous = _previous_run(results_path, args.label)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with results_path.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(result) + "\n")
+
+    _print_report(result, previous)
+    print(f"\nresults appended to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
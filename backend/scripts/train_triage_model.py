@@ -0,0 +1,88 @@
+"""Train the offline triage classifier from past agent runs.
+
+    cd backend
+    python scripts/train_triage_model.py --out ./data/triage_model.npz
+
+Examples are check-ins (complaint + source) labelled with the intent of
+their LLM-planned, policy-approved agent runs, read from every
+district shard. Local and fallback plans are skipped so the model never
+learns from itself. Prints holdout accuracy and, per confidence threshold,
+how many plans would stay local and how accurate those are; pick
+PLANNER_LOCAL_MIN_CONFIDENCE from that table.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import or_, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.agents.planner.local import INTENT, evaluate, train  # noqa: E402
+from app.agents.policies import ALLOWED_INTENTS  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.models import AgentRun, CheckIn  # noqa: E402
+from app.core.shards import shards  # noqa: E402
+
+
+def load_examples(db: Session) -> list[tuple[str | None, str | None, dict[str, str]]]:
+    rows = db.execute(
+        select(CheckIn.initial_complaint, CheckIn.source, AgentRun.intent)
+        .join(CheckIn, CheckIn.id == AgentRun.checkin_id)
+        .where(
+            AgentRun.approved.is_(True),
+            AgentRun.intent.in_(ALLOWED_INTENTS),
+            or_(AgentRun.planner.is_(None), AgentRun.planner == "llm"),
+            CheckIn.initial_complaint.is_not(None),
+        )
+    ).all()
+    return [(complaint, source, {INTENT: intent}) for complaint, source, intent in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=settings.PLANNER_MODEL_PATH)
+    parser.add_argument("--bits", type=int, default=18, help="Hashed feature space: 2**bits")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--min-examples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=26)
+    args = parser.parse_args()
+
+    examples = [e for part in shards.scatter(load_examples) for e in part]
+    if len(examples) < args.min_examples:
+        raise SystemExit(
+            f"Only {len(examples)} labelled runs (need {args.min_examples}); not training."
+        )
+    random.Random(args.seed).shuffle(examples)
+    n_test = int(len(examples) * args.holdout)
+    test, train_set = examples[:n_test], examples[n_test:]
+
+    started = time.perf_counter()
+    model = train(train_set, bits=args.bits, epochs=args.epochs, seed=args.seed)
+    print(f"trained on {len(train_set)} runs in {time.perf_counter() - started:.1f}s")
+
+    if test:
+        report = evaluate(model, test)
+        model.meta["holdout"] = report
+        print(json.dumps(report, indent=2))
+
+        started = time.perf_counter()
+        for complaint, source, _ in test:
+            model.predict(complaint, source)
+        per_plan = (time.perf_counter() - started) / len(test)
+        print(f"prediction: {per_plan * 1e6:.0f} us per plan")
+
+    model.save(args.out)
+    print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
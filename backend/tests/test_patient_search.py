@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.db import Base
+from app.core.models import Facility, Patient
+from app.services import patient_search
+
+NAME = "Adong Rebecca"
+TARGET_ID = 123456
+TARGET_FACILITY = 199
+TARGET_VILLAGE = "F199 Zone B"
+
+
+@pytest.fixture(params=[True, False], ids=["fts", "like"])
+def db(request, monkeypatch):
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(bind=engine)
+    patient_search.ensure_search_index(engine)
+    if not request.param:
+        monkeypatch.setattr(patient_search, "FTS_AVAILABLE", False)
+    elif not patient_search.FTS_AVAILABLE:
+        pytest.skip("SQLite build without FTS5 trigram")
+
+    session = sessionmaker(bind=engine, future=True)()
+    session.execute(
+        insert(Facility),
+        [{"id": f, "name": f"HC {f}", "level": "HC2"} for f in (1, 2, TARGET_FACILITY)],
+    )
+    # More same-named mothers outside the scope than the candidate cut keeps
+    outside = patient_search.CANDIDATE_LIMIT * 2
+    rows = [
+        {
+            "id": i,
+            "name": NAME,
+            "village": f"F00{1 + i % 2} Zone B",
+            "facility_id": 1 + i % 2,
+            "gestational_age_weeks": 20,
+        }
+        for i in range(1, outside + 1)
+    ]
+    rows.append(
+        {
+            "id": TARGET_ID,
+            "name": NAME,
+            "village": TARGET_VILLAGE,
+            "facility_id": TARGET_FACILITY,
+            "gestational_age_weeks": 20,
+        }
+    )
+    session.execute(insert(Patient), rows)
+    session.commit()
+    patient_search.rebuild_search_index(session)
+    yield session
+    session.close()
+
+
+def test_facility_filter_applies_before_candidate_limit(db):
+    hits = patient_search.search_by_name(db, NAME, facility_id=TARGET_FACILITY)
+    assert [p.id for p, _ in hits] == [TARGET_ID]
+
+
+def test_village_filters_instead_of_reranking(db):
+    hits = patient_search.search_by_name(db, NAME, village=TARGET_VILLAGE)
+    assert [p.id for p, _ in hits] == [TARGET_ID]